@@ -1,18 +1,26 @@
-from crewai_tools import tool
-from crewai import Agent, Task, Crew
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import PromptTemplate
-
 import os
+import re
 import sys
 import logging
 from dotenv import load_dotenv
 import json
 
 from computerAgent import book_ride, browse_and_purchase_items, enable_navigation_and_multiapp, file_operations, fill_online_form, gmail_create_draft, manage_emails, manage_messages, manage_social_media, navigate_links_or_menus, order_groceries, perform_online_banking, public_transit_schedule, schedule_meeting, search_files, speech_based_search
-from smartHomeAgent import adjust_curtains, answer_video_doorbell, control_entertainment_device, control_streaming_service, manage_locks, manage_security, search_and_play_content, set_thermostat, start_appliance, stop_appliance, turn_off_ac, turn_off_lights, turn_on_ac, turn_on_lights
-from browser_control import browser_control
-from browser_control import BrowserControl
+from smartHomeAgent import adjust_curtains, answer_video_doorbell, check_device_status, control_entertainment_device, control_streaming_service, manage_locks, manage_security, search_and_play_content, set_thermostat, start_appliance, stop_appliance, turn_off_ac, turn_off_lights, turn_on_ac, turn_on_lights
+from intent_router import IntentRouter, is_command, is_compound
+from llm_cache import cached_invoke
+from llm_clients import get_chat_llm, warm_up
+from crew_registry import CrewRegistry
+from flat_executor import FlatExecutor
+from tool_index import TOP_K, ToolIndex
+from lazy_tools import agent_tools, tool
+from plan_executor import aexecute_plan, amake_plan, execute_plan, make_plan
+from async_runtime import call_in, run_blocking
+from sessions import current_contacts, current_session, find_session
+from outbox import PENDING, SENDING, Cancelled, PermanentFailure, outbox
+from contact_directory import directory as contact_directory
+from tracing import instrument_tools, traced
+from device_state import devices
 
 load_dotenv()
 
@@ -23,59 +31,148 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-browser_controller = BrowserControl()
+# Leaf tools the intent router may call directly, skipping the planning LLM round trips
+FAST_PATH_TOOLS = {
+    t.name: t for t in [
+        turn_on_ac, turn_off_ac, turn_on_lights, turn_off_lights, set_thermostat,
+        adjust_curtains, start_appliance, stop_appliance, manage_security, manage_locks,
+        answer_video_doorbell, control_entertainment_device,
+        search_files, navigate_links_or_menus, enable_navigation_and_multiapp,
+    ]
+}
+intent_router = IntentRouter.from_corpus()
+
+# Inner agents the planner can hand sub-tasks to, keyed by their crew registry name
+PLAN_AGENTS = {
+    "smart_home": "controls smart home devices such as the AC, thermostat, lights, curtains, locks, security and TV",
+    "computer": "sends and drafts emails and messages, searches files, navigates apps, orders rides and groceries",
+    "browser": "switches browser tabs and navigates websites",
+}
+# Agents sharing one driver (the Chrome session) must not run steps concurrently
+SERIAL_AGENTS = ["browser"]
+PARALLEL_PLANS = os.getenv("PARALLEL_PLANS", "1") != "0"
+# "hierarchical": planning agent and inner agents; "flat": one tool-calling model
+# call over the leaf tools, handing multi-turn tasks to the agents
+EXECUTION_MODES = ("hierarchical", "flat")
+EXECUTION_MODE = os.getenv("EXECUTION_MODE", "hierarchical")
 
 def load_contacts():
-    """Load contacts from JSON file"""
-    try:
-        contacts_path = os.path.join(os.path.dirname(__file__), 'contacts.json')
-        with open(contacts_path, 'r') as f:
-            return json.load(f)
-    except Exception as e:
-        logger.error(f"Error loading contacts: {str(e)}")
-        return {"friend": "emailypark@gmail.com"}
+    """The contact directory, re-read only when contacts.json has changed"""
+    return contact_directory
+
+def current_browser():
+    """Browser bound to the current server session, or the shared controller"""
+    return browser_for(current_session())
+
+def browser_for(session):
+    if session is not None and session.browser is not None:
+        return session.browser
+    # Selenium is only imported once an email is actually sent
+    from browser_control import browser_controller
+    return browser_controller
 
 @tool
 def send_friend_email(recipient_type: str, message: str):
-    """Sends an email to a contact with a dynamic message"""
+    """Sends one email to one or more contacts or groups (e.g. "mom, dad and sister" or "family") with a dynamic message"""
     try:
         logger.info(f"Attempting to send email to {recipient_type} with message: {message}")
         
         # load contacts
-        contacts = load_contacts()
+        contacts = current_contacts()
 
-        if recipient_type not in contacts:
-            return f"No email address found for '{recipient_type}'"
+        names, unknown = contacts.expand(recipient_type)
+        if unknown or not names:
+            return f"No email address found for '{', '.join(unknown) or recipient_type}'"
+        label = describe_recipients(names)
+        if label != recipient_type.lower():
+            logger.info(f"Resolved recipients '{recipient_type}' to {label}")
         
-        success = browser_controller.switch_to_tab("gmail")
-        if not success:
-            return "Failed to access Gmail"
-        
-        recipient = contacts[recipient_type]
-        subject = f"Message to {recipient_type.capitalize()}"
-        
-        if browser_controller.compose_email(recipient, subject, message):
-            return f"Successfully sent email to {recipient_type}"
-        return f"Failed to send email to {recipient_type}"
+        # All recipients share a single compose, so the cost barely grows with their number
+        payload = {
+            "recipients": [contacts.email(name) for name in names],
+            "subject": f"Message to {describe_recipients([name.capitalize() for name in names])}",
+            "message": message,
+        }
+        # The outbox worker composes and sends it; the user does not wait for the browser
+        session = current_session()
+        if session is not None and session.browser is not None:
+            payload["session_browser"] = True
+        queued = outbox.enqueue("email", payload, recipients=label, session_id=session.id if session is not None else None)
+        return f"Email to {label} queued, it will be sent shortly (outbox message {queued.id})"
     except Exception as e:
         logger.error(f"Error sending email: {str(e)}")
         return f"Error: {str(e)}"
 
+def deliver_email(payload, message):
+    """Outbox handler: compose and send a queued email in its session's browser"""
+    session = find_session(message.session_id) if message.session_id is not None else None
+    if session is None and payload.get("session_browser"):
+        raise PermanentFailure(f"Session {message.session_id} and its browser have closed")
+    browser = browser_for(session)
+
+    def send():
+        if not browser.switch_to_tab("gmail"):
+            raise RuntimeError("Failed to access Gmail")
+        recipients = payload["recipients"]
+        if not browser.compose_email(recipients if len(recipients) > 1 else recipients[0], payload["subject"], payload["message"]):
+            raise Cancelled("Sending cancelled by user")
+        return f"Successfully sent email to {message.recipients}"
+
+    # Selenium calls all go through the async runtime's single browser thread
+    return call_in("browser", send)
+
+def cancel_email(message):
+    """Outbox canceller: stop an email that is being composed, up to the end of its undo window"""
+    session = find_session(message.session_id) if message.session_id is not None else None
+    if session is None and message.payload.get("session_browser"):
+        return False
+    return browser_for(session).cancel_send()
+
+outbox.register("email", deliver_email, canceller=cancel_email)
+
+@tool
+def check_sent_messages(recipient: str) -> str:
+    """Tells whether the latest emails and drafts to a contact or group went out, are still queued or failed.
+    Use it for questions like "did my email to mom go out?"."""
+    names, _ = current_contacts().expand(recipient)
+    session = current_session()
+    session_id = session.id if session is not None else None
+    found = {}
+    for name in names or [recipient]:
+        for queued in outbox.find(recipient=name, session_id=session_id, limit=3):
+            found[queued.id] = queued
+    if not found:
+        return f"No recent emails or drafts to {recipient}."
+    return "\n".join(found[i].describe(outbox.max_attempts) for i in sorted(found, reverse=True)[:3])
+
+@tool
+def cancel_sent_message(recipient: str) -> str:
+    """Cancels the latest email or draft to a contact or group that has not gone out yet, including an email
+    waiting in its undo window. Use it for requests like "cancel my email to mom"."""
+    names, _ = current_contacts().expand(recipient)
+    session = current_session()
+    session_id = session.id if session is not None else None
+    waiting = {}
+    for name in names or [recipient]:
+        for queued in outbox.find(recipient=name, session_id=session_id, limit=3):
+            if queued.status in (PENDING, SENDING):
+                waiting[queued.id] = queued
+    if not waiting:
+        return f"No email or draft to {recipient} is waiting to go out."
+    latest = waiting[max(waiting)]
+    what = f"{latest.kind.replace('_', ' ')} to {latest.recipients}"
+    if not outbox.cancel(latest.id):
+        return f"Too late to cancel the {what}, it is already going out."
+    return f"Cancelled the {what}."
+
+def describe_recipients(names):
+    """Names as a phrase: "mom", "mom and dad", "mom, dad and sister"""
+    return names[0] if len(names) == 1 else f"{', '.join(names[:-1])} and {names[-1]}"
+
 @tool
 def call_browser_agent(query: str):
     """This function calls the browser agent, which can execute tasks like switching tabs and navigation."""
-    task = Task(
-        description=f'Execute the following user query: {query}',
-        agent=browserAgent,
-        expected_output='A message of confirmation that the task has been executed.',
-    )
-    crew = Crew(
-        agents=[browserAgent],
-        tasks=[task],
-        verbose=True
-    )
-    result = crew.kickoff()
-    return result
+    return crews.kickoff("browser", query)
 
 @tool
 def expand_user_query(query: str) -> str:
@@ -84,12 +181,14 @@ def expand_user_query(query: str) -> str:
         f"The user said: '{query}'. "
         "Please expand this into a detailed and actionable request from this word to a sentence to initiate the next automation task flow."
     )
-    response = llm.invoke(prompt)
-    return response.content
+    return cached_invoke(chat_llm(), prompt)
 
 @tool
 def ask_for_user_input(question: str):
     """This function asks for additional user input if there is not enough information. Takes in a question to ask the user."""
+    session = current_session()
+    if session is not None:
+        return session.ask(question)
     user_input = input(question)
     return user_input
 
@@ -97,7 +196,9 @@ def ask_for_user_input(question: str):
 def verify_with_user(confirmation: str) -> str:
     """Verifies with the user if they want to execute a task.
     If the user says no, it captures their additional instructions or ends the task."""
-    user_input = input(f"{confirmation} (yes/no or provide additional instructions): ").strip().lower()
+    question = f"{confirmation} (yes/no or provide additional instructions): "
+    session = current_session()
+    user_input = (session.ask(question) if session is not None else input(question)).strip().lower()
     
     if user_input in ["no", "nope", "n"]:
         print("User declined the task.")
@@ -115,30 +216,19 @@ def verify_with_user(confirmation: str) -> str:
 def call_smart_home_agent(query: str):
     """This function calls the Smart Home agent, which can execute tasks like turning on the AC, setting the thermostat, etc.
     The function takes in the user query that needs to be executed."""
-    task = Task(
-        description=f'Execute the following user query: {query}',
-        agent=smartHomeAgent,
-        expected_output='A message of confirmation that the task has been executed.',
-    )
-    crew = Crew(
-        agents=[smartHomeAgent],
-        tasks=[task],
-        verbose=True
-    )
-    result = crew.kickoff()
-    return result
+    return crews.kickoff("smart_home", query)
 
-@tool
-def enhance_message(contact_type: str, original_message: str) -> str:
-    """Enhances the user's message while keeping the original meaning"""
-    prompt = f"""Make this message a more conversational and complete sentence while not going too far from its exact meaning: '{original_message}'
+def enhance_prompt(contact_type, original_message):
+    return f"""Make this message a more conversational and complete sentence while not going too far from its exact meaning: '{original_message}'
     The message is for {contact_type}. Keep it brief and natural.
     You may add greetings like 'hi' or 'hello'.
     Just make it flow more naturally."""
-    
+
+@tool
+def enhance_message(contact_type: str, original_message: str) -> str:
+    """Enhances the user's message while keeping the original meaning"""
     try:
-        response = llm.invoke(prompt)
-        enhanced = response.content.strip()
+        enhanced = cached_invoke(chat_llm(), enhance_prompt(contact_type, original_message)).strip()
         logger.info(f"Original message: {original_message}")
         logger.info(f"Enhanced message: {enhanced}")
         return enhanced
@@ -147,128 +237,345 @@ def enhance_message(contact_type: str, original_message: str) -> str:
         return original_message
 
 
-def execute_query(user_input):
-    if user_input.lower().startswith("help mail "):
-        logger.info("Detected help mail request")
-        remaining_text = user_input[10:].strip()
-        parts = remaining_text.split(" ", 1)
-        
-        if len(parts) < 2:
-            return "Please provide both recipient and message (e.g., 'help mail friend need food')"
-            
-        contact_type = parts[0].lower()
-        original_message = parts[1]
-        
-        contacts = load_contacts()
-        if contact_type not in contacts:
-            return f"No email address found for '{contact_type}'"
-        
-        enhanced_message = enhance_message.run(contact_type, original_message)
-        logger.info(f"Enhanced message: {enhanced_message}")
-        
-        return send_friend_email.run(contact_type, enhanced_message)
-        
-    elif user_input.lower().startswith("mail "):
-        logger.info("Detected email request")
-        remaining_text = user_input[5:].strip()
-        parts = remaining_text.split(" ", 1)
-        
-        if len(parts) < 2:
-            return "Please provide both recipient and message (e.g., 'mail friend hello')"
-            
-        recipient_type = parts[0].lower()
-        message = parts[1]
-        
-        return send_friend_email.run(recipient_type, message)
+def parse_mail_command(user_input):
+    """Split 'mail <contact> <message>' and 'help mail <contact> <message>' commands.
+    Returns None for other queries, otherwise (enhance, contact_type, message, error)."""
+    lowered = user_input.lower()
+    if lowered.startswith("help mail "):
+        enhance, remaining_text, usage = True, user_input[10:].strip(), "help mail friend need food"
+    elif lowered.startswith("mail "):
+        enhance, remaining_text, usage = False, user_input[5:].strip(), "mail friend hello"
+    else:
+        return None
+    contact_type, message = split_recipients(remaining_text)
+    if not message:
+        return enhance, None, None, f"Please provide both recipient and message (e.g., '{usage}')"
+    if enhance:
+        names, unknown = current_contacts().expand(contact_type)
+        if unknown or not names:
+            return enhance, contact_type, message, f"No email address found for '{', '.join(unknown) or contact_type}'"
+    return enhance, contact_type, message, None
+
+def split_recipients(text):
+    """Split "mom, dad and my sister I'm fine" into ("mom, dad and my sister", "I'm fine").
+    Another recipient must be an exact contact or group name or alias (or "my <name>" after "and").
+    Names after a comma only count once the list is closed by "and"/"&", so in
+    "mom, work is done" the message starts at "work"."""
+    words = list(re.finditer(r"\S+", text))
+    if not words:
+        return "", ""
+    lowered = [w.group().lower() for w in words]
+    contacts = current_contacts()
+
+    def after_name(i):
+        while i < len(words) - 1 and lowered[i] in ("my", "the"):
+            i += 1
+        return i + 1
+
+    end = committed = after_name(0)
+    while end < len(words):
+        joined = lowered[end] in ("and", "&")
+        if not joined and not lowered[end - 1].endswith(","):
+            break
+        start = end + 1 if joined else end
+        if start >= len(words):
+            break
+        stop = after_name(start)
+        name = " ".join(lowered[start:stop]).rstrip(",")
+        if contacts.lookup(name) is None and not (joined and lowered[start] == "my"):
+            break
+        end = stop
+        if joined:
+            committed = end
+    recipients = text[:words[committed - 1].end()].strip().lower().rstrip(",")
+    return recipients, text[words[committed].start():] if committed < len(words) else ""
+
+def execution_mode(mode=None):
+    mode = mode or EXECUTION_MODE
+    if mode not in EXECUTION_MODES:
+        raise ValueError(f"Unknown execution mode '{mode}', expected one of {', '.join(EXECUTION_MODES)}")
+    return mode
+
+@traced("query", kind="query")
+@devices.coalesce
+def execute_query(user_input, mode=None):
+    """Run a query; mode overrides EXECUTION_MODE for this query"""
+    command = parse_mail_command(user_input)
+    if command is not None:
+        return run_mail_command(command)
+
+    result = run_fast_path(user_input)
+    if result is not None:
+        return result
+
+    if execution_mode(mode) == "flat":
+        return flat_executor().run(user_input)
+
+    if PARALLEL_PLANS and is_compound(user_input):
+        try:
+            plan = make_plan(chat_llm(), user_input, PLAN_AGENTS)
+        except Exception as e:
+            logger.error(f"Error planning query, falling back to planning agent: {str(e)}")
+            plan = None
+        if plan is not None and len(plan.steps) > 1:
+            results = execute_plan(plan, run_plan_step, serial_agents=SERIAL_AGENTS)
+            return "\n".join(f"{step.query}: {results[step.id]}" for step in plan.steps)
     
-    task = Task(
-        description=f'Execute the following user query: {user_input}',
-        agent=planningAgent,
-        expected_output='A message of confirmation that the task has been executed.',
-    )
+    return crews.kickoff("planning", user_input)
 
-    crew = Crew(
-        agents=[planningAgent],
-        tasks=[task],
-        verbose=True
-    )
+def run_mail_command(command):
+    """Send a mail command parsed by parse_mail_command, enhancing the message first for help mails"""
+    enhance, contact_type, message, error = command
+    logger.info("Detected help mail request" if enhance else "Detected email request")
+    if error:
+        return error
+    if enhance:
+        message = enhance_message.run(contact_type, message)
+        logger.info(f"Enhanced message: {message}")
+    return send_friend_email.run(contact_type, message)
+
+def run_fast_path(query):
+    """Answer a status question from the device store, or run a confident single-intent query
+    directly on its tool. Returns None if it needs an agent."""
+    match = intent_router.route(query)
+    status = answer_from_store(query, match)
+    if status is not None:
+        return status
+    if match is None or match.tool not in FAST_PATH_TOOLS:
+        return None
+    logger.info(f"Fast path: {match.tool}{match.args} (confidence {match.confidence:.2f})")
+    return FAST_PATH_TOOLS[match.tool].func(*match.args)
 
-    result = crew.kickoff()
-    return result
+def answer_from_store(query, match):
+    """Answer a status question from the device store, unless the query also asks for
+    something to be done ("is it hot in here? turn on the AC")"""
+    if match is not None or is_command(query):
+        return None
+    status = devices.answer(query)
+    if status is not None:
+        logger.info("Fast path: answered from the device store")
+    return status
+
+def run_plan_step(step, context):
+    """Execute one plan step, passing along the results of the steps it depends on"""
+    result = run_fast_path(step.query)
+    if result is not None:
+        return result
+    query = step.query
+    if context:
+        query += "\nResults of earlier steps: " + "; ".join(context.values())
+    return crews.kickoff(step.agent, query)
 
 @tool
 def call_computer_agent(query: str):
     """This function calls the email agent, which can execute tasks like sending emails, drafting emails, etc. 
     The function takes in the user query that needs to be executed."""
-    task = Task(
-        description=f'Execute the following user query: {query}',
-        agent=computerAgent,
-        expected_output='A message of confirmation that the task has been executed.',
-    )
-    crew = Crew(
-        agents=[computerAgent],
-        tasks=[task],
-        verbose=True
-    )
-    result = crew.kickoff()
-    return result
+    return crews.kickoff("computer", query)
+
+# Async variants of the query path. Each runs its sync counterpart on an async_runtime
+# executor, so the two cannot drift: crew kickoffs and tools on the shared pool,
+# Selenium on its own thread. The browser tools move their Selenium calls onto the
+# browser thread themselves.
+
+async def acall_smart_home_agent(query):
+    return await run_blocking(call_smart_home_agent.func, query)
+
+async def acall_computer_agent(query):
+    return await run_blocking(call_computer_agent.func, query)
+
+async def acall_browser_agent(query):
+    return await run_blocking(call_browser_agent.func, query)
+
+async def aenhance_message(contact_type, original_message):
+    return await run_blocking(enhance_message.func, contact_type, original_message)
+
+async def asend_friend_email(recipient_type, message):
+    return await run_blocking(send_friend_email.func, recipient_type, message)
+
+async def arun_mail_command(command):
+    return await run_blocking(run_mail_command, command)
+
+async def arun_fast_path(query):
+    return await run_blocking(run_fast_path, query)
+
+async def arun_plan_step(step, context):
+    return await run_blocking(run_plan_step, step, context)
+
+@traced("query", kind="query")
+@devices.coalesce
+async def aexecute_query(user_input, mode=None):
+    """Async execute_query: LLM calls are awaited and blocking work runs in executors,
+    so one event loop can serve many queries at once"""
+    command = parse_mail_command(user_input)
+    if command is not None:
+        return await arun_mail_command(command)
+
+    result = await arun_fast_path(user_input)
+    if result is not None:
+        return result
+
+    if execution_mode(mode) == "flat":
+        return await flat_executor().arun(user_input)
+
+    if PARALLEL_PLANS and is_compound(user_input):
+        try:
+            plan = await amake_plan(chat_llm(), user_input, PLAN_AGENTS)
+        except Exception as e:
+            logger.error(f"Error planning query, falling back to planning agent: {str(e)}")
+            plan = None
+        if plan is not None and len(plan.steps) > 1:
+            results = await aexecute_plan(plan, arun_plan_step, serial_agents=SERIAL_AGENTS)
+            return "\n".join(f"{step.query}: {results[step.id]}" for step in plan.steps)
 
-llm = ChatOpenAI(model="gpt-4o-mini", openai_api_key=os.getenv("OPENAI_API_KEY"))
+    return await crews.akickoff("planning", user_input)
+
+# Chat model for planning and message enhancement, created on first use; tests and
+# benchmarks may assign a stand-in
+llm = None
+
+def chat_llm():
+    global llm
+    if llm is None:
+        llm = get_chat_llm("gpt-4o-mini")
+    return llm
 
 verification = "Make sure to ask for confirmation before calling tools." #Have removed this from the agent prompts for now due to testing
 
-smartHomeAgent = Agent(
-    role='Smart Home Agent',
-    goal='Execute the user query to control smart home devices.',
-    backstory="""You are a smart home agent capable of controlling smart home devices such as the AC,
-    thermostat, lights, etc.""",
-    tools=[turn_on_ac, turn_off_ac, turn_off_lights, turn_on_lights, 
-            set_thermostat, adjust_curtains, start_appliance, stop_appliance, 
-            manage_security, manage_locks, answer_video_doorbell, control_entertainment_device, 
-            search_and_play_content, control_streaming_service, ask_for_user_input, verify_with_user],
-    llm=llm,
-    verbose=True
-)
+SMART_HOME_TOOLS = [
+    turn_on_ac, turn_off_ac, turn_off_lights, turn_on_lights,
+    set_thermostat, adjust_curtains, start_appliance, stop_appliance,
+    manage_security, manage_locks, answer_video_doorbell, control_entertainment_device,
+    search_and_play_content, control_streaming_service, check_device_status, ask_for_user_input, verify_with_user,
+]
+PLANNING_TOOLS = [call_smart_home_agent, call_computer_agent, call_browser_agent]
+COMPUTER_TOOLS = [
+    gmail_create_draft, check_sent_messages, cancel_sent_message, speech_based_search,navigate_links_or_menus, manage_emails,
+    search_files, enable_navigation_and_multiapp, file_operations, manage_messages, manage_social_media,
+    schedule_meeting, perform_online_banking, browse_and_purchase_items,
+    order_groceries, book_ride, public_transit_schedule, fill_online_form,
+    ask_for_user_input, verify_with_user,
+]
 
-planningAgent = Agent(
-    role='Planning Agent',
-    goal='Execute the user query and decide which agents to call',
-    backstory="""You are the outer planning agent, responsible for understanding the user query and sending relevant information
-    to the appropriate agents.""",
-    llm=llm,
-    tools=[call_smart_home_agent, call_computer_agent, call_browser_agent],
-    verbose=True
-)
+# Agents, and with them crewai, Selenium and the browser tool, are only loaded by
+# the first query that needs them; simple commands run on the fast path without them
+def build_smart_home_agent():
+    from crewai import Agent
+    return Agent(
+        role='Smart Home Agent',
+        goal='Execute the user query to control smart home devices.',
+        backstory="""You are a smart home agent capable of controlling smart home devices such as the AC,
+        thermostat, lights, etc.""",
+        tools=agent_tools(SMART_HOME_TOOLS),
+        llm=get_chat_llm("gpt-4o-mini"),
+        verbose=True
+    )
 
-computerAgent = Agent(
-    role='Computer Agent',
-    goal='Execute the user query.',
-    backstory='You are a computer agent capable of managing emails/messages, navigating apps, ordering rides, etc.',
-    llm=llm,
-    tools=[
-        gmail_create_draft, speech_based_search,navigate_links_or_menus, manage_emails,
-        search_files, enable_navigation_and_multiapp, file_operations, manage_messages, manage_social_media,
-        schedule_meeting, perform_online_banking, browse_and_purchase_items,
-        order_groceries, book_ride, public_transit_schedule, fill_online_form, 
-        ask_for_user_input, verify_with_user
-    ],
-    verbose=True
-)
+def build_planning_agent():
+    from crewai import Agent
+    return Agent(
+        role='Planning Agent',
+        goal='Execute the user query and decide which agents to call',
+        backstory="""You are the outer planning agent, responsible for understanding the user query and sending relevant information
+        to the appropriate agents.""",
+        llm=get_chat_llm("gpt-4o-mini"),
+        tools=agent_tools(PLANNING_TOOLS),
+        verbose=True
+    )
+
+def build_computer_agent():
+    from crewai import Agent
+    return Agent(
+        role='Computer Agent',
+        goal='Execute the user query.',
+        backstory='You are a computer agent capable of managing emails/messages, navigating apps, ordering rides, etc.',
+        llm=get_chat_llm("gpt-4o-mini"),
+        tools=agent_tools(COMPUTER_TOOLS),
+        verbose=True
+    )
 
-browserAgent = Agent(
+def build_browser_agent():
+    from crewai import Agent
+    from browser_control import browser_control
+    instrument_tools([browser_control])
+    return Agent(
         role='Browser Control Agent',
         goal='Execute browser-related commands like switching tabs and navigation',
         backstory="""You are a browser control agent capable of managing browser windows,
         tabs, and navigation.""",
-        tools=[browser_control, ask_for_user_input, expand_user_query, verify_with_user],
-        llm=llm,
+        tools=agent_tools([browser_control, ask_for_user_input, expand_user_query, verify_with_user]),
+        llm=get_chat_llm("gpt-4o-mini"),
         verbose=True
-)
+    )
+
+# Agents whose tools are shortlisted per query, so their prompts only carry relevant tools
+SHORTLIST_AGENTS = ("smart_home", "computer")
+_tool_index = None
+
+def select_tools(name, query, tools):
+    global _tool_index
+    if name not in SHORTLIST_AGENTS or TOP_K <= 0:
+        return tools
+    if _tool_index is None:
+        _tool_index = ToolIndex.from_tools(SMART_HOME_TOOLS + COMPUTER_TOOLS)
+    return _tool_index.shortlist(query, tools)
+
+# Each agent's Task and Crew are built once, on its first call, and reused by every later call
+crews = CrewRegistry(tool_selector=select_tools)
+crews.register_factory("planning", build_planning_agent)
+crews.register_factory("smart_home", build_smart_home_agent)
+crews.register_factory("computer", build_computer_agent)
+crews.register_factory("browser", build_browser_agent)
+
+_flat_executor = None
+
+def flat_executor():
+    """Executor for flat mode over the leaf tools of every agent, built on first use"""
+    global _flat_executor
+    if _flat_executor is None:
+        from browser_control import browser_control
+        instrument_tools([browser_control])
+        interactive = (ask_for_user_input, verify_with_user)
+        leaf_tools = [t for t in SMART_HOME_TOOLS + COMPUTER_TOOLS if t not in interactive] + [browser_control]
+        _flat_executor = FlatExecutor(
+            chat_llm,
+            leaf_tools,
+            fallback=lambda query: crews.kickoff("planning", query),
+            afallback=lambda query: crews.akickoff("planning", query),
+            serial_tools=[browser_control.name],
+        )
+    return _flat_executor
+
+AGENT_ATTRIBUTES = {
+    "planningAgent": "planning",
+    "smartHomeAgent": "smart_home",
+    "computerAgent": "computer",
+    "browserAgent": "browser",
+}
+
+def __getattr__(name):
+    """app.smartHomeAgent and the other agents load on first access"""
+    if name in AGENT_ATTRIBUTES:
+        return crews.agent(AGENT_ATTRIBUTES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Every tool call becomes a span of the query's trace while tracing is on
+for tools in (SMART_HOME_TOOLS, PLANNING_TOOLS, COMPUTER_TOOLS):
+    instrument_tools(tools)
+instrument_tools(FAST_PATH_TOOLS.values())
+instrument_tools([expand_user_query])
 
 if __name__ == "__main__":
+    if os.getenv("LLM_WARMUP", "1") != "0":
+        from gmail_session import gmail_session
+        warm_up()
+        gmail_session.warm_up()
+    # Send whatever an earlier run left in the outbox
+    outbox.start()
     user_input = input("Enter your query: ").strip()
     #expanded_input = expand_user_query.run(user_input)
     execute_query(user_input)
+    # Give queued emails and drafts a chance to go out; anything left is sent on the next run
+    outbox.drain()
     
     
     # while True:
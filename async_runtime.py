@@ -0,0 +1,59 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+# Threads for blocking calls (crew kickoffs, tools) made from the event loop
+BLOCKING_WORKERS = int(os.getenv("ASYNC_BLOCKING_WORKERS", "16"))
+
+# Drivers that are not thread-safe get a dedicated single-thread executor, so
+# their calls run one at a time and always on the same thread
+SINGLE_THREAD_POOLS = ("browser",)
+
+_lock = threading.Lock()
+_executors: Dict[str, ThreadPoolExecutor] = {}
+
+
+def executor(pool: str = "default") -> ThreadPoolExecutor:
+    """The named executor, created on first use"""
+    with _lock:
+        if pool not in _executors:
+            workers = 1 if pool in SINGLE_THREAD_POOLS else BLOCKING_WORKERS
+            _executors[pool] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"async-{pool}")
+        return _executors[pool]
+
+
+async def run_blocking(fn: Callable, *args, pool: str = "default", **kwargs):
+    """Run a blocking call on the named executor without blocking the event loop.
+    The caller's context variables are visible inside the call."""
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, fn, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(executor(pool), call)
+
+
+def on_pool_thread(pool: str) -> bool:
+    """Whether the calling thread is one of the named executor's workers"""
+    return threading.current_thread().name.startswith(f"async-{pool}_")
+
+
+def call_in(pool: str, fn: Callable, *args, **kwargs):
+    """Run a blocking call on the named executor from synchronous code and wait for its result.
+    A call made on that executor already runs inline, so nesting cannot deadlock a single-thread pool."""
+    if on_pool_thread(pool):
+        return fn(*args, **kwargs)
+    context = contextvars.copy_context()
+    return executor(pool).submit(context.run, fn, *args, **kwargs).result()
+
+
+def shutdown(wait: bool = True):
+    with _lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for pool in executors:
+        pool.shutdown(wait=wait)
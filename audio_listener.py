@@ -0,0 +1,137 @@
+import logging
+import os
+import queue
+import threading
+from collections import deque
+from typing import Callable, Dict, Optional
+
+import speech_recognition as sr
+
+logger = logging.getLogger(__name__)
+
+# Utterances waiting for transcription; the oldest is dropped when full
+DEFAULT_BUFFER_SIZE = 8
+DEFAULT_PHRASE_TIME_LIMIT = 15
+DEFAULT_BACKEND = os.getenv("RECOGNIZER_BACKEND", "google")
+
+
+def google_backend(recognizer: sr.Recognizer, audio: sr.AudioData) -> str:
+    return recognizer.recognize_google(audio)
+
+
+def whisper_backend(recognizer: sr.Recognizer, audio: sr.AudioData) -> str:
+    """Local Whisper model (needs the openai-whisper package)"""
+    return recognizer.recognize_whisper(audio, model=os.getenv("WHISPER_MODEL", "base.en"))
+
+
+def sphinx_backend(recognizer: sr.Recognizer, audio: sr.AudioData) -> str:
+    """Offline CMU Sphinx (needs the pocketsphinx package)"""
+    return recognizer.recognize_sphinx(audio)
+
+
+# Recognizer backends by name. Each takes (recognizer, audio) and returns the transcript,
+# raising sr.UnknownValueError for unintelligible audio.
+BACKENDS: Dict[str, Callable[[sr.Recognizer, sr.AudioData], str]] = {
+    "google": google_backend,
+    "whisper": whisper_backend,
+    "sphinx": sphinx_backend,
+}
+
+
+class BackgroundListener:
+    """
+    Long-lived microphone listener that turns speech into a queue of transcripts.
+
+    The microphone is calibrated once at start-up and the energy threshold then
+    adapts to the room on its own. Utterances are segmented by voice activity
+    (energy above the threshold, ended by a pause) on speech_recognition's
+    background thread, kept in a bounded ring buffer, and transcribed on a
+    separate worker, so speech keeps being captured while earlier questions
+    are still being processed.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[Callable[[sr.Recognizer, sr.AudioData], str]] = None,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+        phrase_time_limit: Optional[float] = DEFAULT_PHRASE_TIME_LIMIT,
+        microphone: Optional[sr.AudioSource] = None,
+    ):
+        self.backend = backend or BACKENDS[DEFAULT_BACKEND]
+        self.phrase_time_limit = phrase_time_limit
+        self.recognizer = sr.Recognizer()
+        self.recognizer.dynamic_energy_threshold = True
+        self.microphone = microphone
+        self.transcripts: "queue.Queue[str]" = queue.Queue()
+        self._utterances = deque(maxlen=buffer_size)
+        self._available = threading.Condition()
+        self._running = threading.Event()
+        self._stop_listening = None
+        self._worker = None
+
+    def start(self):
+        """Calibrate once and start capturing and transcribing in the background"""
+        if self._running.is_set():
+            return
+        if self.microphone is None:
+            self.microphone = sr.Microphone()
+        with self.microphone as source:
+            print("Calibrating for ambient noise...")
+            self.recognizer.adjust_for_ambient_noise(source)
+        self._running.set()
+        self._worker = threading.Thread(target=self._transcribe_loop, name="transcriber", daemon=True)
+        self._worker.start()
+        self._stop_listening = self.recognizer.listen_in_background(
+            self.microphone, self._on_utterance, phrase_time_limit=self.phrase_time_limit
+        )
+        print("Listening for questions...")
+
+    def stop(self):
+        if not self._running.is_set():
+            return
+        self._running.clear()
+        if self._stop_listening is not None:
+            self._stop_listening(wait_for_stop=False)
+        with self._available:
+            self._available.notify_all()
+        if self._worker is not None:
+            self._worker.join(timeout=5)
+
+    def _on_utterance(self, recognizer: sr.Recognizer, audio: sr.AudioData):
+        with self._available:
+            if len(self._utterances) == self._utterances.maxlen:
+                logger.warning("Utterance buffer full, dropping the oldest utterance")
+            self._utterances.append(audio)
+            self._available.notify()
+
+    def _transcribe_loop(self):
+        while True:
+            with self._available:
+                while not self._utterances and self._running.is_set():
+                    self._available.wait()
+                if not self._running.is_set():
+                    return
+                audio = self._utterances.popleft()
+            try:
+                text = self.backend(self.recognizer, audio)
+            except sr.UnknownValueError:
+                print("Sorry, I could not understand the audio.")
+                continue
+            except sr.RequestError as e:
+                print(f"Could not request results from the speech recognition service: {str(e)}")
+                continue
+            except Exception as e:
+                # A missing recognizer or a decode error must not stop the worker,
+                # or next_transcript() would wait forever
+                logger.error(f"Error transcribing utterance: {str(e)}")
+                continue
+            if text:
+                print(f"Question heard: {text}")
+                self.transcripts.put(text)
+
+    def next_transcript(self, timeout: Optional[float] = None) -> Optional[str]:
+        """Block until the next transcript is available; None on timeout"""
+        try:
+            return self.transcripts.get(timeout=timeout)
+        except queue.Empty:
+            return None
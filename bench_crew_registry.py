@@ -0,0 +1,101 @@
+"""
+Microbenchmark of the fixed per-hop overhead of running an agent through a Crew.
+
+Compares building a fresh Task + Crew for every call (the old call_*_agent
+behaviour) against kicking off a pre-built crew from the CrewRegistry. The
+LLM is stubbed to answer immediately, so the numbers are framework overhead
+only. Run with:
+
+    python bench_crew_registry.py --iterations 200
+"""
+import argparse
+import os
+import statistics
+import time
+
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+from crewai import Agent, Crew, LLM, Task
+
+from crew_registry import CrewRegistry, EXPECTED_OUTPUT
+from smartHomeAgent import turn_on_ac, turn_off_ac, turn_on_lights, turn_off_lights, set_thermostat
+
+
+class StubLLM(LLM):
+    """LLM that immediately returns a final answer without any network calls"""
+
+    def __init__(self):
+        super().__init__(model="gpt-4o-mini")
+
+    def call(self, messages, callbacks=[]):
+        return "Thought: I now know the final answer\nFinal Answer: Done."
+
+
+def make_agent():
+    return Agent(
+        role='Smart Home Agent',
+        goal='Execute the user query to control smart home devices.',
+        backstory='You are a smart home agent capable of controlling smart home devices.',
+        tools=[turn_on_ac, turn_off_ac, turn_on_lights, turn_off_lights, set_thermostat],
+        llm=StubLLM(),
+        verbose=False
+    )
+
+
+def fresh_crew_hop(agent, query):
+    task = Task(
+        description=f'Execute the following user query: {query}',
+        agent=agent,
+        expected_output=EXPECTED_OUTPUT,
+    )
+    crew = Crew(
+        agents=[agent],
+        tasks=[task],
+        verbose=False
+    )
+    return crew.kickoff()
+
+
+def time_hops(hop, iterations):
+    timings = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        hop(f"Turn on the lights ({i})")
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def summarize(label, timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<16} mean {statistics.mean(timings):7.2f} ms   p50 {statistics.median(timings):7.2f} ms   p95 {p95:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=5)
+    args = parser.parse_args()
+
+    before_agent = make_agent()
+    registry = CrewRegistry(verbose=False)
+    registry.register("smart_home", make_agent())
+
+    before = lambda query: fresh_crew_hop(before_agent, query)
+    after = lambda query: registry.kickoff("smart_home", query)
+
+    time_hops(before, args.warmup)
+    time_hops(after, args.warmup)
+
+    before_timings = time_hops(before, args.iterations)
+    after_timings = time_hops(after, args.iterations)
+
+    print(f"Per-hop overhead over {args.iterations} iterations (stubbed LLM):")
+    summarize("fresh Task+Crew", before_timings)
+    summarize("CrewRegistry", after_timings)
+    saved = statistics.mean(before_timings) - statistics.mean(after_timings)
+    print(f"Saved per hop: {saved:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+"""
+Latency benchmark of the agent pipeline against a scripted fake LLM.
+
+Replays the query corpus (corpus/gpt-4o-mini/completions.txt) and the test.py
+cases through execute_query. The fake LLM waits --llm-latency ms and then
+answers with the tool calls each query expects, so runs are deterministic and
+need no network. Each query's wall time is split into LLM wait, tool time and
+framework overhead (everything else), and p50/p95/p99 are reported for each.
+Run with:
+
+    python bench_pipeline.py --llm-latency 200 --repeat 3 --json bench.json
+    python bench_pipeline.py --compare bench.json
+    python bench_pipeline.py --mode flat --compare bench.json
+
+--mode flat runs the queries in the single-hop tool-calling mode; the fake
+model then returns all of a query's tool calls in one reply.
+
+LLM and tool time are summed over concurrently running plan steps, so for
+parallel plans they can add up to more than the wall time; framework overhead
+is clamped at zero in that case.
+"""
+import argparse
+import ast
+import contextlib
+import io
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+os.environ.setdefault("OPENAI_API_KEY", "sk-stub")
+# Fake answers must not end up in the real response cache
+os.environ["LLM_CACHE"] = "0"
+
+from crewai import LLM
+
+from call_journal import journal
+from intent_router import INTENT_PATTERNS, TEST_CASES_PATH, VERBATIM_ARGS, load_corpus_examples
+
+# Agent roles as they appear in the system prompt, and the tool the planner delegates with
+AGENT_ROLES = {
+    "Planning Agent": "planning",
+    "Smart Home Agent": "smart_home",
+    "Computer Agent": "computer",
+    "Browser Control Agent": "browser",
+}
+DELEGATION_TOOLS = {
+    "smart_home": "call_smart_home_agent",
+    "computer": "call_computer_agent",
+    "browser": "call_browser_agent",
+}
+# Tools the fake never calls: agent hops (timed as part of the pipeline) and interactive prompts
+NON_LEAF_TOOLS = set(DELEGATION_TOOLS.values()) | {"ask_for_user_input", "verify_with_user", "expand_user_query"}
+PERCENTILES = (50, 95, 99)
+COMPONENTS = ("wall", "llm", "tool", "framework")
+
+
+class Timings:
+    """LLM and tool time accumulated by the current query, across threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.llm = 0.0
+            self.tool = 0.0
+
+    def add(self, component, seconds):
+        with self._lock:
+            setattr(self, component, getattr(self, component) + seconds)
+
+
+timings = Timings()
+
+
+def load_test_cases(path=TEST_CASES_PATH):
+    """(query, expected_calls) pairs from the test_cases literal in test.py"""
+    with open(path, 'r') as f:
+        tree = ast.parse(f.read())
+    cases = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.List):
+            try:
+                value = ast.literal_eval(node.value)
+            except ValueError:
+                continue
+            cases.extend(
+                (case["query"], [tuple(call) for call in case["expected_calls"]])
+                for case in value if isinstance(case, dict) and "query" in case
+            )
+    return cases
+
+
+def corpus_calls(query, tool, tool_params):
+    """Expected calls for a corpus query; arguments come from the intent patterns or repeat the query"""
+    if tool is None:
+        return []
+    pattern, arg_names = INTENT_PATTERNS[tool]
+    match = re.search(pattern, query.strip().rstrip('.!?'), re.IGNORECASE)
+    if match and arg_names:
+        values = [match.group(name).strip() for name in arg_names]
+        return [(tool, tuple(v if name in VERBATIM_ARGS else v.lower() for name, v in zip(arg_names, values)))]
+    return [(tool, tuple(query for _ in tool_params[tool]))]
+
+
+def tool_parameters(tool):
+    schema = getattr(tool, "args_schema", None)
+    if schema is not None and hasattr(schema, "model_fields"):
+        return list(schema.model_fields)
+    return list(getattr(tool, "args", {}))
+
+
+class ScriptedPipeline:
+    """Fake LLMs for the crews and the planner that replay the expected tool calls of each query"""
+
+    def __init__(self, app, latency):
+        self.app = app
+        self.latency = latency
+        self.scripts = {}
+        self.owners = {}
+        self.params = {}
+        for agent_name, agent in [
+            ("smart_home", app.smartHomeAgent), ("computer", app.computerAgent), ("browser", app.browserAgent),
+        ]:
+            for tool in agent.tools:
+                self.owners.setdefault(tool.name, agent_name)
+                self.params[tool.name] = tool_parameters(tool)
+
+    def add(self, query, calls):
+        self.scripts[query] = calls
+
+    def _wait(self):
+        start = time.perf_counter()
+        time.sleep(self.latency)
+        timings.add("llm", time.perf_counter() - start)
+
+    def actions(self, role, query):
+        calls = self.scripts.get(query, [])
+        if role == "planning":
+            agents = []
+            for tool, _ in calls:
+                agent = self.owners.get(tool)
+                if agent and agent not in agents:
+                    agents.append(agent)
+            return [(DELEGATION_TOOLS[agent], {"query": query}) for agent in agents]
+        return [
+            (tool, dict(zip(self.params[tool], args)))
+            for tool, args in calls if self.owners.get(tool) == role
+        ]
+
+    def crew_call(self, messages):
+        """Stands in for crewai's LLM.call: one ReAct step per call"""
+        self._wait()
+        system = messages[0]["content"]
+        role_match = re.match(r"You are (.+?)\.", system)
+        role = AGENT_ROLES.get(role_match.group(1) if role_match else "", "")
+        user = next((m["content"] for m in messages if m["role"] == "user"), "")
+        query_match = re.search(r"Execute the following user query: (.*)", user)
+        query = query_match.group(1).strip() if query_match else ""
+        done = sum(m["content"].count("Observation:") for m in messages if m["role"] == "assistant")
+        actions = self.actions(role, query)
+        if done < len(actions):
+            name, kwargs = actions[done]
+            return f"Thought: I need to use {name}\nAction: {name}\nAction Input: {json.dumps(kwargs)}"
+        return "Thought: I now know the final answer\nFinal Answer: Done."
+
+    def chat_answer(self, prompt):
+        """Answers for direct chat model calls: plans for compound queries, text otherwise"""
+        match = re.search(r'User query: "(.*)"', prompt)
+        if "Split the following user query" in prompt and match:
+            query = match.group(1)
+            steps = []
+            for i, call in enumerate(self.scripts.get(query, []), 1):
+                # The ';' keeps step queries off the fast path, like the real compound sub-tasks
+                step_query = f"{query}; step {i}"
+                self.add(step_query, [call])
+                steps.append({"id": str(i), "agent": self.owners.get(call[0], "computer"), "query": step_query, "depends_on": []})
+            return json.dumps({"steps": steps})
+        return "Done."
+
+    def flat_answer(self, messages):
+        """Reply of the flat-mode model: every expected tool call of the query at once"""
+        query = messages[-1][1]
+        calls = [(tool, args) for tool, args in self.scripts.get(query, []) if tool in self.owners]
+        return SimpleNamespace(content="" if calls else "Done.", tool_calls=[
+            {"name": tool, "args": dict(zip(self.params[tool], args)), "id": f"call_{i}"}
+            for i, (tool, args) in enumerate(calls)
+        ])
+
+    def install(self):
+        pipeline = self
+
+        def call(self, messages, callbacks=[]):
+            return pipeline.crew_call(messages)
+
+        class ChatModel:
+            model_name = "scripted"
+            temperature = None
+            max_tokens = None
+
+            def invoke(self, input, **kwargs):
+                pipeline._wait()
+                return SimpleNamespace(content=pipeline.chat_answer(input))
+
+            def bind_tools(self, tools, **kwargs):
+                return ToolCallingModel()
+
+        class ToolCallingModel:
+            def invoke(self, messages, **kwargs):
+                pipeline._wait()
+                return pipeline.flat_answer(messages)
+
+        LLM.call = call
+        self.app.llm = ChatModel()
+
+        leaf_tools = {t.name: t for t in self.app.FAST_PATH_TOOLS.values()}
+        for agent in (self.app.smartHomeAgent, self.app.computerAgent, self.app.browserAgent):
+            leaf_tools.update((t.name, t) for t in agent.tools if t.name not in NON_LEAF_TOOLS)
+        for tool in leaf_tools.values():
+            tool.func = timed(tool.func)
+
+
+def timed(func):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings.add("tool", time.perf_counter() - start)
+    return wrapper
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = (len(values) - 1) * p / 100
+    low = int(k)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (k - low)
+
+
+def summarize(samples):
+    return {
+        component: {
+            "mean": round(sum(s[component] for s in samples) / len(samples), 3),
+            **{f"p{p}": round(percentile([s[component] for s in samples], p), 3) for p in PERCENTILES},
+        }
+        for component in COMPONENTS
+    }
+
+
+def run_query(app, query, expected, mode="hierarchical"):
+    timings.reset()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), journal.request() as request:
+        app.execute_query(query, mode=mode)
+    calls = journal.snapshot(request)
+    wall = (time.perf_counter() - start) * 1000
+    llm_ms, tool_ms = timings.llm * 1000, timings.tool * 1000
+    return {
+        "query": query,
+        "wall": wall,
+        "llm": llm_ms,
+        "tool": tool_ms,
+        "framework": max(0.0, wall - llm_ms - tool_ms),
+        "correct": all(call in calls for call in expected),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_report(report):
+    print(f"{report['queries']} queries x {report['config']['repeat']} runs in {report['config'].get('mode', 'hierarchical')} mode, "
+          f"LLM latency {report['config']['llm_latency_ms']} ms, {report['correct']} with the expected calls")
+    print(f"{'ms':<10}" + "".join(f"{name:>10}" for name in ("mean",) + tuple(f"p{p}" for p in PERCENTILES)))
+    for component in COMPONENTS:
+        stats = report["stats"][component]
+        print(f"{component:<10}" + "".join(f"{stats[key]:>10.2f}" for key in ("mean",) + tuple(f"p{p}" for p in PERCENTILES)))
+
+
+def print_comparison(old, new):
+    print(f"Change from {old.get('commit') or 'baseline'} to {new.get('commit') or 'current'} (ms):")
+    for component in COMPONENTS:
+        deltas = []
+        for key in ("mean",) + tuple(f"p{p}" for p in PERCENTILES):
+            before, after = old["stats"][component][key], new["stats"][component][key]
+            deltas.append(f"{key} {after - before:+8.2f}")
+        print(f"{component:<10} " + "  ".join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--llm-latency", type=float, default=200, help="fake LLM latency per call in ms")
+    parser.add_argument("--repeat", type=int, default=3, help="passes over the corpus")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed passes before measuring")
+    parser.add_argument("--mode", choices=("hierarchical", "flat"), default="hierarchical", help="execution mode")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--compare", help="earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    import app
+    logging.getLogger().setLevel(logging.WARNING)
+
+    pipeline = ScriptedPipeline(app, args.llm_latency / 1000)
+    cases = load_test_cases()
+    cases += [(query, corpus_calls(query, tool, pipeline.params)) for query, tool in load_corpus_examples()]
+    for query, calls in cases:
+        pipeline.add(query, calls)
+    pipeline.install()
+
+    for _ in range(args.warmup):
+        for query, calls in cases:
+            run_query(app, query, calls, args.mode)
+
+    samples = []
+    for _ in range(args.repeat):
+        for query, calls in cases:
+            samples.append(run_query(app, query, calls, args.mode))
+
+    report = {
+        "commit": git_commit(),
+        "config": {"llm_latency_ms": args.llm_latency, "repeat": args.repeat, "parallel_plans": app.PARALLEL_PLANS, "mode": args.mode},
+        "queries": len(cases),
+        "correct": sum(s["correct"] for s in samples[:len(cases)]),
+        "stats": summarize(samples),
+        "per_query": [{k: round(v, 3) if isinstance(v, float) else v for k, v in s.items()} for s in samples[:len(cases)]],
+    }
+    print_report(report)
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            print_comparison(json.load(f), report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
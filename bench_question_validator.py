@@ -0,0 +1,76 @@
+"""
+Benchmark of the local question validator against the labeled transcripts.
+
+Reports leave-one-out accuracy of the local classifier, how often it would
+escalate to the LLM, and its per-call latency. With --llm (needs
+OPENAI_API_KEY) every transcript is also sent to the LLM validator to report
+agreement with it and the latency saved. Run with:
+
+    python bench_question_validator.py [--llm]
+"""
+import argparse
+import statistics
+import time
+
+from question_classifier import DEFAULT_CONFIDENCE_THRESHOLD, QuestionClassifier, load_labeled_transcripts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threshold", type=float, default=DEFAULT_CONFIDENCE_THRESHOLD)
+    parser.add_argument("--llm", action="store_true", help="also run the LLM validator for agreement and latency")
+    args = parser.parse_args()
+
+    examples = load_labeled_transcripts()
+
+    # Leave-one-out, so every transcript is scored by a model that never saw it
+    local = []
+    for i, (text, label) in enumerate(examples):
+        classifier = QuestionClassifier.train(examples[:i] + examples[i + 1:])
+        is_valid, confidence = classifier.classify(text)
+        local.append((is_valid, confidence))
+
+    confident = [(pred, label) for (pred, conf), (_, label) in zip(local, examples) if conf >= args.threshold]
+    correct = sum(pred == label for (pred, _), (_, label) in zip(local, examples))
+    print(f"Labeled transcripts: {len(examples)}")
+    print(f"Local accuracy (all):       {correct / len(examples):.1%}")
+    if confident:
+        print(f"Local accuracy (confident): {sum(p == l for p, l in confident) / len(confident):.1%}")
+    print(f"Handled locally: {len(confident)}/{len(examples)} (escalated to LLM: {len(examples) - len(confident)})")
+
+    classifier = QuestionClassifier.from_corpus()
+    timings = []
+    for _ in range(20):
+        for text, _ in examples:
+            start = time.perf_counter()
+            classifier.classify(text)
+            timings.append((time.perf_counter() - start) * 1e6)
+    local_us = statistics.mean(timings)
+    print(f"Local latency: mean {local_us:.1f} us, max {max(timings):.1f} us")
+
+    if not args.llm:
+        return
+
+    from mc_response import llm_validate_question
+
+    agree = 0
+    agree_confident = 0
+    llm_timings = []
+    for (text, _), (is_valid, confidence) in zip(examples, local):
+        start = time.perf_counter()
+        result = llm_validate_question(text)
+        llm_timings.append((time.perf_counter() - start) * 1000)
+        agree += result.is_valid == is_valid
+        if confidence >= args.threshold:
+            agree_confident += result.is_valid == is_valid
+
+    llm_ms = statistics.mean(llm_timings)
+    print(f"Agreement with LLM (all):       {agree / len(examples):.1%}")
+    if confident:
+        print(f"Agreement with LLM (confident): {agree_confident / len(confident):.1%}")
+    print(f"LLM latency: mean {llm_ms:.0f} ms")
+    print(f"Mean latency saved per transcript: {llm_ms * len(confident) / len(examples):.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Load test of the multi-session server against a stubbed LLM.
+
+Starts the server in-process with the crew and planning LLMs stubbed to
+answer after a fixed delay and the browser replaced by a fake, then opens
+--sessions sessions that each send --queries queries concurrently over HTTP.
+Reports throughput and latency percentiles. Run with:
+
+    python bench_server_load.py --sessions 20 --queries 10 --llm-latency 50
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import time
+from types import SimpleNamespace
+
+import aiohttp
+from aiohttp import web
+
+QUERIES = [
+    "Turn on the lights.",
+    "mail friend see you at dinner",
+    "Get the living room ready for movie night.",
+    "Lock the doors and turn off the AC.",
+]
+
+
+class StubChatModel:
+    """Stands in for the ChatOpenAI client used for planning and message enhancement"""
+    model_name = "stub"
+    temperature = None
+    max_tokens = None
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def _answer(self, prompt):
+        if "Split the following user query" in prompt:
+            return json.dumps({"steps": [
+                {"id": "1", "agent": "smart_home", "query": "Lock the doors.", "depends_on": []},
+                {"id": "2", "agent": "smart_home", "query": "Turn off the AC.", "depends_on": []},
+            ]})
+        return "Hi! See you at dinner."
+
+    def invoke(self, input, **kwargs):
+        time.sleep(self.latency)
+        return SimpleNamespace(content=self._answer(input))
+
+    async def ainvoke(self, input, **kwargs):
+        await asyncio.sleep(self.latency)
+        return SimpleNamespace(content=self._answer(input))
+
+
+class FakeBrowser:
+    def switch_to_tab(self, name):
+        return True
+
+    def compose_email(self, recipient, subject, message):
+        return True
+
+
+def stub_environment():
+    """Set before app, outbox and crewai are imported, which read these at import time"""
+    os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+    os.environ.setdefault("OPENAI_API_KEY", "sk-stub")
+    # Stub answers must not end up in the real response cache
+    os.environ["LLM_CACHE"] = "0"
+    # Nor the fake sends in the real outbox
+    os.environ["OUTBOX_PATH"] = ":memory:"
+
+
+def stub_llms(latency):
+    from crewai import LLM
+    import app
+
+    def call(self, messages, callbacks=[]):
+        time.sleep(latency)
+        return "Thought: I now know the final answer\nFinal Answer: Done."
+
+    LLM.call = call
+    app.llm = StubChatModel(latency)
+    app.crews.load_all()
+    logging.getLogger().setLevel(logging.WARNING)
+    return app
+
+
+async def run_session(client, base, queries, latencies, errors):
+    async with client.post(f"{base}/sessions") as response:
+        session_id = (await response.json())["session_id"]
+    for i in range(queries):
+        query = QUERIES[i % len(QUERIES)]
+        start = time.perf_counter()
+        async with client.post(f"{base}/sessions/{session_id}/query", json={"query": query}) as response:
+            body = await response.json() if response.status == 200 else None
+        latencies.append((time.perf_counter() - start) * 1000)
+        if body is None or body["result"].startswith("Error"):
+            errors.append(query)
+    await client.delete(f"{base}/sessions/{session_id}")
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=10, help="queries per session")
+    parser.add_argument("--llm-latency", type=float, default=50, help="stubbed LLM latency in ms")
+    parser.add_argument("--max-concurrent", type=int, default=8, help="server query concurrency")
+    args = parser.parse_args()
+
+    stub_environment()
+    from server import create_app
+    from sessions import SessionManager
+
+    app = stub_llms(args.llm_latency / 1000)
+    manager = SessionManager(app.load_contacts, browser_factory=FakeBrowser, max_sessions=args.sessions)
+    runner = web.AppRunner(create_app(app.aexecute_query, manager, args.max_concurrent))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    base = f"http://127.0.0.1:{runner.addresses[0][1]}"
+
+    latencies, errors = [], []
+    start = time.perf_counter()
+    async with aiohttp.ClientSession() as client:
+        await asyncio.gather(*(
+            run_session(client, base, args.queries, latencies, errors) for _ in range(args.sessions)
+        ))
+    elapsed = time.perf_counter() - start
+    await runner.cleanup()
+
+    print(f"{len(latencies)} queries from {args.sessions} sessions in {elapsed:.2f} s "
+          f"({len(latencies) / elapsed:.1f} queries/s, {len(errors)} errors)")
+    print(f"latency ms: mean {statistics.mean(latencies):.1f}  p50 {percentile(latencies, 0.5):.1f}  "
+          f"p95 {percentile(latencies, 0.95):.1f}  p99 {percentile(latencies, 0.99):.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -6,12 +6,21 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, WebDriverException
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.action_chains import ActionChains
-from crewai_tools import tool
+from lazy_tools import tool
 import logging
 import sys
 import subprocess
 import time
 import os
+import json
+import difflib
+import urllib.parse
+import urllib.request
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from tracing import span
+from async_runtime import call_in
 
 logging.basicConfig(
     level=logging.DEBUG,
@@ -20,9 +29,73 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+DEBUGGER_ADDRESS = "127.0.0.1:9222"
+TAB_INDEX_TTL = 2.0
+FUZZY_CUTOFF = 0.75
+POLL_INTERVAL = 0.1
+# Seconds to wait before sending a composed email, so the user can cancel; 0 sends immediately
+EMAIL_UNDO_WINDOW = float(os.getenv("EMAIL_UNDO_WINDOW", "5"))
+
+Tab = namedtuple('Tab', ['target_id', 'title', 'url'])
+
+class TabIndex:
+    """Index of open tabs built from a single DevTools target listing"""
+
+    def __init__(self, debugger_address=DEBUGGER_ADDRESS, ttl=TAB_INDEX_TTL):
+        self.endpoint = f"http://{debugger_address}/json/list"
+        self.ttl = ttl
+        self.tabs = []
+        self.available = False
+        self._loaded_at = None
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def refresh(self):
+        try:
+            with urllib.request.urlopen(self.endpoint, timeout=2) as response:
+                targets = json.load(response)
+        except Exception as e:
+            logger.warning(f"Could not load DevTools tab listing: {str(e)}")
+            self.available = False
+            self.tabs = []
+            return
+        self.tabs = [
+            Tab(t['id'], t.get('title', ''), t.get('url', ''))
+            for t in targets if t.get('type') == 'page'
+        ]
+        self.available = True
+        self._loaded_at = time.monotonic()
+        logger.debug(f"Indexed {len(self.tabs)} tabs")
+
+    def find(self, search_term, refresh=False):
+        """Return the best tab for search_term: a substring match on title or URL, else the closest fuzzy match"""
+        if refresh or self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+            self.refresh()
+
+        term = search_term.lower()
+        for tab in self.tabs:
+            if term in tab.title.lower() or term in tab.url.lower():
+                return tab
+
+        best, best_score = None, FUZZY_CUTOFF
+        for tab in self.tabs:
+            host = urllib.parse.urlparse(tab.url).hostname or ''
+            words = [tab.title.lower()] + tab.title.lower().split() + host.split('.')
+            for word in words:
+                score = difflib.SequenceMatcher(None, term, word).ratio()
+                if score > best_score:
+                    best, best_score = tab, score
+        return best
+
 class BrowserControl:
     def __init__(self):
         self.driver = None
+        self.tab_index = TabIndex()
+        self._skip_review = threading.Event()
+        self._cancel_send = threading.Event()
+        # Set while an email is being composed and can still be cancelled
+        self._composing = threading.Event()
         
     def start_chrome_debugger(self):
         """Start Chrome with debugging port if not already running"""
@@ -36,18 +109,94 @@ class BrowserControl:
                     '--remote-debugging-port=9222',
                     '--user-data-dir=/tmp/chrome_debug_profile'
                 ])
-                time.sleep(3)
+                with self.timed_step("wait for Chrome debugger"):
+                    self.wait_for_debugger()
         except Exception as e:
             logger.error(f"Error starting Chrome: {str(e)}")
             raise
 
+    def wait_for_debugger(self, timeout=15):
+        """Poll the DevTools endpoint until Chrome accepts connections"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                with urllib.request.urlopen(f"http://{DEBUGGER_ADDRESS}/json/version", timeout=1):
+                    return
+            except Exception:
+                time.sleep(0.1)
+        raise TimeoutException(f"Chrome debugger did not come up within {timeout}s")
+
+    @contextmanager
+    def timed_step(self, name):
+        """Log how long a browser step took, and trace it as a browser span"""
+        start = time.perf_counter()
+        try:
+            with span(name, "browser"):
+                yield
+        finally:
+            logger.info(f"[timing] {name}: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    def wait_for_page_ready(self, timeout=20, idle_time=0.5):
+        """Wait until the document has loaded and no new network requests started for idle_time seconds"""
+        WebDriverWait(self.driver, timeout).until(
+            lambda d: d.execute_script("return document.readyState") == "complete"
+        )
+        count_script = "return performance.getEntriesByType('resource').length"
+        deadline = time.monotonic() + timeout
+        last_count = self.driver.execute_script(count_script)
+        last_change = time.monotonic()
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            count = self.driver.execute_script(count_script)
+            if count != last_count:
+                last_count, last_change = count, time.monotonic()
+            elif time.monotonic() - last_change >= idle_time:
+                return
+        logger.warning("Network did not go idle before timeout")
+
+    def wait_for_dom_quiet(self, timeout=5, quiet_time=0.3):
+        """Wait until the DOM has stopped changing for quiet_time seconds"""
+        self.driver.execute_script("""
+            if (!window.__bciObserver) {
+                window.__bciLastMutation = Date.now();
+                window.__bciObserver = new MutationObserver(() => { window.__bciLastMutation = Date.now(); });
+                window.__bciObserver.observe(document, {childList: true, subtree: true, attributes: true});
+            }
+        """)
+        WebDriverWait(self.driver, timeout, poll_frequency=POLL_INTERVAL).until(
+            lambda d: d.execute_script("return Date.now() - window.__bciLastMutation") >= quiet_time * 1000
+        )
+
+    def skip_review(self):
+        """Send the email being composed now instead of waiting out the undo window"""
+        self._skip_review.set()
+
+    def cancel_send(self):
+        """Abort sending the email being composed, up to the end of the undo window.
+        Returns False if no email is being composed or it is already past its undo window."""
+        self._cancel_send.set()
+        return self._composing.is_set()
+
+    def review_window(self, seconds):
+        """Give the user a chance to review before sending. Returns False if they cancelled."""
+        if seconds <= 0:
+            return True
+        logger.info(f"Sending in {seconds:g}s (call skip_review() to send now or cancel_send() to abort)")
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            if self._cancel_send.is_set():
+                return False
+            if self._skip_review.wait(timeout=min(POLL_INTERVAL, deadline - time.monotonic())):
+                break
+        return not self._cancel_send.is_set()
+
     def initialize_driver(self):
         """Initialize the Chrome driver if not already running"""
         if not self.driver:
             try:
                 logger.debug("Setting up Chrome options...")
                 options = webdriver.ChromeOptions()
-                options.add_experimental_option("debuggerAddress", "127.0.0.1:9222")
+                options.add_experimental_option("debuggerAddress", DEBUGGER_ADDRESS)
                 options.add_argument('--no-sandbox')
                 options.add_argument('--disable-dev-shm-usage')
                 
@@ -66,30 +215,20 @@ class BrowserControl:
         """Switch to a tab containing the specified search term in its title or URL"""
         logger.debug(f"Attempting to switch to tab containing: {search_term}")
         self.initialize_driver()
-        found = False
         
         try:
             logger.info(f"Looking for tab containing: {search_term}")
-            handles = self.driver.window_handles
-            logger.info(f"Found {len(handles)} window handles")
-            
-            for handle in handles:
-                logger.debug(f"Checking handle: {handle}")
-                self.driver.switch_to.window(handle)
-                title = self.driver.title
-                url = self.driver.current_url
-                logger.info(f"Checking tab - Title: {title}, URL: {url}")
-                
-                if search_term.lower() in title.lower() or search_term.lower() in url.lower():
-                    found = True
-                    logger.info(f"Found matching tab: {title}")
-                    break
+            found = self._switch_via_index(search_term)
+            if found is None:
+                # DevTools listing unavailable, check each tab through WebDriver
+                found = self._switch_by_scanning(search_term)
                     
             if not found:
                 logger.info(f"Tab not found, opening new tab for: {search_term}")
                 if search_term.lower() == 'gmail':
                     self.driver.execute_script("window.open('https://gmail.com', '_blank');")
                     self.driver.switch_to.window(self.driver.window_handles[-1])
+                    self.tab_index.invalidate()
                     found = True
                     
             return found
@@ -98,58 +237,108 @@ class BrowserControl:
             logger.error(f"Error in switch_to_tab: {str(e)}")
             raise
 
-    def compose_email(self, recipient, subject, message):
-        """Compose a new email in Gmail with recipient, subject, and message"""
+    def _switch_via_index(self, search_term):
+        """Switch directly to the matching tab using the DevTools tab index.
+        Returns None if the index could not be loaded or its tab has no WebDriver handle."""
+        unmatched = False
+        for refresh in (False, True):
+            tab = self.tab_index.find(search_term, refresh=refresh)
+            if tab is None:
+                if self.tab_index.available:
+                    continue
+                return None
+            handle = self._handle_for_target(tab.target_id)
+            if handle is not None:
+                self.driver.switch_to.window(handle)
+                logger.info(f"Found matching tab: {tab.title}")
+                return True
+            unmatched = True
+        if unmatched:
+            logger.info("Indexed tab has no WebDriver handle, checking each tab instead")
+            return None
+        return False
+
+    def _handle_for_target(self, target_id):
+        for handle in self.driver.window_handles:
+            # chromedriver handles are the DevTools target id, possibly prefixed
+            if handle == target_id or handle.endswith(f"-{target_id}"):
+                return handle
+        return None
+
+    def _switch_by_scanning(self, search_term):
+        handles = self.driver.window_handles
+        logger.info(f"Found {len(handles)} window handles")
+        
+        for handle in handles:
+            logger.debug(f"Checking handle: {handle}")
+            self.driver.switch_to.window(handle)
+            title = self.driver.title
+            url = self.driver.current_url
+            logger.info(f"Checking tab - Title: {title}, URL: {url}")
+            
+            if search_term.lower() in title.lower() or search_term.lower() in url.lower():
+                logger.info(f"Found matching tab: {title}")
+                return True
+        return False
+
+    def compose_email(self, recipient, subject, message, review_seconds=None):
+        """Compose a new email in Gmail with recipient, subject, and message.
+        recipient may be a list of addresses, which all go into one message.
+        Waits review_seconds (default EMAIL_UNDO_WINDOW) before sending so the user can cancel."""
+        if review_seconds is None:
+            review_seconds = EMAIL_UNDO_WINDOW
+        self._skip_review.clear()
+        self._cancel_send.clear()
+        self._composing.set()
         try:
             logger.info("Attempting to compose new email")
             
-            wait = WebDriverWait(self.driver, 20)
-            compose_button = wait.until(
-                EC.element_to_be_clickable((By.CSS_SELECTOR, 'div[role="button"][gh="cm"]'))
-            )
-            compose_button.click()
-            logger.info("Clicked compose button")
-            
-            time.sleep(2)
-            
-            to_field = wait.until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, 'input[role="combobox"][type="text"]'))
-            )
-            to_field.send_keys(recipient)
-            logger.info("Entered recipient")
-            
-            subject_field = wait.until(
-                EC.presence_of_element_located((By.NAME, 'subjectbox'))
-            )
-            subject_field.send_keys(subject)
-            logger.info("Entered subject")
-            
-            try:
-                # Method 1: Using iframe
-                iframe = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'div[role="dialog"] iframe')))
-                self.driver.switch_to.frame(iframe)
-                body = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'div[role="textbox"]')))
-                body.send_keys(message)
-                logger.info("Entered message using iframe method")
-                self.driver.switch_to.default_content()
-            except Exception as e:
-                logger.info(f"Iframe method failed: {str(e)}, trying alternate method")
+            wait = WebDriverWait(self.driver, 20, poll_frequency=POLL_INTERVAL)
+            with self.timed_step("open compose dialog"):
+                compose_button = wait.until(
+                    EC.element_to_be_clickable((By.CSS_SELECTOR, 'div[role="button"][gh="cm"]'))
+                )
+                compose_button.click()
+                logger.info("Clicked compose button")
+                
+                to_field = wait.until(
+                    EC.element_to_be_clickable((By.CSS_SELECTOR, 'div[role="dialog"] input[role="combobox"][type="text"]'))
+                )
+
+            recipients = [recipient] if isinstance(recipient, str) else list(recipient)
+            with self.timed_step("enter recipient and subject"):
+                # Gmail turns each comma-terminated address into a recipient chip
+                to_field.send_keys(", ".join(recipients) + (", " if len(recipients) > 1 else ""))
+                logger.info(f"Entered {len(recipients)} recipient(s)")
                 
-                # Method 2: Direct message body
-                self.driver.switch_to.default_content()
-                body = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'div[role="textbox"][aria-label="Message Body"]')))
-                body.send_keys(message)
-                logger.info("Entered message using direct method")
+                subject_field = wait.until(
+                    EC.element_to_be_clickable((By.NAME, 'subjectbox'))
+                )
+                subject_field.send_keys(subject)
+                logger.info("Entered subject")
+            
+            with self.timed_step("enter message body"):
+                self._enter_body(wait, message)
+
+            with self.timed_step("wait for compose dialog to settle"):
+                # Gmail turns addresses into chips and saves the draft after typing stops
+                try:
+                    self.wait_for_dom_quiet()
+                except TimeoutException:
+                    logger.warning("Compose dialog kept changing, sending anyway")
             
-            # Pause for 5 seconds
-            logger.info("Pausing for 5 seconds before sending...")
-            time.sleep(5)
+            with self.timed_step("undo window"):
+                if not self.review_window(review_seconds):
+                    logger.info("Sending cancelled by user, leaving the draft open")
+                    return False
+                self._composing.clear()
             
-            send_button = wait.until(
-                EC.element_to_be_clickable((By.CSS_SELECTOR, 'div[role="dialog"] div[role="button"][aria-label*="Send"]'))
-            )
-            send_button.click()
-            logger.info("Clicked send button")
+            with self.timed_step("send"):
+                send_button = wait.until(
+                    EC.element_to_be_clickable((By.CSS_SELECTOR, 'div[role="dialog"] div[role="button"][aria-label*="Send"]'))
+                )
+                send_button.click()
+                logger.info("Clicked send button")
             
             return True
             
@@ -157,12 +346,38 @@ class BrowserControl:
             logger.error(f"Error in compose_email: {str(e)}")
             self.driver.switch_to.default_content()  # Reset frame focus
             raise
+        finally:
+            self._composing.clear()
+
+    def _enter_body(self, wait, message):
+        """Type the message body, via the compose iframe when Gmail uses one"""
+        try:
+            # Method 1: Using iframe
+            iframe = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'div[role="dialog"] iframe')))
+            self.driver.switch_to.frame(iframe)
+            body = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'div[role="textbox"]')))
+            body.send_keys(message)
+            logger.info("Entered message using iframe method")
+            self.driver.switch_to.default_content()
+        except Exception as e:
+            logger.info(f"Iframe method failed: {str(e)}, trying alternate method")
+            
+            # Method 2: Direct message body
+            self.driver.switch_to.default_content()
+            body = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'div[role="textbox"][aria-label="Message Body"]')))
+            body.send_keys(message)
+            logger.info("Entered message using direct method")
 
 browser_controller = BrowserControl()
 
 @tool
 def browser_control(command: str) -> str:
     """Controls browser actions like switching tabs or navigating to websites"""
+    # The driver is shared by every agent, plan step and the outbox, so all Selenium
+    # calls run on the async runtime's single browser thread
+    return call_in("browser", run_browser_command, command)
+
+def run_browser_command(command):
     logger.info(f"Received command: {command}")
     
     try:
@@ -172,7 +387,8 @@ def browser_control(command: str) -> str:
                 if not success:
                     return "Failed to access Gmail"
                 
-                time.sleep(2)  # Give Gmail time to load
+                with browser_controller.timed_step("wait for Gmail to load"):
+                    browser_controller.wait_for_page_ready()
                 recipient = "emailypark@gmail.com"
                 subject = "testing for bci agents group"
                 message = "hello this is emily :)))"
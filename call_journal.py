@@ -0,0 +1,145 @@
+"""
+Journal of tool calls, kept per request.
+
+Every query that runs inside journal.request() gets its own fixed-size ring
+buffer, found by request id in constant time. The request follows the query
+through a context variable, so concurrent sessions and plan-step threads
+never mix their calls. Only the most recent requests are kept, which bounds
+memory in a long-running server. Calls made outside any request (the CLI,
+test.py) go to journal.default.
+
+Set CALL_LOG to also append every call to a JSONL file for audit and replay:
+
+    {"time": ..., "request_id": ..., "session_id": ..., "tool": ..., "args": [...]}
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Calls kept per request, and requests kept before the oldest are dropped
+JOURNAL_SIZE = int(os.getenv("CALL_JOURNAL_SIZE", "1000"))
+MAX_REQUESTS = int(os.getenv("CALL_JOURNAL_REQUESTS", "256"))
+# Optional append-only JSONL log of every call
+CALL_LOG_PATH = os.getenv("CALL_LOG")
+
+_request: contextvars.ContextVar[Optional["RequestCalls"]] = contextvars.ContextVar("journal_request", default=None)
+
+
+class RequestCalls:
+    """Ring buffer of the tool calls made while handling one request"""
+    __slots__ = ("id", "session_id", "calls", "count", "started")
+
+    def __init__(self, request_id: str, session_id: Optional[str], size: int):
+        self.id = request_id
+        self.session_id = session_id
+        self.calls = deque(maxlen=size)
+        # Total calls, including ones the ring buffer has already dropped
+        self.count = 0
+        self.started = time.time()
+
+
+class CallJournal:
+    """Thread-safe store of tool calls keyed by request id"""
+
+    def __init__(self, size: int = JOURNAL_SIZE, max_requests: int = MAX_REQUESTS, log_path: Optional[str] = CALL_LOG_PATH):
+        self.size = size
+        self.max_requests = max_requests
+        self.log_path = log_path
+        self.default = deque(maxlen=size)
+        self._requests: "OrderedDict[str, RequestCalls]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._log = None
+
+    def begin(self, request_id: Optional[str] = None, session_id: Optional[str] = None):
+        """Start a request in the calling context; returns a token for end()"""
+        request = RequestCalls(request_id or uuid.uuid4().hex, session_id, self.size)
+        with self._lock:
+            self._requests[request.id] = request
+            while len(self._requests) > self.max_requests:
+                self._requests.popitem(last=False)
+        return _request.set(request)
+
+    @staticmethod
+    def end(token):
+        _request.reset(token)
+
+    @contextmanager
+    def request(self, request_id: Optional[str] = None, session_id: Optional[str] = None) -> Iterator[RequestCalls]:
+        """Record the calls of everything run inside the block under one request"""
+        token = self.begin(request_id, session_id)
+        try:
+            yield _request.get()
+        finally:
+            self.end(token)
+
+    @staticmethod
+    def current_request() -> Optional[RequestCalls]:
+        return _request.get()
+
+    def record(self, tool_name: str, args: tuple):
+        request = _request.get()
+        with self._lock:
+            if request is None:
+                self.default.append((tool_name, args))
+            else:
+                request.calls.append((tool_name, args))
+                request.count += 1
+            if self.log_path:
+                self._write(request, tool_name, args)
+
+    def calls_for(self, request_id: str) -> Optional[List[tuple]]:
+        """Calls of a recent request, oldest first; None if it is unknown or was dropped"""
+        with self._lock:
+            request = self._requests.get(request_id)
+            return list(request.calls) if request is not None else None
+
+    def get(self, request_id: str) -> Optional[RequestCalls]:
+        with self._lock:
+            return self._requests.get(request_id)
+
+    def snapshot(self, request: RequestCalls) -> List[tuple]:
+        """Copy of a request's calls that is safe to iterate while tools keep recording"""
+        with self._lock:
+            return list(request.calls)
+
+    def _write(self, request: Optional[RequestCalls], tool_name: str, args: tuple):
+        try:
+            if self._log is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+                self._log = open(self.log_path, 'a', buffering=1)
+            self._log.write(json.dumps({
+                "time": time.time(),
+                "request_id": request.id if request is not None else None,
+                "session_id": request.session_id if request is not None else None,
+                "tool": tool_name,
+                "args": list(args),
+            }, default=str) + "\n")
+        except OSError as e:
+            logger.error(f"Error writing call log {self.log_path}: {str(e)}")
+
+    def close(self):
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+
+def read_log(path: str, request_id: Optional[str] = None) -> List[dict]:
+    """Entries of a call log, optionally only those of one request"""
+    with open(path, 'r') as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    if request_id is not None:
+        entries = [e for e in entries if e["request_id"] == request_id]
+    return entries
+
+
+journal = CallJournal()
@@ -1,74 +1,84 @@
 import base64
+import logging
 from email.message import EmailMessage
-import os.path
 
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from langchain_core.tools import tool
+from lazy_tools import langchain_tool as tool
 
+from outbox import PermanentFailure, outbox
 from smartHomeAgent import track_call, tracked_calls
 
+logger = logging.getLogger(__name__)
+
 
 @tool
-def gmail_create_draft(content: str, to: str, subject: str):
-  """Create and insert a draft email. Takes in the content, the receiver email address, and the subject.
-   Returns: Draft object, including draft id and message meta data.
+def gmail_create_draft(content: str, to: str, subject: str, separate: bool = False):
+  """Create and insert a draft email. Takes in the content, the receivers (email addresses, contact names
+   or groups such as "family", comma-separated) and the subject. All receivers share one draft unless
+   separate is true, in which case each gets their own draft, created together in one batch request.
+   The draft is queued in the outbox and created in the background.
+   Returns: a confirmation with the outbox message id.
   """
   track_call("gmail_create_draft")
-  SCOPES = ["https://www.googleapis.com/auth/gmail.compose"]
-  creds = None
-  # The file token.json stores the user's access and refresh tokens, and is
-  # created automatically when the authorization flow completes for the first
-  # time.
-  if os.path.exists("token.json"):
-    creds = Credentials.from_authorized_user_file("token.json", SCOPES)
-  # If there are no (valid) credentials available, let the user log in.
-  if not creds or not creds.valid:
-    if creds and creds.expired and creds.refresh_token:
-        creds.refresh(Request())
-    else:
-        flow = InstalledAppFlow.from_client_secrets_file(
-            "credentials.json", SCOPES
-        )
-        creds = flow.run_local_server(port=0)
-    # Save the credentials for the next run
-    with open("token.json", "w") as token:
-        token.write(creds.to_json())
+  from sessions import current_contacts, current_session
 
-  try:
-    # create gmail api client
-    service = build("gmail", "v1", credentials=creds)
+  # A server session's contact overrides apply to drafts as they do to emails
+  recipients, unknown = current_contacts().addresses(to)
+  if unknown:
+    logger.warning(f"No email address found for: {', '.join(unknown)}")
+  if not recipients:
+    return f"No email address found for '{to}'"
 
+  def encode(receivers):
     message = EmailMessage()
 
     message.set_content(content)
 
-    message["To"] = to
+    message["To"] = ", ".join(receivers)
     #message["From"] = from1
     message["Subject"] = subject
 
     # encoded message
-    encoded_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
-
-    create_message = {"message": {"raw": encoded_message}}
-    # pylint: disable=E1101
-    draft = (
-        service.users()
-        .drafts()
-        .create(userId="me", body=create_message)
-        .execute()
-    )
-
-    print(f'Draft id: {draft["id"]}\nDraft message: {draft["message"]}')
-
+    return base64.urlsafe_b64encode(message.as_bytes()).decode()
+
+  if separate and len(recipients) > 1:
+    raw_messages = [encode([r]) for r in recipients]
+  else:
+    raw_messages = [encode(recipients)]
+  session = current_session()
+  queued = outbox.enqueue(
+    "gmail_draft", {"raw_messages": raw_messages}, recipients=", ".join(recipients),
+    session_id=session.id if session is not None else None,
+  )
+  return f"Draft to {', '.join(recipients)} queued (outbox message {queued.id})"
+
+
+def deliver_draft(payload, message):
+  """Outbox handler: insert the drafts of a queued gmail_create_draft call"""
+  # The Google API client is only imported once a draft is actually created
+  from googleapiclient.errors import HttpError
+  from gmail_session import gmail_session
+
+  raw_messages = payload["raw_messages"]
+  try:
+    # the shared session reuses the credentials, service and HTTP transport
+    if len(raw_messages) > 1:
+      drafts = gmail_session.create_drafts(raw_messages)
+    else:
+      drafts = [gmail_session.create_draft(raw_messages[0])]
   except HttpError as error:
-    print(f"An error occurred: {error}")
-    draft = None
-
-  return draft
+    # Client errors other than rate limiting fail the same way every time
+    if error.resp.status < 500 and error.resp.status != 429:
+      raise PermanentFailure(f"Gmail rejected the draft: {error}")
+    raise
+  failed = [d["error"] for d in drafts if "error" in d]
+  if failed and len(failed) == len(drafts):
+    raise RuntimeError(failed[0])
+  # Runs on the outbox worker thread, so it is logged rather than printed over the prompt
+  logger.info(f'Draft ids: {", ".join(d["id"] for d in drafts if "id" in d)}')
+  return f"Created {len(drafts) - len(failed)} draft(s)" + (f", {len(failed)} failed: {failed[0]}" if failed else "")
+
+
+outbox.register("gmail_draft", deliver_draft)
 
 
 @tool
@@ -0,0 +1,250 @@
+"""
+In-memory contact directory with aliases, prefix completion and fuzzy lookup.
+
+contacts.json maps each contact to an email address, or to an object with
+the address and the other names the user may call them by. A group lists
+the contacts it stands for:
+
+    "friend": "friend@example.com",
+    "mom": {"email": "mom@example.com", "aliases": ["mother", "mum"]},
+    "family": {"members": ["mom", "dad", "sister"], "aliases": ["parents"]}
+
+The file is read once and re-read when it changes (checked at most every
+CONTACTS_CHECK_INTERVAL seconds). Names and aliases resolve with one dict
+lookup. A unique prefix of three or more letters ("sist" -> sister) or a
+close misspelling ("sistr") of a contact resolves too, so that a speller or
+decoder error does not fail the request. Groups need their exact name.
+"""
+import difflib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONTACTS_PATH = os.getenv("CONTACTS_PATH", os.path.join(BASE_DIR, 'contacts.json'))
+CHECK_INTERVAL = float(os.getenv("CONTACTS_CHECK_INTERVAL", "1"))
+FUZZY_CUTOFF = 0.75
+# Shortest input resolved by prefix or misspelling
+MIN_GUESS_LENGTH = 3
+# Used when contacts.json cannot be read at start-up
+DEFAULT_CONTACTS = {"friend": "emailypark@gmail.com"}
+
+
+def normalize_name(text: str) -> str:
+    """Lowercase, collapse whitespace and drop a leading "my"/"the" ("My  Sister" -> "sister")"""
+    text = re.sub(r"\s+", " ", text.strip().lower())
+    return re.sub(r"^(my|the) ", "", text)
+
+
+class PrefixTrie:
+    """Maps every prefix of the inserted keys to the names they stand for"""
+
+    def __init__(self):
+        self.root = {}
+
+    def insert(self, key: str, name: str):
+        node = self.root
+        for char in key:
+            node = node.setdefault(char, {})
+            node.setdefault("", set()).add(name)
+
+    def complete(self, prefix: str) -> List[str]:
+        node = self.root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return []
+        return sorted(node.get("", ()))
+
+
+def split_names(text: str) -> List[str]:
+    """Split "mom, dad and my sister" into its names"""
+    return [part for part in (p.strip() for p in re.split(r",|;|&|\band\b", text, flags=re.IGNORECASE)) if part]
+
+
+class _Index:
+    """Immutable lookup structures, swapped as a whole on reload"""
+
+    def __init__(self, emails: Dict[str, str], aliases: Dict[str, List[str]], groups: Dict[str, List[str]]):
+        self.emails = emails
+        self.aliases = aliases
+        self.groups = groups
+        self.keys = {}
+        self.trie = PrefixTrie()
+        for name in list(emails) + list(groups):
+            for key in [name] + aliases.get(name, []):
+                key = normalize_name(key)
+                self.keys.setdefault(key, name)
+                self.trie.insert(key, name)
+
+
+def _parse(data: dict):
+    emails, aliases, groups = {}, {}, {}
+    for name, value in data.items():
+        name = normalize_name(name)
+        if isinstance(value, str):
+            emails[name] = value
+        elif isinstance(value, dict) and "email" in value:
+            emails[name] = value["email"]
+            aliases[name] = list(value.get("aliases", []))
+        elif isinstance(value, dict) and "members" in value:
+            groups[name] = [normalize_name(member) for member in value["members"]]
+            aliases[name] = list(value.get("aliases", []))
+        else:
+            logger.warning(f"Ignoring contact '{name}' without an email address")
+    for name, members in groups.items():
+        unknown = [m for m in members if m not in emails]
+        if unknown:
+            logger.warning(f"Group '{name}' lists unknown contacts: {', '.join(unknown)}")
+            groups[name] = [m for m in members if m in emails]
+    return emails, aliases, groups
+
+
+class ContactDirectory:
+    def __init__(self, path: Optional[str] = CONTACTS_PATH, check_interval: float = CHECK_INTERVAL, data: Optional[dict] = None):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._checked = 0.0
+        self._index = _Index(*_parse(data if data is not None else {}))
+        if path is not None:
+            self._reload(initial=True)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ContactDirectory":
+        """Directory that is not backed by a file"""
+        return cls(path=None, data=data)
+
+    def _file_stamp(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _reload(self, initial: bool = False):
+        try:
+            stamp = self._file_stamp()
+            with open(self.path, 'r') as f:
+                index = _Index(*_parse(json.load(f)))
+        except Exception as e:
+            logger.error(f"Error loading contacts: {str(e)}")
+            if initial:
+                self._index = _Index(*_parse(DEFAULT_CONTACTS))
+            return
+        self._index = index
+        self._stamp = stamp
+        if not initial:
+            logger.info(f"Reloaded {len(index.emails)} contacts from {self.path}")
+
+    def _current(self) -> _Index:
+        """The index, re-reading the file first if it changed since the last check"""
+        if self.path is not None:
+            now = time.monotonic()
+            if now - self._checked >= self.check_interval:
+                with self._lock:
+                    if now - self._checked >= self.check_interval:
+                        self._checked = now
+                        try:
+                            changed = self._file_stamp() != self._stamp
+                        except OSError:
+                            changed = False
+                        if changed:
+                            self._reload()
+        return self._index
+
+    def lookup(self, text: str) -> Optional[str]:
+        """Contact or group name for an exact name or alias; None otherwise, with no prefix or fuzzy matching"""
+        return self._current().keys.get(normalize_name(text))
+
+    def resolve(self, text: str) -> Optional[str]:
+        """Contact name for a name, alias, unique prefix or close misspelling; None if nothing matches.
+        Groups only resolve by their exact name or alias."""
+        index = self._current()
+        key = normalize_name(text)
+        if not key:
+            return None
+        name = index.keys.get(key)
+        if name is not None:
+            return name
+        # Mail is sent on the result, so guesses need a few letters and never stand for a whole group
+        if len(key) < MIN_GUESS_LENGTH:
+            return None
+        completions = [name for name in index.trie.complete(key) if name in index.emails]
+        if len(completions) == 1:
+            return completions[0]
+        people = [k for k, name in index.keys.items() if name in index.emails]
+        close = difflib.get_close_matches(key, people, n=1, cutoff=FUZZY_CUTOFF)
+        return index.keys[close[0]] if close else None
+
+    def email(self, text: str) -> Optional[str]:
+        name = self.resolve(text)
+        return self._index.emails.get(name) if name is not None else None
+
+    def expand(self, text: str) -> Tuple[List[str], List[str]]:
+        """Contact names for a list of names and groups ("family and my boss"), without duplicates,
+        and the parts that did not resolve"""
+        index = self._current()
+        names, unknown = [], []
+        for part in split_names(text):
+            name = self.resolve(part)
+            if name is None:
+                unknown.append(part)
+                continue
+            for member in index.groups.get(name, [name]):
+                if member not in names:
+                    names.append(member)
+        return names, unknown
+
+    def addresses(self, text: str) -> Tuple[List[str], List[str]]:
+        """Email addresses for a list of names, groups and literal addresses, and the parts that did not resolve"""
+        emails, unknown = [], []
+        for part in split_names(text):
+            if "@" in part:
+                found = [part]
+            else:
+                names, missing = self.expand(part)
+                found = [e for e in (self._index.emails.get(name) for name in names) if e is not None]
+                unknown += missing
+            emails += [email for email in found if email not in emails]
+        return emails, unknown
+
+    def get(self, text: str, default=None) -> Optional[str]:
+        email = self.email(text)
+        return email if email is not None else default
+
+    def complete(self, prefix: str) -> List[str]:
+        """Names of the contacts a speller prefix could stand for"""
+        return self._current().trie.complete(normalize_name(prefix))
+
+    def names(self) -> List[str]:
+        return list(self._current().emails)
+
+    def groups(self) -> Dict[str, List[str]]:
+        return {name: list(members) for name, members in self._current().groups.items()}
+
+    def as_dict(self) -> Dict[str, str]:
+        return dict(self._current().emails)
+
+    def copy(self, overrides: Optional[Dict[str, str]] = None) -> "ContactDirectory":
+        """Snapshot of this directory that is not backed by the file, with some addresses replaced or added"""
+        index = self._current()
+        data = {name: {"email": email, "aliases": index.aliases.get(name, [])} for name, email in index.emails.items()}
+        data.update({name: {"members": members, "aliases": index.aliases.get(name, [])} for name, members in index.groups.items()})
+        for name, email in (overrides or {}).items():
+            name = normalize_name(name)
+            data[name] = {"email": email, "aliases": data.get(name, {}).get("aliases", [])}
+        return ContactDirectory.from_dict(data)
+
+    def __contains__(self, text: str) -> bool:
+        return self.resolve(text) is not None
+
+    def __len__(self) -> int:
+        return len(self._current().emails)
+
+
+directory = ContactDirectory()
@@ -0,0 +1,147 @@
+import logging
+import threading
+
+from async_runtime import run_blocking
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+TASK_DESCRIPTION = 'Execute the following user query: {query}'
+EXPECTED_OUTPUT = 'A message of confirmation that the task has been executed.'
+
+
+class CrewRegistry:
+    """Builds one single-task Crew per agent up front and reuses it across queries.
+
+    The query is interpolated into the task at kickoff time, so only the
+    per-query state has to be reset between runs. A crew that is already
+    running (e.g. a concurrent query) is never shared: extra callers get a
+    crew built around a copy of the agent, which is then kept in the pool
+    for later reuse. Agents registered with a factory (and crewai itself)
+    are only loaded on their first kickoff. An optional tool_selector(name,
+    query, tools) narrows the agent's tools for each query.
+    """
+
+    def __init__(self, verbose=True, tool_selector=None):
+        self.verbose = verbose
+        self.tool_selector = tool_selector
+        self._agents = {}
+        self._tools = {}
+        self._factories = {}
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def _build(self, agent):
+        from crewai import Crew, Task
+
+        task = Task(
+            description=TASK_DESCRIPTION,
+            agent=agent,
+            expected_output=EXPECTED_OUTPUT,
+        )
+        crew = Crew(
+            agents=[agent],
+            tasks=[task],
+            verbose=self.verbose
+        )
+        return crew
+
+    def register(self, name, agent):
+        """Build the crew for an agent once, at startup"""
+        crew = self._build(agent)
+        with self._lock:
+            self._agents[name] = agent
+            self._tools[name] = list(agent.tools)
+            self._idle[name] = [crew]
+        return crew
+
+    def register_factory(self, name, factory):
+        """Register a function that builds the agent; it runs on the first kickoff"""
+        with self._lock:
+            self._factories[name] = factory
+            self._idle[name] = []
+
+    def agent(self, name):
+        """The agent registered under name, loading it first if needed"""
+        with self._lock:
+            if name in self._agents:
+                return self._agents[name]
+            if name not in self._factories:
+                raise KeyError(f"No crew registered under '{name}'")
+        with self._load_lock:
+            with self._lock:
+                if name in self._agents:
+                    return self._agents[name]
+            agent = self._factories[name]()
+            crew = self._build(agent)
+            with self._lock:
+                self._agents[name] = agent
+                self._tools[name] = list(agent.tools)
+                self._idle[name].append(crew)
+        logger.info(f"Loaded '{name}' agent")
+        return agent
+
+    def load_all(self):
+        """Load every agent now, e.g. before a long-running server takes traffic"""
+        with self._lock:
+            names = list(self._factories)
+        for name in names:
+            self.agent(name)
+
+    def loaded(self, name):
+        with self._lock:
+            return name in self._agents
+
+    def _acquire(self, name):
+        agent = self.agent(name)
+        with self._lock:
+            if self._idle[name]:
+                return self._idle[name].pop()
+        # Agents carry per-run executor state, so a concurrent run needs its own
+        logger.debug(f"All '{name}' crews busy, building another")
+        return self._build(agent.copy())
+
+    def _release(self, name, crew):
+        with self._lock:
+            self._idle[name].append(crew)
+
+    @staticmethod
+    def _reset(crew):
+        """Clear state a previous kickoff left on the crew and its tasks"""
+        # Tool results are cached per crew; a reused crew must still run
+        # "turn on the lights" again instead of replaying the earlier result
+        crew._cache_handler._cache.clear()
+        for task in crew.tasks:
+            task.output = None
+            task.used_tools = 0
+            task.tools_errors = 0
+            task.delegations = 0
+            task.processed_by_agents = set()
+
+    def _select_tools(self, name, crew, query):
+        """Give the crew's agent the tools the selector picks for this query, or all of them"""
+        tools = self._tools[name]
+        if self.tool_selector is not None:
+            tools = self.tool_selector(name, query, tools)
+        for task in crew.tasks:
+            task.agent.tools = list(tools)
+        return tools
+
+    def kickoff(self, name, query):
+        """Run the named crew on a single user query"""
+        with span(f"agent {name}", "agent", agent=name, query=query) as s:
+            crew = self._acquire(name)
+            try:
+                self._reset(crew)
+                tools = self._select_tools(name, crew, query)
+                s.set(tools=[t.name for t in tools])
+                result = crew.kickoff(inputs={"query": query})
+                s.set(outcome=str(result))
+                return result
+            finally:
+                self._release(name, crew)
+
+    async def akickoff(self, name, query, pool="default"):
+        """Run the named crew on a worker thread of the given async_runtime pool"""
+        return await run_blocking(self.kickoff, name, query, pool=pool)
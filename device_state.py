@@ -0,0 +1,327 @@
+"""
+Last-known state of the smart-home devices, with command coalescing.
+
+The smart-home tools send their commands through DeviceStore.command(). The
+store remembers the last state of every device and when it was set. It skips
+a command that would not change a device whose state is fresh (younger than
+DEVICE_STATE_TTL seconds). Within a query, commands are collected in a batch
+and sent when the query ends: only the final command per device goes out, so
+"turn on the AC ... turn off the AC" costs one command. Status questions such
+as "are the doors locked?" are answered from the store without an agent.
+
+The backend is whatever talks to the devices. It needs send(device, value),
+and read_all() if the store should be reconciled with what the devices
+report. reconcile() pulls their states, and report() lets a backend push one.
+"""
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STATE_TTL = float(os.getenv("DEVICE_STATE_TTL", "300"))
+RECONCILE_INTERVAL = float(os.getenv("DEVICE_RECONCILE_INTERVAL", "0"))
+
+# Words in a status question that name a device, and how its state is phrased
+DEVICE_WORDS = [
+    (r"\b(doors?|locks?)\b", "locks"),
+    (r"\b(ac|a/c|air ?conditioning|air ?conditioner)\b", "ac"),
+    (r"\blights?\b", "lights"),
+    # Not "temperature" alone: "what temperature is it outside?" is not about the thermostat
+    (r"\bthermostat\b", "thermostat"),
+    (r"\b(curtains?|blinds?)\b", "curtains"),
+    (r"\b(security|alarm)( system)?\b", "security"),
+]
+PHRASES = {
+    "locks": "The doors are {value}",
+    "ac": "The AC is {value}",
+    "lights": "The lights are {value}",
+    "thermostat": "The thermostat is set to {value} degrees",
+    "curtains": "The curtains are {value}",
+    "security": "The security system is {value}",
+}
+QUESTION = re.compile(r"^(is|are|was|were|what|what's|whats|did|do|does|has|have|how)\b")
+
+
+@dataclass
+class DeviceState:
+    device: str
+    value: str
+    updated: float
+    # "command" when the store set it, "backend" when the devices reported it
+    source: str
+
+    def fresh(self, ttl: float = STATE_TTL) -> bool:
+        return time.time() - self.updated < ttl
+
+
+class SimulatedBackend:
+    """Stands in for a device hub: accepts every command and reports back what it was told"""
+
+    def __init__(self):
+        self.commands: List[Tuple[str, str]] = []
+        self.states: Dict[str, str] = {}
+
+    def send(self, device: str, value: str):
+        self.commands.append((device, value))
+        self.states[device] = value
+
+    def read_all(self) -> Dict[str, str]:
+        return dict(self.states)
+
+
+class CommandBatch:
+    """Commands of one query, in order. A state command replaces the device's earlier
+    pending state, unless an action for the device was queued in between."""
+
+    def __init__(self):
+        # (device, value, is_state)
+        self.pending: List[Tuple[str, str, bool]] = []
+        self.issued = 0
+        # (device, value, error) of the commands the backend rejected when the batch was sent
+        self.failures: List[Tuple[str, str, str]] = []
+        self.lock = threading.Lock()
+
+    def add(self, device: str, value: str, state: bool = True):
+        with self.lock:
+            if state:
+                for i in range(len(self.pending) - 1, -1, -1):
+                    if self.pending[i][0] == device:
+                        if self.pending[i][2]:
+                            del self.pending[i]
+                        break
+            self.pending.append((device, value, state))
+            self.issued += 1
+
+    def has_state(self, device: str) -> bool:
+        with self.lock:
+            return any(d == device and state for d, _, state in self.pending)
+
+
+_batch: contextvars.ContextVar[Optional[CommandBatch]] = contextvars.ContextVar("device_batch", default=None)
+
+
+def appliance(name: str) -> str:
+    return f"appliance:{name.strip().lower()}"
+
+
+def entertainment(name: str) -> str:
+    return f"entertainment:{name.strip().lower()}"
+
+
+def display_name(device: str) -> str:
+    return device.split(":", 1)[-1]
+
+
+class DeviceStore:
+    def __init__(self, backend=None, ttl: float = STATE_TTL):
+        self.backend = backend if backend is not None else SimulatedBackend()
+        self.ttl = ttl
+        self.states: Dict[str, DeviceState] = {}
+        self.stats = {"issued": 0, "sent": 0, "skipped": 0, "failed": 0}
+        self._lock = threading.Lock()
+        self._reconciler: Optional[threading.Thread] = None
+
+    def get(self, device: str) -> Optional[DeviceState]:
+        with self._lock:
+            return self.states.get(device)
+
+    def snapshot(self) -> Dict[str, DeviceState]:
+        with self._lock:
+            return dict(self.states)
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _unchanged(self, device: str, value: str) -> bool:
+        state = self.get(device)
+        return state is not None and state.value == value and state.fresh(self.ttl)
+
+    def _send(self, device: str, value: str, state: bool = True) -> bool:
+        """Send one command unless it sets a state the device is known to be in already"""
+        if state and self._unchanged(device, value):
+            self._count("skipped")
+            logger.info(f"Device {device} is already {value}, not sending")
+            return False
+        self.backend.send(device, value)
+        with self._lock:
+            if state:
+                self.states[device] = DeviceState(device, value, time.time(), "command")
+            self.stats["sent"] += 1
+        return True
+
+    def command(self, device: str, value: str) -> bool:
+        """Set a device; False when it is already in that state and nothing will be sent.
+        Inside a batch the command is only recorded and sent when the batch ends."""
+        value = value.strip().lower()
+        self._count("issued")
+        batch = _batch.get()
+        if batch is None:
+            return self._send(device, value)
+        if not batch.has_state(device) and self._unchanged(device, value):
+            self._count("skipped")
+            return False
+        batch.add(device, value)
+        return True
+
+    def action(self, device: str, value: str):
+        """Send an action that is not a state, such as "volume up" or "pause". It is never
+        skipped or remembered, and inside a batch it keeps its place among the commands."""
+        value = value.strip().lower()
+        self._count("issued")
+        batch = _batch.get()
+        if batch is None:
+            self._send(device, value, state=False)
+        else:
+            batch.add(device, value, state=False)
+
+    def flush(self, batch: CommandBatch):
+        """Send the batch's commands. A command the backend rejects is logged and recorded
+        in batch.failures, and the remaining commands are still sent."""
+        with batch.lock:
+            pending = list(batch.pending)
+            batch.pending.clear()
+        sent = 0
+        for device, value, state in pending:
+            try:
+                sent += self._send(device, value, state)
+            except Exception as e:
+                logger.error(f"Error sending {value} to device {device}: {str(e)}")
+                self._count("failed")
+                batch.failures.append((device, value, str(e)))
+        if batch.issued > sent + len(batch.failures):
+            logger.info(f"Coalesced {batch.issued} device commands into {sent}")
+
+    @staticmethod
+    def report_failures(result, batch: CommandBatch):
+        """Append the batch's failed commands to a query's text result"""
+        if not batch.failures or not isinstance(result, str):
+            return result
+        failed = "; ".join(f"{display_name(device)} {value} ({error})" for device, value, error in batch.failures)
+        return f"{result}\nSome device commands failed: {failed}"
+
+    @contextmanager
+    def batch(self):
+        """Collect device commands until the block ends, then send the last one per device.
+        Joins the batch that is already open, if any."""
+        if _batch.get() is not None:
+            yield _batch.get()
+            return
+        batch = CommandBatch()
+        token = _batch.set(batch)
+        try:
+            yield batch
+        finally:
+            _batch.reset(token)
+            self.flush(batch)
+
+    def coalesce(self, fn):
+        """Decorator running each call of fn, sync or async, in one command batch"""
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if _batch.get() is not None:
+                    return await fn(*args, **kwargs)
+                from async_runtime import run_blocking
+                batch = CommandBatch()
+                token = _batch.set(batch)
+                try:
+                    result = await fn(*args, **kwargs)
+                finally:
+                    _batch.reset(token)
+                    await run_blocking(self.flush, batch)
+                return self.report_failures(result, batch)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with self.batch() as batch:
+                result = fn(*args, **kwargs)
+            # Only the outermost batch has been sent here; a joined one has no failures yet
+            return self.report_failures(result, batch)
+        return wrapper
+
+    def report(self, device: str, value: str):
+        """Record a state the device backend reported"""
+        value = value.strip().lower()
+        with self._lock:
+            previous = self.states.get(device)
+            self.states[device] = DeviceState(device, value, time.time(), "backend")
+        if previous is not None and previous.value != value:
+            logger.info(f"Device {device} is {value}, not {previous.value} as last known")
+
+    def reconcile(self):
+        """Bring the store in line with the states the backend reports"""
+        read_all = getattr(self.backend, "read_all", None)
+        if read_all is None:
+            return
+        for device, value in read_all().items():
+            self.report(device, value)
+
+    def start_reconciler(self, interval: float = RECONCILE_INTERVAL):
+        """Reconcile every interval seconds in a background thread (0 turns it off)"""
+        if interval <= 0 or self._reconciler is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reconcile()
+                except Exception as e:
+                    logger.error(f"Device reconciliation failed: {str(e)}")
+
+        self._reconciler = threading.Thread(target=run, name="device-reconciler", daemon=True)
+        self._reconciler.start()
+
+    def devices_in(self, query: str) -> List[str]:
+        """Devices a query mentions, in the order they are mentioned"""
+        text = query.lower()
+        found = []
+        for pattern, device in DEVICE_WORDS:
+            match = re.search(pattern, text)
+            if match:
+                found.append((match.start(), device))
+        for device in self.snapshot():
+            name = display_name(device)
+            if device not in PHRASES and re.search(rf"\b{re.escape(name)}\b", text):
+                found.append((text.index(name), device))
+        return [device for _, device in sorted(found)]
+
+    def describe(self, device: str) -> Optional[str]:
+        state = self.get(device)
+        if state is None:
+            return None
+        phrase = PHRASES.get(device, f"The {display_name(device)} is {{value}}")
+        return f"{phrase.format(value=state.value)} (as of {time.strftime('%H:%M:%S', time.localtime(state.updated))})."
+
+    def _known(self, device: str) -> bool:
+        state = self.get(device)
+        return state is not None and state.fresh(self.ttl)
+
+    def answer(self, query: str) -> Optional[str]:
+        """Answer a status question from the store; None if it is not one or a device's state is unknown or stale"""
+        if not QUESTION.match(query.strip().lower()):
+            return None
+        devices = self.devices_in(query)
+        if not devices:
+            return None
+        if not all(self._known(device) for device in devices):
+            # Stale states are refreshed from the backend before giving up
+            self.reconcile()
+            if not all(self._known(device) for device in devices):
+                return None
+        return " ".join(self.describe(device) for device in devices)
+
+
+devices = DeviceStore()
@@ -0,0 +1,128 @@
+"""
+Single-hop ("flat") execution: one function-calling model invocation over the leaf tools.
+
+The hierarchical mode pays for the planning agent, a call_*_agent hop and the
+inner agent's own reasoning, two to four LLM round trips per query. Here the
+leaf tools of every agent are offered to the model at once; it answers with
+all the tool calls the query needs (in parallel where they are independent),
+and they are executed without another model call. Requests that need several
+turns (questions to the user, confirmations, actions that depend on an
+earlier result) make the model call use_agents, which hands the query to the
+hierarchical crews instead.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional
+
+from async_runtime import run_blocking
+
+logger = logging.getLogger(__name__)
+
+ESCALATE_TOOL = "use_agents"
+SYSTEM_PROMPT = """You carry out the user's request by calling tools that control their smart home, computer and browser.
+Call every tool the request needs in this one reply, all at once when the actions are independent.
+Use the user's own words for argument values.
+Only call use_agents if the request cannot be done in one step: when you need to ask the user something or get their confirmation,
+or when one action depends on the result of another."""
+ESCALATE_SCHEMA = {
+    "type": "function",
+    "function": {
+        "name": ESCALATE_TOOL,
+        "description": "Hand the request to the multi-step agents when it needs several turns.",
+        "parameters": {
+            "type": "object",
+            "properties": {"reason": {"type": "string"}},
+            "required": ["reason"],
+        },
+    },
+}
+
+
+class FlatExecutor:
+    """Runs a query with one tool-calling model invocation, falling back to the agents for multi-turn tasks"""
+
+    def __init__(
+        self,
+        llm: Callable[[], object],
+        tools: Iterable,
+        fallback: Callable[[str], str],
+        afallback: Optional[Callable[[str], object]] = None,
+        serial_tools: Iterable[str] = (),
+    ):
+        self.llm = llm
+        self.tools = {t.name: t for t in tools}
+        self.fallback = fallback
+        self.afallback = afallback
+        self.serial_tools = set(serial_tools)
+        self.schemas = [t.schema() for t in self.tools.values()] + [ESCALATE_SCHEMA]
+        self._serial_lock = threading.Lock()
+
+    def _model(self):
+        return self.llm().bind_tools(self.schemas, parallel_tool_calls=True)
+
+    @staticmethod
+    def _messages(query: str) -> list:
+        return [("system", SYSTEM_PROMPT), ("human", query)]
+
+    def _escalate(self, message) -> bool:
+        """Whether the model's reply asks for the agents instead of direct tool calls"""
+        for call in message.tool_calls:
+            if call["name"] == ESCALATE_TOOL:
+                logger.info(f"Flat mode handing off to agents: {call['args'].get('reason', '')}")
+                return True
+            if call["name"] not in self.tools:
+                logger.warning(f"Flat mode got a call to unknown tool '{call['name']}', handing off to agents")
+                return True
+        return False
+
+    def _call(self, call: dict) -> str:
+        tool = self.tools[call["name"]]
+        try:
+            # The model may send a list as "mom, dad" or a number as "72"
+            args = tool.coerce_args(call["args"])
+            if call["name"] in self.serial_tools:
+                with self._serial_lock:
+                    return str(tool.func(**args))
+            return str(tool.func(**args))
+        except Exception as e:
+            logger.error(f"Error in tool {call['name']}: {str(e)}")
+            return f"Error: {str(e)}"
+
+    @staticmethod
+    def _describe(calls: List[dict]) -> str:
+        return ", ".join(f"{c['name']}({json.dumps(c['args'])})" for c in calls)
+
+    def run(self, query: str) -> str:
+        message = self._model().invoke(self._messages(query))
+        if self._escalate(message):
+            return self.fallback(query)
+        calls = message.tool_calls
+        if not calls:
+            return message.content
+        logger.info(f"Flat mode: {self._describe(calls)}")
+        if len(calls) == 1:
+            return self._call(calls[0])
+        # Worker threads run in a copy of this context so the calls land in the query's journal and trace
+        with ThreadPoolExecutor(max_workers=len(calls)) as pool:
+            futures = [pool.submit(contextvars.copy_context().run, self._call, call) for call in calls]
+            return "\n".join(f.result() for f in futures)
+
+    async def arun(self, query: str) -> str:
+        message = await self._model().ainvoke(self._messages(query))
+        if self._escalate(message):
+            if self.afallback is not None:
+                return await self.afallback(query)
+            return await run_blocking(self.fallback, query)
+        calls = message.tool_calls
+        if not calls:
+            return message.content
+        logger.info(f"Flat mode: {self._describe(calls)}")
+        results = await asyncio.gather(*(
+            run_blocking(self._call, call, pool="browser" if call["name"] in self.serial_tools else "default")
+            for call in calls
+        ))
+        return "\n".join(results)
@@ -0,0 +1,231 @@
+import logging
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Sequence
+
+import google_auth_httplib2
+import httplib2
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.http import BatchHttpRequest
+
+logger = logging.getLogger(__name__)
+
+SCOPES = ["https://www.googleapis.com/auth/gmail.compose"]
+TOKEN_PATH = os.getenv("GMAIL_TOKEN_PATH", "token.json")
+CLIENT_SECRETS_PATH = os.getenv("GMAIL_CLIENT_SECRETS_PATH", "credentials.json")
+DISCOVERY_CACHE_PATH = os.getenv("GMAIL_DISCOVERY_CACHE", os.path.join(".cache", "gmail_v1_discovery.json"))
+DISCOVERY_URL = "https://gmail.googleapis.com/$discovery/rest?version=v1"
+# Override the API root, e.g. to point at a local stand-in of the Gmail endpoint
+API_ROOT = os.getenv("GMAIL_API_ROOT")
+# Refresh the access token this many seconds before it expires
+REFRESH_MARGIN = float(os.getenv("GMAIL_REFRESH_MARGIN", "300"))
+REQUEST_TIMEOUT = float(os.getenv("GMAIL_TIMEOUT", "30"))
+# Gmail rejects batches of more than 100 calls and recommends at most 50
+BATCH_SIZE = int(os.getenv("GMAIL_BATCH_SIZE", "50"))
+BATCH_PATH = "batch/gmail/v1"
+
+
+def load_discovery_document(path: str = DISCOVERY_CACHE_PATH) -> str:
+    """Gmail v1 discovery document: the local cache, else the copy bundled with googleapiclient, else the network"""
+    if path and os.path.exists(path):
+        with open(path, 'r') as f:
+            return f.read()
+    document = get_static_doc("gmail", "v1")
+    if document is None:
+        logger.info("Fetching Gmail discovery document")
+        response, content = httplib2.Http(timeout=REQUEST_TIMEOUT).request(DISCOVERY_URL)
+        if response.status != 200:
+            raise RuntimeError(f"Could not fetch Gmail discovery document: HTTP {response.status}")
+        document = content.decode("utf-8")
+    if path:
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(document)
+        except OSError as e:
+            logger.warning(f"Could not cache Gmail discovery document: {str(e)}")
+    return document
+
+
+class GmailSession:
+    """
+    Process-wide Gmail API session.
+
+    Credentials are loaded once and refreshed on a background timer shortly
+    before they expire. The service object is built once from a locally cached
+    discovery document and reuses one authorized HTTP transport. httplib2 is
+    not thread-safe, so requests go through execute(), which serializes them.
+    """
+
+    def __init__(
+        self,
+        token_path: str = TOKEN_PATH,
+        client_secrets_path: str = CLIENT_SECRETS_PATH,
+        scopes: Sequence[str] = SCOPES,
+        discovery_path: str = DISCOVERY_CACHE_PATH,
+        api_root: Optional[str] = API_ROOT,
+        refresh_margin: float = REFRESH_MARGIN,
+        credentials: Optional[Credentials] = None,
+    ):
+        self.token_path = token_path
+        self.client_secrets_path = client_secrets_path
+        self.scopes = list(scopes)
+        self.discovery_path = discovery_path
+        self.api_root = api_root
+        self.refresh_margin = refresh_margin
+        self._credentials = credentials
+        self._service = None
+        self._lock = threading.RLock()
+        self._refresh_timer = None
+
+    def credentials(self) -> Credentials:
+        with self._lock:
+            if self._credentials is None:
+                self._credentials = self._load_credentials()
+            elif not self._credentials.valid:
+                self.refresh()
+            if self._refresh_timer is None:
+                self._schedule_refresh()
+            return self._credentials
+
+    def _load_credentials(self) -> Credentials:
+        creds = None
+        if self.token_path and os.path.exists(self.token_path):
+            creds = Credentials.from_authorized_user_file(self.token_path, self.scopes)
+        if creds and creds.valid:
+            return creds
+        if creds and creds.expired and creds.refresh_token:
+            creds.refresh(Request())
+        else:
+            # No usable token: let the user log in
+            flow = InstalledAppFlow.from_client_secrets_file(self.client_secrets_path, self.scopes)
+            creds = flow.run_local_server(port=0)
+        self._save(creds)
+        return creds
+
+    def _save(self, creds: Credentials):
+        if not self.token_path:
+            return
+        try:
+            with open(self.token_path, 'w') as token:
+                token.write(creds.to_json())
+        except OSError as e:
+            logger.warning(f"Could not save Gmail token: {str(e)}")
+
+    def refresh(self):
+        """Refresh the access token now and persist it"""
+        with self._lock:
+            creds = self._credentials
+            if creds is None or not creds.refresh_token:
+                return
+            creds.refresh(Request())
+            self._save(creds)
+            logger.info("Refreshed Gmail credentials")
+            self._schedule_refresh()
+
+    def _schedule_refresh(self):
+        if self._refresh_timer is not None:
+            self._refresh_timer.cancel()
+            self._refresh_timer = None
+        creds = self._credentials
+        if creds is None or creds.expiry is None or not creds.refresh_token:
+            return
+        # google-auth keeps expiry as a naive UTC datetime
+        delay = (creds.expiry - datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=self.refresh_margin)).total_seconds()
+        self._refresh_timer = threading.Timer(max(delay, 0), self._background_refresh)
+        self._refresh_timer.daemon = True
+        self._refresh_timer.start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error(f"Background Gmail credential refresh failed: {str(e)}")
+            # Try again later; an expired token is also refreshed on demand
+            with self._lock:
+                self._refresh_timer = threading.Timer(60, self._background_refresh)
+                self._refresh_timer.daemon = True
+                self._refresh_timer.start()
+
+    def service(self):
+        """The shared Gmail v1 service object, built on first use"""
+        with self._lock:
+            if self._service is None:
+                creds = self.credentials()
+                http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http(timeout=REQUEST_TIMEOUT))
+                client_options = {"api_endpoint": self.api_root} if self.api_root else None
+                self._service = build_from_document(
+                    load_discovery_document(self.discovery_path), http=http, client_options=client_options
+                )
+            return self._service
+
+    def execute(self, request):
+        """Run a request built from service() on the shared transport"""
+        with self._lock:
+            self.credentials()
+            return request.execute()
+
+    def create_draft(self, raw_message: str) -> dict:
+        """Insert a draft from a base64url-encoded RFC 2822 message"""
+        service = self.service()
+        request = service.users().drafts().create(userId="me", body={"message": {"raw": raw_message}})
+        return self.execute(request)
+
+    def create_drafts(self, raw_messages: Sequence[str]) -> List[dict]:
+        """Insert several drafts with one batch HTTP request per BATCH_SIZE messages.
+        Returns the drafts in order; a message that failed gets {"error": ...} instead."""
+        service = self.service()
+        drafts: List[dict] = [None] * len(raw_messages)
+
+        def store(request_id, response, exception):
+            index = int(request_id)
+            if exception is not None:
+                logger.error(f"Draft {index} of batch failed: {str(exception)}")
+                drafts[index] = {"error": str(exception)}
+            else:
+                drafts[index] = response
+
+        for start in range(0, len(raw_messages), BATCH_SIZE):
+            # new_batch_http_request() would ignore api_root and always post to googleapis.com
+            if self.api_root:
+                batch = BatchHttpRequest(callback=store, batch_uri=self.api_root.rstrip("/") + "/" + BATCH_PATH)
+            else:
+                batch = service.new_batch_http_request(callback=store)
+            for index in range(start, min(start + BATCH_SIZE, len(raw_messages))):
+                body = {"message": {"raw": raw_messages[index]}}
+                batch.add(service.users().drafts().create(userId="me", body=body), request_id=str(index))
+            self.execute(batch)
+        return drafts
+
+    def warm_up(self, background: bool = True):
+        """Load credentials and build the service ahead of the first draft.
+        Does nothing without a saved token, so it never starts an interactive login."""
+        if not (self.token_path and os.path.exists(self.token_path)) and self._credentials is None:
+            return
+
+        def run():
+            try:
+                self.service()
+                logger.debug("Gmail session warmed up")
+            except Exception as e:
+                logger.warning(f"Gmail warm-up failed: {str(e)}")
+
+        if background:
+            threading.Thread(target=run, name="gmail-warmup", daemon=True).start()
+        else:
+            run()
+
+    def close(self):
+        with self._lock:
+            if self._refresh_timer is not None:
+                self._refresh_timer.cancel()
+                self._refresh_timer = None
+            self._service = None
+
+
+gmail_session = GmailSession()
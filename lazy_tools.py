@@ -0,0 +1,175 @@
+"""
+Tools that do not import crewai until an agent needs them.
+
+The @tool decorator here is a drop-in for crewai_tools.tool, and
+@langchain_tool for langchain_core.tools.tool. Both return a LazyTool, which the fast path and direct callers can run straight away
+(tool.func / tool.run) without paying for the crewai import. The real
+tool is built from the same function the first time an agent asks for it
+through tool.tool. Patching tool.func, as tracing and the
+benchmarks do, applies to both, before or after the real tool exists.
+"""
+import inspect
+import json
+import re
+import threading
+from typing import Callable, Union, get_args, get_origin
+
+# JSON schema types for the annotations tool functions use; anything else is passed as a string
+_JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean"}
+
+
+def _unwrap_optional(annotation):
+    """X for Optional[X]; other annotations unchanged"""
+    if get_origin(annotation) is Union:
+        args = [a for a in get_args(annotation) if a is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+
+def json_schema(annotation) -> dict:
+    """JSON schema for a parameter annotation: list/List[X] become arrays, dict/Dict[...] objects"""
+    annotation = _unwrap_optional(annotation)
+    origin = get_origin(annotation) or annotation
+    if origin in (list, tuple, set):
+        args = get_args(annotation)
+        return {"type": "array", "items": json_schema(args[0]) if args else {"type": "string"}}
+    if origin is dict:
+        return {"type": "object"}
+    return {"type": _JSON_TYPES.get(annotation, "string")}
+
+
+def coerce(value, annotation):
+    """Convert a model-supplied argument to the parameter's type; ValueError if it cannot be"""
+    annotation = _unwrap_optional(annotation)
+    origin = get_origin(annotation) or annotation
+    if value is None:
+        return value
+    if origin in (list, tuple, set):
+        if isinstance(value, str):
+            text = value.strip()
+            if text.startswith("["):
+                value = json.loads(text)
+            else:
+                # "mom, dad and sister" -> ["mom", "dad", "sister"]
+                value = [part for part in (p.strip() for p in re.split(r",|;|\band\b", text)) if part]
+        if not isinstance(value, (list, tuple, set)):
+            raise ValueError(f"Expected a list, got {value!r}")
+        args = get_args(annotation)
+        return [coerce(item, args[0]) for item in value] if args else list(value)
+    if origin is dict:
+        if isinstance(value, str):
+            value = json.loads(value)
+        if not isinstance(value, dict):
+            raise ValueError(f"Expected an object, got {value!r}")
+        return value
+    if annotation in (int, float) and isinstance(value, str):
+        return annotation(value.strip())
+    if annotation is str and not isinstance(value, str):
+        return str(value)
+    return value
+
+
+def _build_crewai_tool(name: str, func: Callable):
+    from crewai_tools import tool as crewai_tool
+    return crewai_tool(name)(func)
+
+
+def _build_langchain_tool(name: str, func: Callable):
+    from langchain_core.tools import tool as langchain_tool
+    return langchain_tool(name)(func)
+
+
+class LazyTool:
+    def __init__(self, name: str, func: Callable, build: Callable = _build_crewai_tool):
+        if func.__doc__ is None:
+            raise ValueError("Function must have a docstring")
+        self.name = name
+        self.description = func.__doc__
+        self._build = build
+        self._original = func
+        self._func = func
+        self._tool = None
+        self._lock = threading.Lock()
+
+    @property
+    def func(self) -> Callable:
+        return self._tool.func if self._tool is not None else self._func
+
+    @func.setter
+    def func(self, value: Callable):
+        self._func = value
+        if self._tool is not None:
+            self._tool.func = value
+
+    def run(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    @property
+    def tool(self):
+        """The real tool for agents, built on first use"""
+        if self._tool is None:
+            with self._lock:
+                if self._tool is None:
+                    real = self._build(self.name, self._original)
+                    real.func = self._func
+                    self._tool = real
+        return self._tool
+
+    def schema(self) -> dict:
+        """OpenAI function-calling definition built from the function signature, without the real tool"""
+        properties, required = {}, []
+        for name, parameter in inspect.signature(self._original).parameters.items():
+            properties[name] = json_schema(parameter.annotation)
+            if parameter.default is inspect.Parameter.empty:
+                required.append(name)
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": inspect.cleandoc(self.description),
+                "parameters": {"type": "object", "properties": properties, "required": required},
+            },
+        }
+
+    def coerce_args(self, args: dict) -> dict:
+        """Model-supplied keyword arguments converted to the parameter types; ValueError for bad ones"""
+        parameters = inspect.signature(self._original).parameters
+        unknown = [name for name in args if name not in parameters]
+        if unknown:
+            raise ValueError(f"Unexpected argument(s) for {self.name}: {', '.join(unknown)}")
+        try:
+            return {name: coerce(value, parameters[name].annotation) for name, value in args.items()}
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid argument for {self.name}: {str(e)}")
+
+    @property
+    def loaded(self) -> bool:
+        return self._tool is not None
+
+    def __repr__(self):
+        return f"LazyTool({self.name!r})"
+
+
+def _decorator(arg, build: Callable):
+    if callable(arg):
+        return LazyTool(arg.__name__, arg, build)
+
+    def decorator(func: Callable) -> LazyTool:
+        return LazyTool(arg or func.__name__, func, build)
+    return decorator
+
+
+def tool(arg=None):
+    """Decorator turning a function with a docstring into a LazyTool backed by crewai_tools; @tool or @tool("name")"""
+    return _decorator(arg, _build_crewai_tool)
+
+
+def langchain_tool(arg=None):
+    """Like tool, but the agent gets a langchain_core StructuredTool"""
+    return _decorator(arg, _build_langchain_tool)
+
+
+def agent_tools(tools) -> list:
+    """Real tools for an agent: LazyTools are built, anything else (e.g. langchain tools) is passed through"""
+    return [t.tool if isinstance(t, LazyTool) else t for t in tools]
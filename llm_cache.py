@@ -0,0 +1,224 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from async_runtime import run_blocking
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(BASE_DIR, ".cache", "llm_cache.sqlite3"))
+DEFAULT_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+DEFAULT_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+MEMORY_ENTRIES = 256
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so trivially different prompts share an entry; case is kept,
+    since names and quoted user text can differ only in case"""
+    return re.sub(r"\s+", " ", prompt).strip()
+
+
+def make_key(prompt: str, model: str, temperature, **kwargs) -> str:
+    payload = json.dumps(
+        {"prompt": normalize_prompt(prompt), "model": model, "temperature": temperature, "kwargs": kwargs},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class LLMCache:
+    """Disk-backed LLM response cache with an in-memory LRU front and single-flight deduplication"""
+
+    def __init__(self, path=DEFAULT_PATH, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._inflight = {}
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, content TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            self._conn.commit()
+        return self._conn
+
+    def _remember(self, key, content, created):
+        self._memory[key] = (content, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > MEMORY_ENTRIES:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached content for key, or None on a miss or expired entry"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[1] <= self.ttl:
+                self._memory.move_to_end(key)
+                return entry[0]
+
+            try:
+                conn = self._connection()
+                row = conn.execute("SELECT content, created FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                content, created = row
+                if now - created > self.ttl:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    conn.commit()
+                    self._memory.pop(key, None)
+                    return None
+                conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Error reading LLM cache: {str(e)}")
+                return None
+            self._remember(key, content, created)
+            return content
+
+    def put(self, key, content):
+        now = time.time()
+        with self._lock:
+            self._remember(key, content, now)
+            try:
+                conn = self._connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, content, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, content, now, now),
+                )
+                # Evict least recently used entries beyond the size limit
+                conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Error writing LLM cache: {str(e)}")
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, calling compute() at most once across concurrent callers"""
+        content = self.get(key)
+        if content is not None:
+            return content
+
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+
+        try:
+            content = compute()
+            self.put(key, content)
+            future.set_result(content)
+            return content
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _join(self, key):
+        """(future, leader) for key: the in-flight computation to wait for, or a new one to lead"""
+        with self._lock:
+            # A leader may have finished between the caller's miss and taking the lock
+            entry = self._memory.get(key)
+            if entry is not None:
+                done = Future()
+                done.set_result(entry[0])
+                return done, False
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, False
+            future = self._inflight[key] = Future()
+            return future, True
+
+    async def aget_or_compute(self, key, acompute):
+        """Async get_or_compute: awaits acompute() at most once across concurrent callers, sync or async.
+        The SQLite reads and writes run off the event loop."""
+        content = await run_blocking(self.get, key)
+        if content is not None:
+            return content
+
+        future, leader = self._join(key)
+        if not leader:
+            # Shielded so a cancelled follower does not cancel the leader's future
+            return await asyncio.shield(asyncio.wrap_future(future))
+
+        try:
+            content = await acompute()
+            await run_blocking(self.put, key, content)
+            future.set_result(content)
+            return content
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            try:
+                self._connection().execute("DELETE FROM responses")
+                self._connection().commit()
+            except sqlite3.Error as e:
+                logger.error(f"Error clearing LLM cache: {str(e)}")
+
+
+llm_cache = LLMCache()
+
+
+def cache_key(llm, prompt: str, **kwargs) -> str:
+    """Cache key for invoking llm with prompt and the given invoke options"""
+    return make_key(
+        prompt,
+        getattr(llm, "model_name", None),
+        getattr(llm, "temperature", None),
+        max_tokens=getattr(llm, "max_tokens", None),
+        **kwargs,
+    )
+
+
+def cached_invoke(llm, prompt: str, cache: bool = True, **kwargs) -> str:
+    """Invoke a chat model and return the response content, serving repeats from the cache.
+
+    Pass cache=False at call sites that need a fresh completion every time.
+    Setting LLM_CACHE=0 disables caching globally.
+    """
+    if not cache or os.getenv("LLM_CACHE", "1") == "0":
+        return llm.invoke(input=prompt, **kwargs).content
+
+    key = cache_key(llm, prompt, **kwargs)
+    return llm_cache.get_or_compute(key, lambda: llm.invoke(input=prompt, **kwargs).content)
+
+
+async def acached_invoke(llm, prompt: str, cache: bool = True, **kwargs) -> str:
+    """Async variant of cached_invoke that awaits the chat model instead of blocking a thread"""
+    if not cache or os.getenv("LLM_CACHE", "1") == "0":
+        return (await llm.ainvoke(input=prompt, **kwargs)).content
+
+    async def compute():
+        return (await llm.ainvoke(input=prompt, **kwargs)).content
+
+    return await llm_cache.aget_or_compute(cache_key(llm, prompt, **kwargs), compute)
@@ -0,0 +1,201 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_VERSION = 1
+# Cassette file to record to or replay from; unset disables the layer
+CASSETTE_PATH = os.getenv("LLM_CASSETTE")
+# record: always call the API and save; replay: serve recorded responses and
+# record misses; strict: serve recorded responses and fail on misses
+CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", "replay")
+SIMULATE_LATENCY = os.getenv("LLM_CASSETTE_LATENCY", "0") == "1"
+MODES = ("record", "replay", "strict")
+
+# Response headers that no longer apply once the body has been decoded and stored
+_DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+
+class CassetteMissError(RuntimeError):
+    """Raised in strict mode for a request that has no recorded response"""
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return re.sub(r"\s+", " ", value).strip()
+    if isinstance(value, list):
+        return [_normalize(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    return value
+
+
+def request_key(method: str, path: str, body: bytes) -> str:
+    """Key of a request: its endpoint plus the JSON body with whitespace in messages and tool schemas normalized"""
+    try:
+        payload = _normalize(json.loads(body)) if body else None
+    except ValueError:
+        payload = body.decode("utf-8", "replace")
+    canonical = json.dumps({"method": method, "path": path, "body": payload}, sort_keys=True)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class Cassette:
+    """Recorded request/response pairs, stored as a versioned JSON file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.interactions: Dict[str, List[dict]] = {}
+        self._played: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                data = json.load(f)
+            if data.get("version") != CASSETTE_VERSION:
+                raise ValueError(f"Unsupported cassette version {data.get('version')} in {path}")
+            self.interactions = data.get("interactions", {})
+
+    def play(self, key: str) -> Optional[dict]:
+        """Next recorded response for key; repeats of a request replay its recordings in order"""
+        with self._lock:
+            recorded = self.interactions.get(key)
+            if not recorded:
+                return None
+            index = self._played.get(key, 0)
+            self._played[key] = index + 1
+            return recorded[min(index, len(recorded) - 1)]
+
+    def record(self, key: str, interaction: dict, replace: bool = False):
+        with self._lock:
+            if replace and key not in self._played:
+                self.interactions[key] = []
+                self._played[key] = 0
+            self.interactions.setdefault(key, []).append(interaction)
+            self._played[key] = len(self.interactions[key])
+            self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump({"version": CASSETTE_VERSION, "interactions": self.interactions}, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+            self._dirty = False
+
+
+class _CassetteLogic:
+    def __init__(self, cassette: Cassette, mode: str = CASSETTE_MODE, simulate_latency: bool = SIMULATE_LATENCY):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode '{mode}', expected one of {', '.join(MODES)}")
+        self.cassette = cassette
+        self.mode = mode
+        self.simulate_latency = simulate_latency
+
+    def lookup(self, request: httpx.Request):
+        """(key, recorded interaction or None); raises CassetteMissError on a strict miss"""
+        key = request_key(request.method, request.url.path, request.content)
+        if self.mode == "record":
+            return key, None
+        interaction = self.cassette.play(key)
+        if interaction is None and self.mode == "strict":
+            logger.error(f"Cassette miss in strict mode: {request.method} {request.url.path}")
+            raise CassetteMissError(f"No recorded response for {request.method} {request.url.path} in {self.cassette.path}")
+        return key, interaction
+
+    def replay(self, request: httpx.Request, interaction: dict) -> httpx.Response:
+        response = interaction["response"]
+        return httpx.Response(
+            response["status"],
+            headers=response["headers"],
+            content=response["body"].encode("utf-8"),
+            request=request,
+        )
+
+    def store(self, key: str, request: httpx.Request, response: httpx.Response, latency: float) -> httpx.Response:
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in _DROPPED_HEADERS}
+        body = response.content.decode("utf-8", "replace")
+        if response.status_code < 500:
+            self.cassette.record(key, {
+                "request": {"method": request.method, "path": request.url.path},
+                "response": {"status": response.status_code, "headers": headers, "body": body},
+                "latency": round(latency, 4),
+            }, replace=self.mode == "record")
+            self.cassette.save()
+        return httpx.Response(response.status_code, headers=headers, content=response.content, request=request)
+
+
+class CassetteTransport(httpx.BaseTransport, _CassetteLogic):
+    """httpx transport that records API traffic to a cassette or replays it without network"""
+
+    def __init__(self, cassette: Cassette, mode: str = CASSETTE_MODE, simulate_latency: bool = SIMULATE_LATENCY,
+                 inner: Optional[httpx.BaseTransport] = None):
+        _CassetteLogic.__init__(self, cassette, mode, simulate_latency)
+        self.inner = inner or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.read()
+        key, interaction = self.lookup(request)
+        if interaction is not None:
+            if self.simulate_latency:
+                time.sleep(interaction.get("latency", 0))
+            return self.replay(request, interaction)
+        start = time.perf_counter()
+        response = self.inner.handle_request(request)
+        try:
+            response.read()
+        finally:
+            response.close()
+        return self.store(key, request, response, time.perf_counter() - start)
+
+    def close(self):
+        self.inner.close()
+
+
+class AsyncCassetteTransport(httpx.AsyncBaseTransport, _CassetteLogic):
+    """Async counterpart of CassetteTransport"""
+
+    def __init__(self, cassette: Cassette, mode: str = CASSETTE_MODE, simulate_latency: bool = SIMULATE_LATENCY,
+                 inner: Optional[httpx.AsyncBaseTransport] = None):
+        _CassetteLogic.__init__(self, cassette, mode, simulate_latency)
+        self.inner = inner or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        key, interaction = self.lookup(request)
+        if interaction is not None:
+            if self.simulate_latency:
+                await asyncio.sleep(interaction.get("latency", 0))
+            return self.replay(request, interaction)
+        start = time.perf_counter()
+        response = await self.inner.handle_async_request(request)
+        try:
+            await response.aread()
+        finally:
+            await response.aclose()
+        return self.store(key, request, response, time.perf_counter() - start)
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+_cassettes: Dict[str, Cassette] = {}
+
+
+def get_cassette(path: str) -> Cassette:
+    """One Cassette per file, shared by the sync and async transports"""
+    if path not in _cassettes:
+        _cassettes[path] = Cassette(path)
+    return _cassettes[path]
@@ -0,0 +1,201 @@
+import json
+import logging
+import os
+import threading
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+import httpx
+
+import tracing
+from llm_cassette import CASSETTE_MODE, CASSETTE_PATH, AsyncCassetteTransport, CassetteTransport, get_cassette
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+
+logger = logging.getLogger(__name__)
+
+# Concurrent connections kept open to the API, shared by every client profile
+POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "10"))
+KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "120"))
+REQUEST_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+
+_lock = threading.Lock()
+_http_client: Optional[httpx.Client] = None
+_async_http_client: Optional[httpx.AsyncClient] = None
+_clients: Dict[Tuple[str, Optional[float], Optional[int]], "ChatOpenAI"] = {}
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=POOL_SIZE,
+        max_keepalive_connections=POOL_SIZE,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+
+
+class _TracingLogic:
+    @staticmethod
+    def describe(request: httpx.Request) -> dict:
+        try:
+            payload = json.loads(request.content) if request.content else {}
+        except ValueError:
+            payload = {}
+        return {"model": payload.get("model"), "path": request.url.path, "stream": bool(payload.get("stream"))}
+
+    @staticmethod
+    def record(s, response: httpx.Response, stream: bool):
+        s.set(status=response.status_code)
+        if stream:
+            # The span covers the time to the first byte; tokens arrive later in the stream
+            return
+        try:
+            usage = response.json().get("usage") or {}
+        except ValueError:
+            return
+        s.set(**{key: usage[key] for key in ("prompt_tokens", "completion_tokens", "total_tokens") if key in usage})
+
+
+class TracingTransport(httpx.BaseTransport, _TracingLogic):
+    """Outermost transport layer: each API request is an "llm" span with its model, status and token usage"""
+
+    def __init__(self, inner: httpx.BaseTransport):
+        self.inner = inner
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if not tracing.enabled():
+            return self.inner.handle_request(request)
+        request.read()
+        attributes = self.describe(request)
+        with tracing.span(f"llm {attributes['model']}", "llm", **attributes) as s:
+            response = self.inner.handle_request(request)
+            if not attributes["stream"]:
+                response.read()
+            self.record(s, response, attributes["stream"])
+            return response
+
+    def close(self):
+        self.inner.close()
+
+
+class AsyncTracingTransport(httpx.AsyncBaseTransport, _TracingLogic):
+    """Async counterpart of TracingTransport"""
+
+    def __init__(self, inner: httpx.AsyncBaseTransport):
+        self.inner = inner
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if not tracing.enabled():
+            return await self.inner.handle_async_request(request)
+        await request.aread()
+        attributes = self.describe(request)
+        with tracing.span(f"llm {attributes['model']}", "llm", **attributes) as s:
+            response = await self.inner.handle_async_request(request)
+            if not attributes["stream"]:
+                await response.aread()
+            self.record(s, response, attributes["stream"])
+            return response
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+def _shared_transports() -> bool:
+    """Whether LLM requests go through our own transport layers: a cassette, or tracing (TRACE=1 at startup)"""
+    return bool(CASSETTE_PATH) or tracing.enabled()
+
+
+def http_client() -> httpx.Client:
+    """Process-wide keep-alive HTTP transport for LLM requests"""
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            transport = None
+            if _shared_transports():
+                transport = httpx.HTTPTransport(limits=_limits())
+                if CASSETTE_PATH:
+                    transport = CassetteTransport(get_cassette(CASSETTE_PATH), inner=transport)
+                transport = TracingTransport(transport)
+            _http_client = httpx.Client(limits=_limits(), timeout=REQUEST_TIMEOUT, transport=transport)
+            if transport is not None:
+                _use_for_crews(_http_client, async_http_client())
+        return _http_client
+
+
+def async_http_client() -> Optional[httpx.AsyncClient]:
+    """Async client routed through the cassette and tracing layers when either is on; otherwise None,
+    leaving each ChatOpenAI its own async client"""
+    global _async_http_client
+    if not _shared_transports():
+        return None
+    if _async_http_client is None:
+        transport = httpx.AsyncHTTPTransport(limits=_limits())
+        if CASSETTE_PATH:
+            transport = AsyncCassetteTransport(get_cassette(CASSETTE_PATH), inner=transport)
+        _async_http_client = httpx.AsyncClient(timeout=REQUEST_TIMEOUT, transport=AsyncTracingTransport(transport))
+    return _async_http_client
+
+
+def _use_for_crews(client: httpx.Client, async_client: httpx.AsyncClient):
+    """crewai agents call the API through litellm; route those requests through our transports too"""
+    import litellm
+
+    litellm.client_session = client
+    litellm.aclient_session = async_client
+    if CASSETTE_PATH:
+        logger.info(f"Routing LLM requests through cassette {CASSETTE_PATH} ({CASSETTE_MODE} mode)")
+
+
+def get_chat_llm(model: str = "gpt-4o-mini", temperature: Optional[float] = None, max_tokens: Optional[int] = None) -> "ChatOpenAI":
+    """Return the shared ChatOpenAI client for a (model, temperature, max_tokens) profile"""
+    key = (model, temperature, max_tokens)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    # Imported here so that queries which never reach an LLM do not pay for it
+    from langchain_openai import ChatOpenAI
+
+    transport = http_client()
+    with _lock:
+        if key not in _clients:
+            kwargs = {}
+            if temperature is not None:
+                kwargs["temperature"] = temperature
+            if max_tokens is not None:
+                kwargs["max_tokens"] = max_tokens
+            _clients[key] = ChatOpenAI(
+                model=model,
+                openai_api_key=os.getenv("OPENAI_API_KEY"),
+                http_client=transport,
+                http_async_client=async_http_client(),
+                verbose=True,
+                **kwargs
+            )
+        return _clients[key]
+
+
+def warm_up(connections: int = 1, background: bool = True):
+    """Open connections (DNS, TCP and TLS) to the API ahead of the first real request"""
+    def run():
+        llm = get_chat_llm()
+        threads = [
+            threading.Thread(target=_open_connection, args=(llm,), daemon=True)
+            for _ in range(max(1, min(connections, POOL_SIZE)))
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    if background:
+        threading.Thread(target=run, name="llm-warmup", daemon=True).start()
+    else:
+        run()
+
+
+def _open_connection(llm: "ChatOpenAI"):
+    try:
+        llm.root_client.models.list()
+        logger.debug("LLM connection warmed up")
+    except Exception as e:
+        logger.warning(f"LLM warm-up failed: {str(e)}")
@@ -1,10 +1,19 @@
 from langchain_core.tools import tool
 from langchain_openai import ChatOpenAI
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Iterator, List, Optional, Tuple
+import json
 import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import speech_recognition as sr
 
+from llm_cache import cached_invoke
+from llm_clients import get_chat_llm, warm_up
+from audio_listener import BackgroundListener
+from question_classifier import DEFAULT_CONFIDENCE_THRESHOLD, QuestionClassifier
+
 class ResponseChoice(BaseModel):
     """Model for a single response choice"""
     id: int = Field(description="Unique identifier for the response choice")
@@ -18,28 +27,24 @@ class ResponseOutput(BaseModel):
     selected_choice: ResponseChoice = Field(description="The final selected response")
     user_input_required: bool = Field(description="Whether user input was required")
 
-@tool
-def choose_response(question: str) -> ResponseOutput:
-    """
-    This function processes a question and returns structured response choices.
-    
-    Args:
-        question (str): The question or comment posed to the user.
-    Returns:
-        ResponseOutput: A structured output containing all response data.
-    """
-    # Generate possible responses using OpenAI
-    llm = ChatOpenAI(
-        model="gpt-4o-mini",
-        openai_api_key=os.getenv("OPENAI_API_KEY"),
-        max_tokens=150,
-        temperature=0.7,
-        verbose=True
-    )
-    
-    # Updated prompt to be more explicit about the required format
-    response = llm.invoke(
-        input=f"""Generate 4 appropriate response choices for this question: "{question}"
+JSON_FORMAT = {"type": "json_object"}
+
+# Render options as they are generated and let the user pick before the rest arrive
+STREAM_CHOICES = os.getenv("STREAM_CHOICES", "1") != "0"
+# Start generating choices for a transcript while it is still being validated
+PIPELINE_RESPONSES = os.getenv("PIPELINE_RESPONSES", "1") != "0"
+
+# Local validator confidence below which is_valid_question asks the LLM instead
+LOCAL_VALIDATION_THRESHOLD = float(os.getenv("LOCAL_VALIDATION_THRESHOLD", str(DEFAULT_CONFIDENCE_THRESHOLD)))
+question_classifier = QuestionClassifier.from_corpus()
+
+# Keep one calibrated microphone listening so no question is lost while busy
+LISTEN_IN_BACKGROUND = os.getenv("LISTEN_IN_BACKGROUND", "1") != "0"
+
+_generation_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="choices")
+
+def choices_prompt(question: str) -> str:
+    return f"""Generate 4 appropriate response choices for this question: "{question}"
         Note that this question is being posed to a user living with paralysis, so generated answers should take into account how they may want to respond. 
         Also, ensure that responses are different, and cover a range of possible reactions.
         
@@ -51,17 +56,120 @@ def choose_response(question: str) -> ResponseOutput:
                 {{"text": "third response"}},
                 {{"text": "fourth response"}}
             ]
-        }}""",
-        response_format={"type": "json_object"}
+        }}"""
+
+def fallback_choices() -> List[ResponseChoice]:
+    """Choices offered when no AI choices could be generated"""
+    return [
+        ResponseChoice(
+            id=0,
+            text="Yes",
+            source='fallback'
+        ),
+        ResponseChoice(
+            id=1,
+            text="No",
+            source='fallback'
+        )
+    ]
+
+class ChoiceStreamParser:
+    """Incrementally extracts complete objects from the "choices" array of a JSON completion as it streams in"""
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.in_array = False
+        self.in_string = False
+        self.escape = False
+        self.depth = 0
+        self.start = 0
+
+    def feed(self, text: str) -> List[dict]:
+        """Add streamed text and return the choice objects completed by it"""
+        self.buffer += text
+        completed = []
+        if not self.in_array:
+            match = re.search(r'"choices"\s*:\s*\[', self.buffer)
+            if not match:
+                return completed
+            self.in_array = True
+            self.pos = match.end()
+
+        while self.pos < len(self.buffer):
+            char = self.buffer[self.pos]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == '\\':
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == '{':
+                if self.depth == 0:
+                    self.start = self.pos
+                self.depth += 1
+            elif char == '}' and self.depth > 0:
+                self.depth -= 1
+                if self.depth == 0:
+                    try:
+                        completed.append(json.loads(self.buffer[self.start:self.pos + 1]))
+                    except ValueError:
+                        pass
+            self.pos += 1
+        return completed
+
+def stream_ai_choices(llm, question: str, cancel: Optional[threading.Event] = None) -> Iterator[ResponseChoice]:
+    """
+    Yield each AI response choice as soon as the completion contains all of it.
+    
+    Args:
+        llm: The chat model to stream from.
+        question (str): The question or comment posed to the user.
+        cancel (threading.Event): When set, the remaining generation is abandoned.
+    Yields:
+        ResponseChoice: The next complete choice.
+    """
+    # Choices are sampled, so they are never served from the response cache
+    prompt = choices_prompt(question)
+    parser = ChoiceStreamParser()
+    content = ""
+    count = 0
+    stream = llm.stream(input=prompt, response_format=JSON_FORMAT)
+    try:
+        for chunk in stream:
+            if cancel is not None and cancel.is_set():
+                print("Selection made, cancelling remaining generation.")
+                return
+            content += chunk.content
+            for choice in parser.feed(chunk.content):
+                if 'text' not in choice:
+                    continue
+                yield ResponseChoice(id=count, text=choice['text'], source='ai')
+                count += 1
+    finally:
+        # Closing the stream drops the HTTP response, ending generation server-side
+        stream.close()
+
+    print(f"Raw LLM response: {content}")
+
+def generate_choices(llm, question: str) -> List[ResponseChoice]:
+    """Generate all AI response choices in one blocking call"""
+    content = cached_invoke(
+        llm,
+        choices_prompt(question),
+        cache=False,
+        response_format=JSON_FORMAT
     )
     
     # Add debug logging
-    print(f"Raw LLM response: {response.content}")
+    print(f"Raw LLM response: {content}")
     
     # Parse the response and create structured choices
     try:
-        import json
-        choices_data = json.loads(response.content)
+        choices_data = json.loads(content)
         
         # Extract the choices array
         choices_list = choices_data.get('choices', [])
@@ -81,58 +189,192 @@ def choose_response(question: str) -> ResponseOutput:
     except Exception as e:
         print(f"Error parsing LLM response: {str(e)}")
         # Provide fallback choices if parsing fails
-        ai_choices = [
-            ResponseChoice(
-                id=0,
-                text="Yes",
-                source='fallback'
-            ),
-            ResponseChoice(
-                id=1,
-                text="No",
-                source='fallback'
-            )
-        ]
+        ai_choices = fallback_choices()
+    return ai_choices
+
+class SpeculativeChoices:
+    """
+    Generates response choices for a question in the background.
     
-    # Add "None of the above" option
-    none_choice = ResponseChoice(
-        id=len(ai_choices),
-        text="None of the above",
-        source='system'
-    )
-    all_choices = ai_choices + [none_choice]
+    Choices are buffered as they stream in, so generation can start before
+    anyone is ready to show them (e.g. while the question is still being
+    validated) and be replayed from the first choice when iterated.
+    """
+
+    def __init__(self, llm, question: str):
+        self.question = question
+        self.cancel = threading.Event()
+        self._choices: List[ResponseChoice] = []
+        self._done = False
+        self._error: Optional[Exception] = None
+        self._condition = threading.Condition()
+        _generation_pool.submit(self._run, llm)
 
-    # Present the choices to the user
-    print("\nPlease choose a response:")
-    for choice in all_choices:
-        print(f"{choice.id + 1}. {choice.text}")
+    def _run(self, llm):
+        try:
+            for choice in stream_ai_choices(llm, self.question, self.cancel):
+                with self._condition:
+                    self._choices.append(choice)
+                    self._condition.notify_all()
+        except Exception as e:
+            self._error = e
+        finally:
+            with self._condition:
+                self._done = True
+                self._condition.notify_all()
+
+    def discard(self):
+        """Abandon the generation, e.g. because the question turned out to be invalid"""
+        self.cancel.set()
+
+    def __iter__(self) -> Iterator[ResponseChoice]:
+        index = 0
+        while True:
+            with self._condition:
+                while index >= len(self._choices) and not self._done:
+                    self._condition.wait()
+                if index >= len(self._choices):
+                    if self._error is not None:
+                        raise self._error
+                    return
+                choice = self._choices[index]
+            index += 1
+            yield choice
+
+def select_streamed_choice(source: SpeculativeChoices) -> Tuple[List[ResponseChoice], int]:
+    """
+    Print choices as they stream in and let the user commit to one early.
+    
+    Returns:
+        Tuple[List[ResponseChoice], int]: The choices shown so far and the index of the selected one.
+    """
+    shown: List[ResponseChoice] = []
+    lock = threading.Lock()
+    cancel = source.cancel
+    finished = threading.Event()
+
+    def produce():
+        try:
+            for choice in source:
+                with lock:
+                    shown.append(choice)
+                print(f"{choice.id + 1}. {choice.text}")
+        except Exception as e:
+            print(f"Error streaming LLM response: {str(e)}")
+        if cancel.is_set():
+            return
+        with lock:
+            if not shown:
+                shown.extend(fallback_choices())
+                for choice in shown:
+                    print(f"{choice.id + 1}. {choice.text}")
+            none_choice = ResponseChoice(
+                id=len(shown),
+                text="None of the above",
+                source='system'
+            )
+            shown.append(none_choice)
+        print(f"{none_choice.id + 1}. {none_choice.text}")
+        finished.set()
+
+    print("\nPlease choose a response (you can choose as soon as an option appears):")
+    threading.Thread(target=produce, daemon=True).start()
 
-    # Get the user's choice
     while True:
         try:
-            user_choice = int(input("\nEnter the number of your choice: ")) - 1
-            if 0 <= user_choice < len(all_choices):
-                break
-            print("Invalid choice. Please try again.")
+            user_choice = int(input()) - 1
         except ValueError:
             print("Please enter a valid number.")
+            continue
+        with lock:
+            if 0 <= user_choice < len(shown):
+                cancel.set()
+                return list(shown), user_choice
+        if finished.is_set():
+            print("Invalid choice. Please try again.")
+        else:
+            print("That option hasn't appeared yet.")
+
+def choices_llm() -> ChatOpenAI:
+    """Chat model used to generate response choices"""
+    return get_chat_llm("gpt-4o-mini", temperature=0.7, max_tokens=150)
+
+@tool
+def choose_response(question: str) -> ResponseOutput:
+    """
+    This function processes a question and returns structured response choices.
+    
+    Args:
+        question (str): The question or comment posed to the user.
+    Returns:
+        ResponseOutput: A structured output containing all response data.
+    """
+    return respond_to_question(question)
 
-    user_input_required = user_choice == len(all_choices) - 1
+def respond_to_question(question: str, speculative: Optional["SpeculativeChoices"] = None) -> ResponseOutput:
+    """
+    Present response choices for a question and return the user's selection.
+    
+    Args:
+        question (str): The question or comment posed to the user.
+        speculative (SpeculativeChoices): Choices already being generated for this question, if any.
+    Returns:
+        ResponseOutput: A structured output containing all response data.
+    """
+    # Generate possible responses using OpenAI
+    llm = choices_llm()
+
+    if STREAM_CHOICES:
+        all_choices, user_choice = select_streamed_choice(speculative or SpeculativeChoices(llm, question))
+    else:
+        if speculative is not None:
+            try:
+                ai_choices = list(speculative)
+            except Exception as e:
+                print(f"Error generating LLM response: {str(e)}")
+                ai_choices = []
+            ai_choices = ai_choices or fallback_choices()
+        else:
+            ai_choices = generate_choices(llm, question)
+
+        # Add "None of the above" option
+        none_choice = ResponseChoice(
+            id=len(ai_choices),
+            text="None of the above",
+            source='system'
+        )
+        all_choices = ai_choices + [none_choice]
+
+        # Present the choices to the user
+        print("\nPlease choose a response:")
+        for choice in all_choices:
+            print(f"{choice.id + 1}. {choice.text}")
+
+        # Get the user's choice
+        while True:
+            try:
+                user_choice = int(input("\nEnter the number of your choice: ")) - 1
+                if 0 <= user_choice < len(all_choices):
+                    break
+                print("Invalid choice. Please try again.")
+            except ValueError:
+                print("Please enter a valid number.")
+
+    user_input_required = all_choices[user_choice].source == 'system'
 
     # Handle user input if needed
     if user_input_required:
         user_text = input("Please type your desired response: ")
-        llm_response = llm.invoke(
-            input=f"""Rewrite the following input to be a complete informal sentence response to the original question:
+        user_text = cached_invoke(
+            llm,
+            f"""Rewrite the following input to be a complete informal sentence response to the original question:
             
             Original Question: "{question}"
             User Input: "{user_text}"
             
             Response should be a single informal sentence.""",
             response_format={"type": "text"}
-        )
-        
-        user_text = llm_response.content.strip()
+        ).strip()
         selected_choice = ResponseChoice(
             id=len(all_choices),
             text=user_text,
@@ -158,23 +400,46 @@ class QuestionValidationResult(BaseModel):
 
 def is_valid_question(question: str) -> QuestionValidationResult:
     """
-    This function validates if the input is a valid question or comment using an LLM.
+    This function validates if the input is a valid question or comment.
+    
+    A local classifier answers confident cases in well under a millisecond;
+    only low-confidence transcripts are escalated to the LLM validator.
     
     Args:
         question (str): The input to validate.
     Returns:
         QuestionValidationResult: Structured validation results.
     """
-    llm = ChatOpenAI(
-        model="gpt-4o-mini", 
-        openai_api_key=os.getenv("OPENAI_API_KEY"),
-        max_tokens=50,
-        temperature=0.1,
-        verbose=True,    
+    is_valid, confidence = question_classifier.classify(question)
+    if confidence < LOCAL_VALIDATION_THRESHOLD:
+        return llm_validate_question(question)
+
+    if is_valid:
+        return QuestionValidationResult(
+            is_valid=True,
+            confidence_score=confidence,
+            question=" ".join(question.split())
+        )
+    return QuestionValidationResult(
+        is_valid=False,
+        confidence_score=confidence,
+        error_message="Input does not look like a question or comment addressed to the user"
     )
+
+def llm_validate_question(question: str) -> QuestionValidationResult:
+    """
+    This function validates if the input is a valid question or comment using an LLM.
     
-    response = llm.invoke(
-        input=f"""Analyze if the following input is a valid question or comment that could be posed to a user.
+    Args:
+        question (str): The input to validate.
+    Returns:
+        QuestionValidationResult: Structured validation results.
+    """
+    llm = get_chat_llm("gpt-4o-mini", temperature=0.1, max_tokens=50)
+    
+    content = cached_invoke(
+        llm,
+        f"""Analyze if the following input is a valid question or comment that could be posed to a user.
         
         Input: {question}
         
@@ -191,24 +456,23 @@ def is_valid_question(question: str) -> QuestionValidationResult:
     # Parse the LLM response into structured format
     try:
         # Use json.loads instead of eval for safer parsing
-        import json
-        result_dict = json.loads(response.content)
+        result_dict = json.loads(content)
         return QuestionValidationResult(**result_dict)
     except Exception as e:
         print(f"Error parsing validation result: {str(e)}")
-        print(f"Raw response: {response.content}")
+        print(f"Raw response: {content}")
         return QuestionValidationResult(
             is_valid=False,
             confidence_score=0.0,
             error_message=f"Error parsing validation result: {str(e)}"
         )
 
-def listen_for_question() -> Optional[str]:
+def transcribe_question() -> Optional[str]:
     """
-    Listen for audio input and convert it to text.
+    Listen for audio input and convert it to text, without validating it.
     
     Returns:
-        Optional[str]: The transcribed question or None if unsuccessful
+        Optional[str]: The raw transcript or None if unsuccessful
     """
     recognizer = sr.Recognizer()
     microphone = sr.Microphone()
@@ -221,13 +485,7 @@ def listen_for_question() -> Optional[str]:
     try:
         question = recognizer.recognize_google(audio)
         print(f"Question heard: {question}")
-        validation_result = is_valid_question(question)
-        
-        if not validation_result.is_valid:
-            print(f"Invalid input: {validation_result.error_message}")
-            return None
-            
-        return validation_result.question
+        return question
     except sr.UnknownValueError:
         print("Sorry, I could not understand the audio.")
         return None
@@ -235,14 +493,102 @@ def listen_for_question() -> Optional[str]:
         print("Could not request results from Google Speech Recognition service.")
         return None
 
+def listen_for_question() -> Optional[str]:
+    """
+    Listen for audio input and convert it to text.
+    
+    Returns:
+        Optional[str]: The transcribed question or None if unsuccessful
+    """
+    question = transcribe_question()
+    if not question:
+        return None
+
+    validation_result = is_valid_question(question)
+    
+    if not validation_result.is_valid:
+        print(f"Invalid input: {validation_result.error_message}")
+        return None
+        
+    return validation_result.question
+
+def same_question(transcript: str, cleaned: str) -> bool:
+    """Whether a cleaned question only differs from the transcript in case, punctuation or spacing"""
+    normalize = lambda text: " ".join(re.sub(r"[^\w\s]", " ", text).casefold().split())
+    return normalize(transcript) == normalize(cleaned)
+
+def answer_next_question() -> Optional[ResponseOutput]:
+    """
+    Listen for a question, validating it while its response choices are already being generated.
+    
+    If validation rejects the transcript, the speculative generation is cancelled.
+    If validation returns a cleaned question that differs from the transcript by more
+    than case, punctuation or spacing, the speculative choices are discarded and new
+    ones are generated for the cleaned question, so choices always answer what is shown.
+    
+    Returns:
+        Optional[ResponseOutput]: The response output or None if no valid question was heard
+    """
+    question = transcribe_question()
+    if not question:
+        return None
+    return answer_question(question)
+
+def answer_question(question: str) -> Optional[ResponseOutput]:
+    """
+    Validate a transcript while its response choices are already being generated.
+    
+    Returns:
+        Optional[ResponseOutput]: The response output or None if the transcript is not a valid question
+    """
+    speculative = SpeculativeChoices(choices_llm(), question)
+    validation_result = is_valid_question(question)
+
+    if not validation_result.is_valid:
+        speculative.discard()
+        print(f"Invalid input: {validation_result.error_message}")
+        return None
+
+    cleaned = validation_result.question or question
+    if not same_question(question, cleaned):
+        print(f"Validation rewrote the question to: {cleaned}")
+        speculative.discard()
+        speculative = None
+
+    return respond_to_question(cleaned, speculative)
+
+def validate_and_choose(question: str) -> Optional[ResponseOutput]:
+    """Validate a transcript, then generate choices for it (the sequential path)"""
+    validation_result = is_valid_question(question)
+    if not validation_result.is_valid:
+        print(f"Invalid input: {validation_result.error_message}")
+        return None
+    return choose_response.invoke(validation_result.question)
+
 if __name__ == "__main__":
+    if os.getenv("LLM_WARMUP", "1") != "0":
+        # Validation and generation can run at the same time, so warm two connections
+        warm_up(connections=2)
+
+    listener = None
+    if LISTEN_IN_BACKGROUND:
+        listener = BackgroundListener()
+        listener.start()
+
     while True:
-        question = listen_for_question()
-        if question:
-            response_output = choose_response.invoke(question)
+        if listener is not None:
+            question = listener.next_transcript()
+            respond = answer_question if PIPELINE_RESPONSES else validate_and_choose
+            response_output = respond(question)
+        elif PIPELINE_RESPONSES:
+            response_output = answer_next_question()
+        else:
+            question = listen_for_question()
+            response_output = choose_response.invoke(question) if question else None
+        if response_output:
             print("\nResponse Summary:")
             print(f"Original Question: {response_output.original_question}")
             print(f"Selected Response: {response_output.selected_choice.text}")
             print(f"Response Source: {response_output.selected_choice.source}")
             if response_output.user_input_required:
-                print("Custom user input was provided")
\ No newline at end of file
+                print("Custom user input was provided")
@@ -0,0 +1,350 @@
+"""
+Durable outbox for outgoing messages (emails, Gmail drafts).
+
+Tools put a message in the outbox and return right away; a background worker
+delivers it through the handler registered for its kind. Messages live in a
+SQLite table, so a message survives a browser hiccup or a restart of the
+assistant. A delivery that raises is retried with exponential backoff up to
+OUTBOX_MAX_ATTEMPTS times. Handlers raise PermanentFailure when retrying
+cannot help, and Cancelled when the user stopped the send. A kind can also
+register a canceller, so that cancel() can stop a message that is already
+being delivered (an email in its undo window). The same message queued again
+within OUTBOX_DEDUPE_WINDOW seconds is not sent twice.
+"""
+import hashlib
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PATH = os.getenv("OUTBOX_PATH", os.path.join(BASE_DIR, ".cache", "outbox.sqlite3"))
+MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+BACKOFF = float(os.getenv("OUTBOX_BACKOFF", "2"))
+MAX_BACKOFF = float(os.getenv("OUTBOX_MAX_BACKOFF", "300"))
+DEDUPE_WINDOW = float(os.getenv("OUTBOX_DEDUPE_WINDOW", "300"))
+# How long the CLI waits at exit for queued messages to go out
+DRAIN_TIMEOUT = float(os.getenv("OUTBOX_DRAIN_TIMEOUT", "60"))
+
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class PermanentFailure(Exception):
+    """Raised by a handler when retrying the delivery cannot help"""
+
+
+class Cancelled(PermanentFailure):
+    """Raised by a handler when the user stopped the send"""
+
+
+@dataclass
+class OutboxMessage:
+    id: int
+    kind: str
+    recipients: str
+    payload: dict
+    session_id: Optional[str]
+    status: str
+    attempts: int
+    created: float
+    updated: float
+    next_attempt: float
+    last_error: Optional[str]
+    result: Optional[str]
+
+    def describe(self, max_attempts: int = MAX_ATTEMPTS) -> str:
+        """One line for the user: what happened to this message"""
+        what = f"{self.kind.replace('_', ' ')} to {self.recipients}"
+        when = time.strftime("%H:%M:%S", time.localtime(self.updated))
+        if self.status == SENT:
+            return f"The {what} went out at {when}."
+        if self.status == CANCELLED:
+            return f"The {what} was cancelled at {when}."
+        if self.status == FAILED:
+            return f"The {what} could not be sent after {self.attempts} attempt(s): {self.last_error}"
+        if self.status == SENDING:
+            return f"The {what} is being sent right now."
+        if self.attempts:
+            wait = max(0, self.next_attempt - time.time())
+            return (f"The {what} has not gone out yet: attempt {self.attempts} of {max_attempts} failed "
+                    f"({self.last_error}), retrying in {wait:.0f}s.")
+        return f"The {what} is queued and will go out shortly."
+
+
+def dedupe_key(kind: str, payload: dict, session_id: Optional[str]) -> str:
+    data = json.dumps({"kind": kind, "payload": payload, "session": session_id}, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+COLUMNS = "id, kind, recipients, payload, session_id, status, attempts, created, updated, next_attempt, last_error, result"
+
+
+class Outbox:
+    def __init__(
+        self,
+        path: str = DEFAULT_PATH,
+        max_attempts: int = MAX_ATTEMPTS,
+        backoff: float = BACKOFF,
+        max_backoff: float = MAX_BACKOFF,
+        dedupe_window: float = DEDUPE_WINDOW,
+        autostart: bool = True,
+    ):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.dedupe_window = dedupe_window
+        self.autostart = autostart
+        self.handlers: Dict[str, Callable[[dict, OutboxMessage], str]] = {}
+        self.cancellers: Dict[str, Callable[[OutboxMessage], bool]] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, recipients TEXT NOT NULL, "
+                "payload TEXT NOT NULL, session_id TEXT, status TEXT NOT NULL, attempts INTEGER NOT NULL, "
+                "created REAL NOT NULL, updated REAL NOT NULL, next_attempt REAL NOT NULL, "
+                "last_error TEXT, result TEXT, dedupe_key TEXT NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS messages_due ON messages (status, next_attempt)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS messages_dedupe ON messages (dedupe_key, created)")
+            # Deliveries cut short by a crash or restart are tried again
+            self._conn.execute("UPDATE messages SET status = ? WHERE status = ?", (PENDING, SENDING))
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def _message(row) -> OutboxMessage:
+        values = list(row)
+        values[3] = json.loads(values[3])
+        return OutboxMessage(*values)
+
+    def register(self, kind: str, handler: Callable[[dict, OutboxMessage], str],
+                 canceller: Optional[Callable[[OutboxMessage], bool]] = None):
+        """Deliver messages of this kind with handler(payload, message), which returns a result line.
+        canceller(message) asks a delivery in progress to stop (the handler then raises Cancelled)
+        and returns False if it is too late."""
+        self.handlers[kind] = handler
+        if canceller is not None:
+            self.cancellers[kind] = canceller
+        self._wake.set()
+
+    def enqueue(self, kind: str, payload: dict, recipients: str = "", session_id: Optional[str] = None) -> OutboxMessage:
+        """Store a message for delivery and return it; an identical recent message is returned instead of a copy"""
+        key = dedupe_key(kind, payload, session_id)
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                f"SELECT {COLUMNS} FROM messages WHERE dedupe_key = ? AND created >= ? AND status NOT IN (?, ?) "
+                "ORDER BY id DESC LIMIT 1",
+                (key, now - self.dedupe_window, FAILED, CANCELLED),
+            ).fetchone()
+            if row is not None:
+                logger.info(f"Outbox: message {row[0]} to {recipients} is already queued or sent, not adding a copy")
+                return self._message(row)
+            cursor = conn.execute(
+                "INSERT INTO messages (kind, recipients, payload, session_id, status, attempts, created, updated, "
+                "next_attempt, dedupe_key) VALUES (?, ?, ?, ?, ?, 0, ?, ?, ?, ?)",
+                (kind, recipients, json.dumps(payload), session_id, PENDING, now, now, now, key),
+            )
+            conn.commit()
+            message_id = cursor.lastrowid
+        logger.info(f"Outbox: queued {kind} {message_id} to {recipients}")
+        if self.autostart:
+            self.start()
+        self._wake.set()
+        return self.get(message_id)
+
+    def get(self, message_id: int) -> Optional[OutboxMessage]:
+        with self._lock:
+            row = self._connection().execute(f"SELECT {COLUMNS} FROM messages WHERE id = ?", (message_id,)).fetchone()
+        return self._message(row) if row is not None else None
+
+    def find(self, recipient: Optional[str] = None, kind: Optional[str] = None,
+             session_id: Optional[str] = None, limit: int = 5) -> List[OutboxMessage]:
+        """Most recent messages first, optionally only those to a recipient, of a kind or of a session"""
+        query, args = f"SELECT {COLUMNS} FROM messages WHERE 1 = 1", []
+        if recipient:
+            query += " AND recipients LIKE ?"
+            args.append(f"%{recipient}%")
+        if kind:
+            query += " AND kind = ?"
+            args.append(kind)
+        if session_id:
+            query += " AND session_id = ?"
+            args.append(session_id)
+        query += " ORDER BY id DESC LIMIT ?"
+        args.append(limit)
+        with self._lock:
+            rows = self._connection().execute(query, args).fetchall()
+        return [self._message(row) for row in rows]
+
+    def cancel(self, message_id: int) -> bool:
+        """Cancel a message that has not gone out. A message being sent is stopped through its kind's
+        canceller; False if it is already out or cannot be stopped any more."""
+        with self._lock:
+            conn = self._connection()
+            cursor = conn.execute(
+                "UPDATE messages SET status = ?, updated = ? WHERE id = ? AND status = ?",
+                (CANCELLED, time.time(), message_id, PENDING),
+            )
+            conn.commit()
+        if cursor.rowcount > 0:
+            return True
+        message = self.get(message_id)
+        canceller = self.cancellers.get(message.kind) if message is not None else None
+        if message is None or message.status != SENDING or canceller is None:
+            return False
+        logger.info(f"Outbox: asking {message.kind} {message.id} to stop sending")
+        return bool(canceller(message))
+
+    def _claim(self, due_by: float) -> Optional[OutboxMessage]:
+        """Mark the next message due by due_by with a registered handler as being sent"""
+        kinds = list(self.handlers)
+        if not kinds:
+            return None
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                f"SELECT {COLUMNS} FROM messages WHERE status = ? AND next_attempt <= ? "
+                f"AND kind IN ({', '.join('?' * len(kinds))}) ORDER BY next_attempt, id LIMIT 1",
+                [PENDING, due_by] + kinds,
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE messages SET status = ?, updated = ? WHERE id = ?", (SENDING, time.time(), row[0]))
+            conn.commit()
+        return self._message(row)
+
+    def _finish(self, message: OutboxMessage, status: str, error: Optional[str] = None,
+                result: Optional[str] = None, next_attempt: Optional[float] = None):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "UPDATE messages SET status = ?, attempts = ?, updated = ?, next_attempt = ?, last_error = ?, result = ? "
+                "WHERE id = ?",
+                (status, message.attempts + 1, time.time(), next_attempt or message.next_attempt,
+                 error, result, message.id),
+            )
+            conn.commit()
+
+    def _deliver(self, message: OutboxMessage):
+        try:
+            result = self.handlers[message.kind](message.payload, message)
+        except Cancelled as e:
+            logger.info(f"Outbox: {message.kind} {message.id} cancelled: {str(e)}")
+            self._finish(message, CANCELLED, error=str(e))
+        except PermanentFailure as e:
+            logger.error(f"Outbox: {message.kind} {message.id} failed: {str(e)}")
+            self._finish(message, FAILED, error=str(e))
+        except Exception as e:
+            attempts = message.attempts + 1
+            if attempts >= self.max_attempts:
+                logger.error(f"Outbox: giving up on {message.kind} {message.id} after {attempts} attempts: {str(e)}")
+                self._finish(message, FAILED, error=str(e))
+                return
+            delay = min(self.max_backoff, self.backoff * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+            logger.warning(f"Outbox: {message.kind} {message.id} attempt {attempts} failed, retrying in {delay:.1f}s: {str(e)}")
+            self._finish(message, PENDING, error=str(e), next_attempt=time.time() + delay)
+        else:
+            logger.info(f"Outbox: delivered {message.kind} {message.id} to {message.recipients}")
+            self._finish(message, SENT, result=None if result is None else str(result))
+
+    def deliver_due(self) -> int:
+        """Deliver every message that is due now; returns how many were attempted.
+        A message that fails and is rescheduled is not tried again in the same pass."""
+        count = 0
+        now = time.time()
+        while not self._stop.is_set():
+            message = self._claim(now)
+            if message is None:
+                break
+            self._deliver(message)
+            count += 1
+        return count
+
+    def _next_due(self) -> Optional[float]:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT MIN(next_attempt) FROM messages WHERE status = ?", (PENDING,)
+            ).fetchone()
+        return row[0]
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.deliver_due()
+                due = self._next_due()
+            except Exception as e:
+                logger.error(f"Outbox worker error: {str(e)}")
+                due = time.time() + self.backoff
+            timeout = None if due is None else max(0.05, due - time.time())
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+    def start(self):
+        """Start the delivery worker, which also sends whatever an earlier run left in the outbox"""
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._stop.clear()
+            self._worker = threading.Thread(target=self._run, name="outbox", daemon=True)
+            self._worker.start()
+
+    def drain(self, timeout: float = DRAIN_TIMEOUT) -> bool:
+        """Wait until no message is being sent or due within timeout; False if some still are afterwards.
+        Messages whose next retry lies beyond the timeout are not waited for."""
+        deadline = time.monotonic() + timeout
+        due_by = time.time() + timeout
+        while True:
+            with self._lock:
+                if self._conn is None and not os.path.exists(self.path):
+                    return True
+                waiting = self._connection().execute(
+                    "SELECT COUNT(*) FROM messages WHERE status = ? OR (status = ? AND next_attempt <= ?)",
+                    (SENDING, PENDING, due_by),
+                ).fetchone()[0]
+            if not waiting:
+                return True
+            if time.monotonic() >= deadline:
+                logger.info(f"Outbox: {waiting} message(s) still waiting, they are sent on the next start")
+                return False
+            time.sleep(0.1)
+
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        self._wake.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+            self._worker = None
+
+    def close(self):
+        self.stop()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+outbox = Outbox()
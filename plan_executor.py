@@ -0,0 +1,199 @@
+import asyncio
+import contextvars
+import json
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from pydantic import BaseModel, Field
+
+from llm_cache import acached_invoke, cached_invoke
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 4
+
+
+class PlanStep(BaseModel):
+    """Model for a single sub-task of a plan"""
+    id: str = Field(description="Unique identifier of the step within the plan")
+    agent: str = Field(description="Name of the agent that executes the step")
+    query: str = Field(description="Self-contained instruction for the agent")
+    depends_on: List[str] = Field(default_factory=list, description="Ids of steps that must finish first")
+
+
+class Plan(BaseModel):
+    """Model for a plan graph of sub-tasks with dependencies"""
+    steps: List[PlanStep] = Field(description="Steps of the plan")
+
+    def validate_graph(self, agents: Optional[Iterable[str]] = None) -> None:
+        """Raise ValueError for duplicate ids, unknown agents or dependencies, and cycles"""
+        ids = [step.id for step in self.steps]
+        if len(set(ids)) != len(ids):
+            raise ValueError("Duplicate step ids in plan")
+        known_agents = set(agents) if agents is not None else None
+        for step in self.steps:
+            if known_agents is not None and step.agent not in known_agents:
+                raise ValueError(f"Unknown agent '{step.agent}' in step '{step.id}'")
+            for dep in step.depends_on:
+                if dep not in ids:
+                    raise ValueError(f"Step '{step.id}' depends on unknown step '{dep}'")
+
+        remaining = {step.id: set(step.depends_on) for step in self.steps}
+        while remaining:
+            ready = [step_id for step_id, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"Cycle between steps: {', '.join(sorted(remaining))}")
+            for step_id in ready:
+                del remaining[step_id]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+
+
+def plan_prompt(query: str, agents: Dict[str, str]) -> str:
+    """Prompt asking the LLM to decompose a query into a plan graph over the given agents (name -> description)"""
+    agent_list = "\n".join(f"- {name}: {description}" for name, description in agents.items())
+    return f"""Split the following user query into the smallest independent sub-tasks, one action each.
+
+        User query: "{query}"
+
+        Available agents:
+        {agent_list}
+
+        Each step must be a self-contained instruction for exactly one agent.
+        Only add a dependency when a step really needs the result or effect of another step
+        (e.g. draft before send, or a second browser action after the first); everything else runs at the same time.
+
+        Return them in this exact JSON format:
+        {{
+            "steps": [
+                {{"id": "1", "agent": "<agent name>", "query": "<instruction>", "depends_on": []}},
+                {{"id": "2", "agent": "<agent name>", "query": "<instruction>", "depends_on": ["1"]}}
+            ]
+        }}"""
+
+
+def parse_plan(content: str, agents: Iterable[str]) -> Plan:
+    plan = Plan(**json.loads(content))
+    plan.validate_graph(agents)
+    return plan
+
+
+def make_plan(llm, query: str, agents: Dict[str, str]) -> Plan:
+    """Ask the LLM to decompose a query into a plan graph over the given agents (name -> description)"""
+    content = cached_invoke(llm, plan_prompt(query, agents), response_format={"type": "json_object"})
+    return parse_plan(content, agents)
+
+
+async def amake_plan(llm, query: str, agents: Dict[str, str]) -> Plan:
+    content = await acached_invoke(llm, plan_prompt(query, agents), response_format={"type": "json_object"})
+    return parse_plan(content, agents)
+
+
+def execute_plan(
+    plan: Plan,
+    run_step: Callable[[PlanStep, Dict[str, str]], str],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    serial_agents: Iterable[str] = (),
+) -> Dict[str, str]:
+    """Run a plan, executing every step as soon as its dependencies have finished.
+
+    run_step receives the step and the results of its dependencies. Steps for
+    agents in serial_agents (e.g. ones sharing a single browser) never run at
+    the same time as each other. A failed step makes its dependents fail too,
+    while independent branches carry on.
+    Returns the result of every step, keyed by step id, in plan order.
+    """
+    plan.validate_graph()
+    steps = {step.id: step for step in plan.steps}
+    locks = {agent: threading.Lock() for agent in serial_agents}
+    results: Dict[str, str] = {}
+    failed = set()
+
+    def run(step: PlanStep) -> str:
+        context = {dep: results[dep] for dep in step.depends_on}
+        lock = locks.get(step.agent)
+        with span(f"step {step.id}", "step", agent=step.agent, query=step.query):
+            if lock is None:
+                return run_step(step, context)
+            with lock:
+                return run_step(step, context)
+
+    pending = dict(steps)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            for step_id, step in list(pending.items()):
+                if any(dep in failed for dep in step.depends_on):
+                    del pending[step_id]
+                    failed.add(step_id)
+                    results[step_id] = "Skipped: a step it depends on failed."
+                elif all(dep in results for dep in step.depends_on):
+                    del pending[step_id]
+                    logger.info(f"Starting step {step_id} ({step.agent}): {step.query}")
+                    # Worker threads run in a copy of this context so step spans nest under the query
+                    running[executor.submit(contextvars.copy_context().run, run, step)] = step_id
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step_id = running.pop(future)
+                try:
+                    results[step_id] = str(future.result())
+                except Exception as e:
+                    logger.error(f"Error in step {step_id}: {str(e)}")
+                    failed.add(step_id)
+                    results[step_id] = f"Error: {str(e)}"
+
+    return {step.id: results[step.id] for step in plan.steps}
+
+
+async def aexecute_plan(
+    plan: Plan,
+    run_step: Callable[[PlanStep, Dict[str, str]], Awaitable[str]],
+    serial_agents: Iterable[str] = (),
+) -> Dict[str, str]:
+    """Async variant of execute_plan: every ready step runs as a task on the current event loop"""
+    plan.validate_graph()
+    locks = {agent: asyncio.Lock() for agent in serial_agents}
+    results: Dict[str, str] = {}
+    failed = set()
+
+    async def run(step: PlanStep) -> str:
+        context = {dep: results[dep] for dep in step.depends_on}
+        lock = locks.get(step.agent)
+        with span(f"step {step.id}", "step", agent=step.agent, query=step.query):
+            if lock is None:
+                return await run_step(step, context)
+            async with lock:
+                return await run_step(step, context)
+
+    pending = {step.id: step for step in plan.steps}
+    running = {}
+    while pending or running:
+        for step_id, step in list(pending.items()):
+            if any(dep in failed for dep in step.depends_on):
+                del pending[step_id]
+                failed.add(step_id)
+                results[step_id] = "Skipped: a step it depends on failed."
+            elif all(dep in results for dep in step.depends_on):
+                del pending[step_id]
+                logger.info(f"Starting step {step_id} ({step.agent}): {step.query}")
+                running[asyncio.ensure_future(run(step))] = step_id
+
+        if not running:
+            continue
+        done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            step_id = running.pop(task)
+            try:
+                results[step_id] = str(task.result())
+            except Exception as e:
+                logger.error(f"Error in step {step_id}: {str(e)}")
+                failed.add(step_id)
+                results[step_id] = f"Error: {str(e)}"
+
+    return {step.id: results[step.id] for step in plan.steps}
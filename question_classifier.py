@@ -0,0 +1,127 @@
+import logging
+import math
+import os
+import re
+from typing import List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TRANSCRIPTS_PATH = os.path.join(BASE_DIR, 'corpus', 'transcripts', 'labeled_transcripts.txt')
+
+# Below this confidence the caller should escalate to the LLM validator
+DEFAULT_CONFIDENCE_THRESHOLD = 0.8
+
+INTERROGATIVES = {"what", "what's", "where", "when", "who", "who's", "why", "how", "how's", "which", "whose"}
+AUXILIARIES = {
+    "do", "does", "did", "are", "is", "was", "were", "am", "can", "could", "would", "will",
+    "should", "shall", "have", "has", "had", "may", "might", "want", "need",
+}
+SECOND_PERSON = {"you", "your", "you're", "yours", "yourself", "you'll", "you've", "you'd"}
+FIRST_PERSON = {"i", "i'm", "me", "my", "we", "we're", "us", "our", "let", "i'll"}
+SOCIAL = {"hello", "hi", "hey", "morning", "evening", "night", "thanks", "thank", "love", "happy", "sorry", "hope", "congratulations"}
+FILLERS = {
+    "um", "uh", "hmm", "huh", "mm", "mm-hmm", "uh-huh", "ah", "oh", "okay", "ok", "yeah", "like",
+    "so", "basically", "shh", "oops", "ha", "la", "blah", "testing", "know", "well", "and", "then",
+}
+WAKE_WORDS = {"siri", "alexa", "google", "cortana"}
+BROADCAST = {"news", "channel", "tonight", "breaking", "weather", "stock", "market", "commercial"}
+DANGLING = {"the", "a", "an", "and", "to", "of", "about", "with", "but", "or", "that"}
+
+FEATURE_NAMES = [
+    "bias", "interrogative_start", "auxiliary_start", "question_mark", "second_person",
+    "first_person", "social", "filler_ratio", "length", "very_short", "wake_word",
+    "broadcast", "dangling_end",
+]
+
+
+def tokenize(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9']+(?:-[a-z0-9']+)*", text.lower())
+
+
+def extract_features(text: str) -> List[float]:
+    """Hand-crafted features of a transcript, in FEATURE_NAMES order"""
+    words = tokenize(text)
+    n = len(words)
+    first = words[0] if words else ""
+    fillers = sum(1 for w in words if w in FILLERS)
+    return [
+        1.0,
+        float(first in INTERROGATIVES),
+        float(first in AUXILIARIES),
+        float(text.strip().endswith("?")),
+        float(any(w in SECOND_PERSON for w in words)),
+        float(any(w in FIRST_PERSON for w in words)),
+        float(any(w in SOCIAL for w in words)),
+        fillers / n if n else 1.0,
+        min(n, 12) / 12.0,
+        float(n <= 2),
+        float(any(w in WAKE_WORDS for w in words)),
+        float(any(w in BROADCAST for w in words)),
+        float(bool(words) and words[-1] in DANGLING),
+    ]
+
+
+def load_labeled_transcripts(path: str = TRANSCRIPTS_PATH) -> List[Tuple[str, bool]]:
+    """Load (transcript, is_valid) pairs from the labeled transcript file"""
+    examples = []
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                parts = [p.strip() for p in line.split(' | ')]
+                if len(parts) != 2 or parts[0] not in ("valid", "invalid"):
+                    continue
+                examples.append((parts[1], parts[0] == "valid"))
+    except Exception as e:
+        logger.error(f"Error loading labeled transcripts: {str(e)}")
+    return examples
+
+
+def _sigmoid(z: float) -> float:
+    if z < -30:
+        return 0.0
+    if z > 30:
+        return 1.0
+    return 1.0 / (1.0 + math.exp(-z))
+
+
+class QuestionClassifier:
+    """Logistic regression over transcript features, combined with a few hard rules"""
+
+    def __init__(self, weights: Optional[Sequence[float]] = None):
+        self.weights = list(weights) if weights is not None else [0.0] * len(FEATURE_NAMES)
+
+    @classmethod
+    def train(cls, examples: Sequence[Tuple[str, bool]], epochs: int = 400, learning_rate: float = 0.5, l2: float = 0.01):
+        """Fit the weights with batch gradient descent (deterministic, pure Python)"""
+        data = [(extract_features(text), 1.0 if label else 0.0) for text, label in examples]
+        weights = [0.0] * len(FEATURE_NAMES)
+        if not data:
+            return cls(weights)
+        for _ in range(epochs):
+            gradient = [0.0] * len(weights)
+            for features, label in data:
+                error = _sigmoid(sum(w * x for w, x in zip(weights, features))) - label
+                for i, x in enumerate(features):
+                    gradient[i] += error * x
+            for i in range(len(weights)):
+                penalty = l2 * weights[i] if i else 0.0
+                weights[i] -= learning_rate * (gradient[i] / len(data) + penalty)
+        return cls(weights)
+
+    @classmethod
+    def from_corpus(cls):
+        """Train on the labeled transcripts shipped with the repo"""
+        return cls.train(load_labeled_transcripts())
+
+    def probability(self, text: str) -> float:
+        """Probability that the transcript is a question or comment addressed to the user"""
+        words = tokenize(text)
+        if not words or all(w in FILLERS for w in words):
+            return 0.0
+        return _sigmoid(sum(w * x for w, x in zip(self.weights, extract_features(text))))
+
+    def classify(self, text: str) -> Tuple[bool, float]:
+        """Return (is_valid, confidence) for a transcript"""
+        p = self.probability(text)
+        return p >= 0.5, max(p, 1.0 - p)
@@ -0,0 +1,231 @@
+"""
+Long-running server mode: one process serves queries from many sessions.
+
+    python server.py [--host 127.0.0.1] [--port 8080]
+
+HTTP endpoints:
+    POST   /sessions                  {"contacts": {...}} (optional) -> {"session_id": ...}
+    DELETE /sessions/{id}
+    POST   /sessions/{id}/query       {"query": "..."} -> {"request_id", "result", "calls", "elapsed_ms"}
+    GET    /sessions/{id}/requests/{request_id}/calls   tool calls of a recent query
+    GET    /sessions/{id}/prompts     questions waiting for the user's answer
+    POST   /sessions/{id}/answers     {"prompt_id": ..., "answer": ...}
+    POST   /sessions/{id}/outbox/{message_id}/cancel   stop a queued email or draft, or an email in its undo window
+    GET    /health
+
+WebSocket /sessions/{id}/ws: send {"type": "query", "query": ...} and
+{"type": "answer", "prompt_id": ..., "answer": ...}; receive
+{"type": "prompt", ...} and {"type": "result", ...} messages.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+
+from aiohttp import WSMsgType, web
+
+from async_runtime import run_blocking
+from call_journal import journal
+from outbox import outbox
+from sessions import Session, SessionLimitError, SessionManager
+
+logger = logging.getLogger(__name__)
+
+# Queries executing at once across all sessions; the rest wait for a slot
+MAX_CONCURRENT_QUERIES = int(os.getenv("SERVER_MAX_CONCURRENT_QUERIES", "8"))
+# How long a query may wait for a slot before the server answers 503
+QUEUE_TIMEOUT = float(os.getenv("SERVER_QUEUE_TIMEOUT", "60"))
+
+
+class AssistantServer:
+    """Runs queries for many sessions on one event loop with bounded concurrency"""
+
+    def __init__(self, execute, manager: SessionManager, max_concurrent: int = MAX_CONCURRENT_QUERIES, queue_timeout: float = QUEUE_TIMEOUT):
+        self.execute = execute
+        self.manager = manager
+        self.queue_timeout = queue_timeout
+        self.max_concurrent = max_concurrent
+        self._slots = None
+        self.running = 0
+
+    async def run_query(self, session: Session, query: str) -> dict:
+        """Run one query in the session's context; queries of a session run in order"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        async with session.query_lock:
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise web.HTTPServiceUnavailable(reason="Server busy, try again later")
+            self.running += 1
+            token = session.activate()
+            start = time.perf_counter()
+            try:
+                with journal.request(session_id=session.id) as calls:
+                    session.requests.append(calls.id)
+                    result = await self.execute(query)
+            except Exception as e:
+                logger.error(f"Error executing query for session {session.id}: {str(e)}")
+                result = f"Error: {str(e)}"
+            finally:
+                Session.deactivate(token)
+                self.running -= 1
+                self._slots.release()
+        return {
+            "request_id": calls.id,
+            "result": str(result),
+            "calls": [[name, list(args)] for name, args in journal.snapshot(calls)],
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+        }
+
+    def _session(self, request) -> Session:
+        session = self.manager.get(request.match_info["session_id"])
+        if session is None:
+            raise web.HTTPNotFound(reason="Unknown session")
+        return session
+
+    async def create_session(self, request):
+        body = (await request.json() if request.can_read_body else None) or {}
+        try:
+            session = self.manager.create(body.get("contacts"))
+        except SessionLimitError as e:
+            raise web.HTTPServiceUnavailable(reason=str(e))
+        return web.json_response({"session_id": session.id}, status=201)
+
+    async def close_session(self, request):
+        if not self.manager.close(request.match_info["session_id"]):
+            raise web.HTTPNotFound(reason="Unknown session")
+        return web.json_response({"closed": True})
+
+    async def query(self, request):
+        session = self._session(request)
+        body = await request.json()
+        query = str(body.get("query", "")).strip()
+        if not query:
+            raise web.HTTPBadRequest(reason="Missing query")
+        return web.json_response(await self.run_query(session, query))
+
+    async def request_calls(self, request):
+        session = self._session(request)
+        calls = journal.get(request.match_info["request_id"])
+        if calls is None or calls.session_id != session.id:
+            raise web.HTTPNotFound(reason="Unknown or expired request")
+        return web.json_response({"calls": [[name, list(args)] for name, args in journal.snapshot(calls)], "count": calls.count})
+
+    async def prompts(self, request):
+        return web.json_response(self._session(request).pending_prompts())
+
+    async def answer(self, request):
+        session = self._session(request)
+        body = await request.json()
+        if not session.answer(str(body.get("prompt_id")), str(body.get("answer", ""))):
+            raise web.HTTPNotFound(reason="No such pending prompt")
+        return web.json_response({"answered": True})
+
+    async def cancel_message(self, request):
+        session = self._session(request)
+        try:
+            message = outbox.get(int(request.match_info["message_id"]))
+        except ValueError:
+            message = None
+        if message is None or message.session_id != session.id:
+            raise web.HTTPNotFound(reason="Unknown outbox message")
+        if not await run_blocking(outbox.cancel, message.id):
+            raise web.HTTPConflict(reason="Message has already gone out")
+        return web.json_response({"cancelled": True})
+
+    async def health(self, request):
+        return web.json_response({"sessions": len(self.manager.sessions), "running": self.running})
+
+    async def websocket(self, request):
+        session = self._session(request)
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        async def forward_prompts():
+            while True:
+                prompt = await session.prompts.get()
+                await ws.send_json({"type": "prompt", **prompt})
+
+        async def answer_query(query):
+            try:
+                await ws.send_json({"type": "result", "query": query, **(await self.run_query(session, query))})
+            except web.HTTPException as e:
+                await ws.send_json({"type": "error", "query": query, "error": e.reason})
+
+        forwarder = asyncio.ensure_future(forward_prompts())
+        queries = set()
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    data = json.loads(msg.data)
+                except json.JSONDecodeError:
+                    await ws.send_json({"type": "error", "error": "Invalid JSON"})
+                    continue
+                if data.get("type") == "query":
+                    # Run in the background so answers to prompts can still arrive
+                    task = asyncio.ensure_future(answer_query(str(data.get("query", ""))))
+                    queries.add(task)
+                    task.add_done_callback(queries.discard)
+                elif data.get("type") == "answer":
+                    session.answer(str(data.get("prompt_id")), str(data.get("answer", "")))
+        finally:
+            forwarder.cancel()
+            for task in queries:
+                task.cancel()
+        return ws
+
+
+SERVER_KEY = web.AppKey("server", AssistantServer)
+
+
+def create_app(execute=None, manager=None, max_concurrent: int = MAX_CONCURRENT_QUERIES) -> web.Application:
+    """Build the aiohttp application; by default queries run through app.aexecute_query"""
+    if execute is None or manager is None:
+        import app as assistant
+        execute = execute or assistant.aexecute_query
+        manager = manager or SessionManager(assistant.load_contacts)
+    server = AssistantServer(execute, manager, max_concurrent)
+    application = web.Application()
+    application[SERVER_KEY] = server
+    application.add_routes([
+        web.post("/sessions", server.create_session),
+        web.delete("/sessions/{session_id}", server.close_session),
+        web.post("/sessions/{session_id}/query", server.query),
+        web.get("/sessions/{session_id}/requests/{request_id}/calls", server.request_calls),
+        web.get("/sessions/{session_id}/prompts", server.prompts),
+        web.post("/sessions/{session_id}/answers", server.answer),
+        web.post("/sessions/{session_id}/outbox/{message_id}/cancel", server.cancel_message),
+        web.get("/sessions/{session_id}/ws", server.websocket),
+        web.get("/health", server.health),
+    ])
+    return application
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve assistant queries for many sessions")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    import app as assistant
+    from llm_clients import warm_up
+    application = create_app()
+    # A server pays the agent start-up cost once, before the first query
+    assistant.crews.load_all()
+    # Send whatever an earlier run left in the outbox
+    assistant.outbox.start()
+    # Keep device states in line with the device backend (DEVICE_RECONCILE_INTERVAL, off by default)
+    assistant.devices.start_reconciler()
+    logger.warning("Sessions have no browser factory, so all sessions share the one Selenium browser")
+    if os.getenv("LLM_WARMUP", "1") != "0":
+        warm_up(connections=2)
+    web.run_app(application, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
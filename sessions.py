@@ -0,0 +1,171 @@
+import asyncio
+import contextvars
+import itertools
+import logging
+import os
+import threading
+import time
+import uuid
+import weakref
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Callable, Dict, List, Optional, Union
+
+from contact_directory import ContactDirectory, directory
+
+logger = logging.getLogger(__name__)
+
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "100"))
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", "1800"))
+# How long a tool waits for the user to answer a question or confirmation
+PROMPT_TIMEOUT = float(os.getenv("SESSION_PROMPT_TIMEOUT", "300"))
+MAX_SESSION_REQUESTS = 50
+
+_current: contextvars.ContextVar[Optional["Session"]] = contextvars.ContextVar("current_session", default=None)
+
+
+def current_session() -> Optional["Session"]:
+    """The session the running query belongs to, or None outside server mode"""
+    return _current.get()
+
+
+def current_contacts() -> ContactDirectory:
+    """Contacts of the current session, or the contacts file outside server mode"""
+    session = current_session()
+    return session.contacts if session is not None else directory
+
+
+# Open sessions of every manager, for work that outlives the query that started it
+_open: "weakref.WeakValueDictionary[str, Session]" = weakref.WeakValueDictionary()
+
+
+def find_session(session_id: str) -> Optional["Session"]:
+    """The open session with this id, or None once it has been closed"""
+    return _open.get(session_id)
+
+
+class Session:
+    """
+    State of one user of the server: contacts, browser binding, recent
+    request ids and questions waiting for the user's answer.
+
+    Queries of a session run one at a time, in order. Tools reach the session
+    through current_session(), which follows the query into executor threads.
+    """
+
+    def __init__(self, contacts: ContactDirectory, browser=None, session_id: Optional[str] = None):
+        self.id = session_id or uuid.uuid4().hex
+        self.contacts = contacts
+        self.browser = browser
+        # Ids of the session's recent requests in call_journal.journal
+        self.requests = deque(maxlen=MAX_SESSION_REQUESTS)
+        self.created = time.time()
+        self.last_active = self.created
+        self.query_lock = asyncio.Lock()
+        # Prompts are pushed here for the client; created on the server's event loop
+        self.prompts: "asyncio.Queue[dict]" = asyncio.Queue()
+        self._loop = asyncio.get_running_loop()
+        self._pending: Dict[str, tuple] = {}
+        self._prompt_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def activate(self):
+        """Make this the current session for the calling context; returns a token for deactivate()"""
+        self.last_active = time.time()
+        return _current.set(self)
+
+    @staticmethod
+    def deactivate(token):
+        _current.reset(token)
+
+    def ask(self, question: str, timeout: float = PROMPT_TIMEOUT) -> str:
+        """Ask the user a question and block until they answer. Called from tool threads."""
+        prompt_id = str(next(self._prompt_ids))
+        future: Future = Future()
+        with self._lock:
+            self._pending[prompt_id] = (question, future)
+        self._loop.call_soon_threadsafe(self.prompts.put_nowait, {"prompt_id": prompt_id, "question": question})
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            logger.warning(f"Session {self.id}: no answer to '{question}' within {timeout}s")
+            return ""
+        finally:
+            with self._lock:
+                self._pending.pop(prompt_id, None)
+
+    def pending_prompts(self) -> List[dict]:
+        with self._lock:
+            return [{"prompt_id": pid, "question": q} for pid, (q, _) in self._pending.items()]
+
+    def answer(self, prompt_id: str, answer: str) -> bool:
+        """Deliver the user's answer to a pending prompt; False if there is no such prompt"""
+        with self._lock:
+            entry = self._pending.get(prompt_id)
+        if entry is None or entry[1].done():
+            return False
+        self.last_active = time.time()
+        entry[1].set_result(answer)
+        return True
+
+    def cancel_prompts(self):
+        with self._lock:
+            pending = list(self._pending.values())
+        for _, future in pending:
+            if not future.done():
+                future.set_result("")
+
+
+class SessionLimitError(Exception):
+    pass
+
+
+class SessionManager:
+    """Creates, looks up and expires sessions"""
+
+    def __init__(
+        self,
+        contacts_loader: Callable[[], Union[ContactDirectory, Dict[str, str]]],
+        browser_factory: Optional[Callable[[], object]] = None,
+        max_sessions: int = MAX_SESSIONS,
+        idle_timeout: float = SESSION_IDLE_TIMEOUT,
+    ):
+        self.contacts_loader = contacts_loader
+        self.browser_factory = browser_factory
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.sessions: Dict[str, Session] = {}
+
+    def create(self, contacts: Optional[Dict[str, str]] = None) -> Session:
+        self.expire_idle()
+        if len(self.sessions) >= self.max_sessions:
+            raise SessionLimitError(f"Session limit of {self.max_sessions} reached")
+        base = self.contacts_loader()
+        if not isinstance(base, ContactDirectory):
+            base = ContactDirectory.from_dict(base)
+        # Snapshot of the shared directory, so a session's overrides stay its own
+        session_contacts = base.copy(contacts)
+        browser = self.browser_factory() if self.browser_factory is not None else None
+        session = Session(session_contacts, browser)
+        self.sessions[session.id] = session
+        _open[session.id] = session
+        logger.info(f"Created session {session.id}")
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        return self.sessions.get(session_id)
+
+    def close(self, session_id: str) -> bool:
+        session = self.sessions.pop(session_id, None)
+        if session is None:
+            return False
+        _open.pop(session_id, None)
+        session.cancel_prompts()
+        logger.info(f"Closed session {session_id}")
+        return True
+
+    def expire_idle(self):
+        cutoff = time.time() - self.idle_timeout
+        for session_id, session in list(self.sessions.items()):
+            if session.last_active < cutoff and not session.query_lock.locked():
+                self.close(session_id)
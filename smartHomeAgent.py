@@ -1,73 +1,99 @@
-from ask_sdk_core.skill_builder import SkillBuilder
-from ask_sdk_core.handler_input import HandlerInput
-from ask_sdk_core.dispatch_components import AbstractRequestHandler
-from ask_sdk_core.utils import is_request_type, is_intent_name
-from ask_sdk_model import Response
-
-from crewai_tools import tool
-
-tracked_calls = []
+from call_journal import journal
+from device_state import appliance as appliance_device, devices, entertainment
+from lazy_tools import tool
+
+# Device states the tools' arguments stand for
+STATE_WORDS = {
+    "open": "open", "opened": "open", "close": "closed", "closed": "closed",
+    "lock": "locked", "locked": "locked", "unlock": "unlocked", "unlocked": "unlocked",
+    "arm": "armed", "armed": "armed", "disarm": "disarmed", "disarmed": "disarmed",
+}
+
+# Ring buffer of calls made outside a journaled request (CLI queries, test.py)
+tracked_calls = journal.default
 def track_call(tool_name: str, *args):
-    tracked_calls.append((tool_name, args))
+    journal.record(tool_name, args)
 
 @tool
 def turn_on_ac():
     """This function is used to turn on the AC"""
     track_call("turn_on_ac")
+    if not devices.command("ac", "on"):
+        return "AC is already on."
     return "AC turned on."
 
 @tool
 def turn_off_ac():
     """This function is used to turn off the AC"""
     track_call("turn_off_ac")
+    if not devices.command("ac", "off"):
+        return "AC is already off."
     return "AC turned off."
 
 @tool
 def turn_on_lights():
     """This function is used to turn the lights on"""
     track_call("turn_on_lights")
+    if not devices.command("lights", "on"):
+        return "Lights are already on."
     return "Lights turned on."
 
 @tool
 def turn_off_lights():
     """This function is used to turn the lights off"""
     track_call("turn_off_lights")
+    if not devices.command("lights", "off"):
+        return "Lights are already off."
     return "Lights turned off."
 
 @tool
 def set_thermostat(temperature: str):
     """This function takes in a specific temperature and sets the thermostat to that temperature."""
     track_call("set_thermostat", temperature)
+    if not devices.command("thermostat", temperature):
+        return f"Thermostat is already set to {temperature} degrees."
     return f"Thermostat set to {temperature} degrees."
 
 @tool
 def adjust_curtains(state: str):
     """This function adjusts curtains or blinds. Takes in the state 'open' or 'close'."""
     track_call("adjust_curtains", state)
+    if not devices.command("curtains", STATE_WORDS.get(state.strip().lower(), state)):
+        return f"Curtains are already {STATE_WORDS.get(state.strip().lower(), state)}."
     return f"Curtains {state}."
 
 @tool
 def start_appliance(appliance: str):
     """This function starts a specific home appliance, e.g., dishwasher, laundry."""
     track_call("start_appliance", appliance)
+    if not devices.command(appliance_device(appliance), "running"):
+        return f"{appliance.capitalize()} is already running."
     return f"{appliance.capitalize()} started."
 
 @tool
 def stop_appliance(appliance: str):
     """This function stops a specific home appliance, e.g., dishwasher, laundry."""
     track_call("stop_appliance", appliance)
+    if not devices.command(appliance_device(appliance), "stopped"):
+        return f"{appliance.capitalize()} is already stopped."
     return f"{appliance.capitalize()} stopped."
 
 @tool
 def manage_security(action: str):
     """This function manages the home security system, including cameras and alarms. Actions could include 'arm', 'disarm', or 'monitor'."""
     track_call("manage_security", action)
+    # "monitor" and other actions do not change the system's state
+    state = STATE_WORDS.get(action.strip().lower())
+    if state is not None and not devices.command("security", state):
+        return f"Security system is already {state}."
     return f"Security system {action}."
 
 @tool
 def manage_locks(lock_state: str):
     """This function manages door locks. Takes in 'lock' or 'unlock'."""
     track_call("manage_locks", lock_state)
+    if not devices.command("locks", STATE_WORDS.get(lock_state.strip().lower(), lock_state)):
+        return f"Doors are already {STATE_WORDS.get(lock_state.strip().lower(), lock_state)}."
     return f"Doors {lock_state}."
 
 @tool
@@ -81,6 +107,12 @@ def control_entertainment_device(device: str, action: str):
     """This function controls entertainment devices like TVs or speakers. 
     Takes in the device (e.g., 'TV') and action (e.g., 'on', 'off')."""
     track_call("control_entertainment_device", device, action)
+    # Only on and off are states; "volume up", "next" and the like are sent every time
+    if action.strip().lower() not in ("on", "off"):
+        devices.action(entertainment(device), action)
+        return f"{device.capitalize()} turned {action}."
+    if not devices.command(entertainment(device), action):
+        return f"{device.capitalize()} is already {action}."
     return f"{device.capitalize()} turned {action}."
 
 @tool
@@ -95,3 +127,13 @@ def control_streaming_service(service: str, action: str):
     track_call("control_streaming_service", service, action)
     return f"{action.capitalize()} on {service}."
 
+
+@tool
+def check_device_status(device: str):
+    """This function tells the last known state of a device, e.g. whether the doors are locked or the AC is on.
+    Takes in the device (e.g. 'doors', 'AC', 'thermostat', 'dishwasher')."""
+    track_call("check_device_status", device)
+    known = [devices.describe(d) for d in devices.devices_in(device)]
+    if not known or None in known:
+        return f"The state of the {device} is not known."
+    return " ".join(known)
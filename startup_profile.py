@@ -0,0 +1,105 @@
+"""
+Cold-start profile of the assistant.
+
+Starts a fresh interpreter with -X importtime, imports a module (app by
+default) and optionally runs one query, then reports the import time of each
+package and the slowest modules, the time to the query's result, and which
+heavy dependencies ended up loaded. The query runs for real (tools, browser
+and LLM included), so pick one whose side effects you are fine with:
+
+    python startup_profile.py
+    python startup_profile.py --query "Turn on the lights." --top 15
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+# Dependencies worth keeping off the cold path of simple commands
+HEAVY_PACKAGES = ("crewai", "crewai_tools", "litellm", "langchain_openai", "openai", "selenium", "googleapiclient", "ask_sdk_core")
+MARKER = "STARTUP_PROFILE "
+
+CHILD = """
+import contextlib, io, json, sys, time
+start = time.perf_counter()
+import {module} as target
+imported = time.perf_counter()
+query = {query!r}
+if query:
+    with contextlib.redirect_stdout(io.StringIO()):
+        target.execute_query(query)
+done = time.perf_counter()
+print({marker!r} + json.dumps({{
+    "import_ms": (imported - start) * 1000,
+    "query_ms": (done - imported) * 1000 if query else None,
+    "loaded": [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+def parse_importtime(stderr: str):
+    """(module, self_us, cumulative_us, depth) for each line of -X importtime output"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        modules.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return modules
+
+
+def package_totals(modules):
+    """Self time summed per top-level package, in ms"""
+    totals = defaultdict(float)
+    for name, self_us, _, _ in modules:
+        totals[name.split(".")[0]] += self_us / 1000
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def profile(module: str = "app", query: str = None):
+    script = CHILD.format(module=module, query=query, marker=MARKER, heavy=HEAVY_PACKAGES)
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script],
+        capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    result = next((json.loads(line[len(MARKER):]) for line in process.stdout.splitlines() if line.startswith(MARKER)), None)
+    if result is None:
+        raise RuntimeError(f"Profiling {module} failed:\n{process.stderr[-2000:]}")
+    result["modules"] = parse_importtime(process.stderr)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default="app", help="module to import")
+    parser.add_argument("--query", help="query to run through execute_query after the import")
+    parser.add_argument("--top", type=int, default=10, help="rows per table")
+    parser.add_argument("--json", help="write the full profile to this file")
+    args = parser.parse_args()
+
+    result = profile(args.module, args.query)
+    print(f"import {args.module}: {result['import_ms']:.0f} ms")
+    if result["query_ms"] is not None:
+        print(f"query {args.query!r}: {result['query_ms']:.0f} ms after import")
+    print(f"heavy packages loaded: {', '.join(result['loaded']) or 'none'}")
+
+    print(f"\n{'package':<32}{'ms':>10}")
+    for name, ms in package_totals(result["modules"])[:args.top]:
+        print(f"{name:<32}{ms:>10.1f}")
+
+    print(f"\n{'module (cumulative)':<48}{'ms':>10}")
+    slowest = sorted(result["modules"], key=lambda m: m[2], reverse=True)[:args.top]
+    for name, _, cumulative_us, depth in slowest:
+        print(f"{'  ' * min(depth, 4) + name:<48}{cumulative_us / 1000:>10.1f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
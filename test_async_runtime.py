@@ -0,0 +1,56 @@
+import asyncio
+import contextvars
+import threading
+import time
+import unittest
+from async_runtime import call_in, executor, run_blocking
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+class TestRunBlocking(unittest.TestCase):
+    def test_blocking_calls_overlap_without_blocking_the_loop(self):
+        async def main():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            tick_task = asyncio.ensure_future(ticker())
+            start = time.perf_counter()
+            await asyncio.gather(*(run_blocking(time.sleep, 0.2) for _ in range(4)))
+            elapsed = time.perf_counter() - start
+            tick_task.cancel()
+            return elapsed, ticks
+
+        elapsed, ticks = asyncio.run(main())
+        self.assertLess(elapsed, 0.5)
+        self.assertGreater(ticks, 5)
+
+    def test_single_thread_pool_serializes_calls(self):
+        async def main():
+            return await asyncio.gather(*(run_blocking(threading.get_ident, pool="browser") for _ in range(5)))
+
+        self.assertEqual(len(set(asyncio.run(main()))), 1)
+
+    def test_call_in_runs_on_the_pool_and_inline_when_nested(self):
+        browser_thread = executor("browser").submit(threading.get_ident).result()
+
+        def nested():
+            return threading.get_ident(), call_in("browser", threading.get_ident)
+
+        self.assertEqual(call_in("browser", nested), (browser_thread, browser_thread))
+        request_id.set("r2")
+        self.assertEqual(call_in("browser", request_id.get), "r2")
+
+    def test_context_variables_are_visible(self):
+        async def main():
+            request_id.set("r1")
+            return await run_blocking(request_id.get)
+
+        self.assertEqual(asyncio.run(main()), "r1")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import threading
+import unittest
+import speech_recognition as sr
+from audio_listener import BackgroundListener
+
+class TestBackgroundListener(unittest.TestCase):
+    def make_listener(self, backend, buffer_size=8):
+        listener = BackgroundListener(backend=backend, buffer_size=buffer_size)
+        listener._running.set()
+        return listener
+
+    def test_utterances_become_transcripts_in_order(self):
+        def backend(recognizer, audio):
+            if audio == "noise":
+                raise sr.UnknownValueError()
+            if audio == "garbled":
+                raise ValueError("could not decode audio")
+            return audio
+
+        listener = self.make_listener(backend)
+        for audio in ["are you hungry", "noise", "garbled", "do you want water"]:
+            listener._on_utterance(listener.recognizer, audio)
+        worker = threading.Thread(target=listener._transcribe_loop, daemon=True)
+        worker.start()
+
+        self.assertEqual(listener.next_transcript(timeout=1), "are you hungry")
+        self.assertEqual(listener.next_transcript(timeout=1), "do you want water")
+        listener.stop()
+        worker.join(timeout=1)
+        self.assertFalse(worker.is_alive())
+
+    def test_ring_buffer_drops_oldest_utterance(self):
+        listener = self.make_listener(lambda recognizer, audio: audio, buffer_size=2)
+        for audio in ["one", "two", "three"]:
+            listener._on_utterance(listener.recognizer, audio)
+        self.assertEqual(list(listener._utterances), ["two", "three"])
+
+if __name__ == "__main__":
+    unittest.main()
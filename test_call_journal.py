@@ -0,0 +1,59 @@
+import contextvars
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from call_journal import CallJournal, read_log
+
+class TestCallJournal(unittest.TestCase):
+    def test_concurrent_requests_keep_their_own_calls(self):
+        journal = CallJournal()
+
+        def query(n):
+            with journal.request(f"request-{n}"):
+                # Plan steps run on worker threads in a copy of the query's context
+                with ThreadPoolExecutor(max_workers=2) as steps:
+                    for step in range(3):
+                        steps.submit(contextvars.copy_context().run, journal.record, "set_thermostat", (str(n), step))
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(query, range(20)))
+
+        for n in range(20):
+            calls = journal.calls_for(f"request-{n}")
+            self.assertEqual(sorted(calls), [("set_thermostat", (str(n), step)) for step in range(3)])
+        self.assertEqual(len(journal.default), 0)
+
+    def test_calls_outside_a_request_go_to_the_default_buffer(self):
+        journal = CallJournal()
+        journal.record("turn_on_ac", ())
+        with journal.request("r1"):
+            journal.record("turn_on_lights", ())
+        self.assertEqual(list(journal.default), [("turn_on_ac", ())])
+        self.assertEqual(journal.calls_for("r1"), [("turn_on_lights", ())])
+
+    def test_buffers_and_requests_are_bounded(self):
+        journal = CallJournal(size=3, max_requests=2)
+        for n in range(3):
+            with journal.request(f"r{n}") as request:
+                for i in range(5):
+                    journal.record("set_thermostat", (str(i),))
+        self.assertIsNone(journal.calls_for("r0"))
+        self.assertEqual(journal.calls_for("r2"), [("set_thermostat", (str(i),)) for i in (2, 3, 4)])
+        self.assertEqual(request.count, 5)
+
+    def test_calls_are_appended_to_the_log(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "calls.jsonl")
+            journal = CallJournal(log_path=path)
+            with journal.request("r1", session_id="s1"):
+                journal.record("manage_locks", ("lock",))
+            journal.record("turn_on_ac", ())
+            journal.close()
+
+            entries = read_log(path, request_id="r1")
+            self.assertEqual([(e["tool"], e["args"], e["session_id"]) for e in entries], [("manage_locks", ["lock"], "s1")])
+            self.assertEqual(len(read_log(path)), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from contact_directory import ContactDirectory, DEFAULT_CONTACTS
+from outbox import Outbox
+
+CONTACTS = {
+    "mom": {"email": "mom@example.com", "aliases": ["mother", "mum"]},
+    "sister": "sister@example.com",
+    "boss": "boss@example.com",
+    "brother": "brother@example.com",
+    "family": {"members": ["mom", "sister", "brother"], "aliases": ["relatives"]},
+}
+
+class TestContactDirectory(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".json")
+        os.close(handle)
+        self.write(CONTACTS)
+        self.directory = ContactDirectory(self.path, check_interval=0)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def write(self, contacts, mtime=None):
+        with open(self.path, "w") as f:
+            json.dump(contacts, f)
+        if mtime is not None:
+            os.utime(self.path, (mtime, mtime))
+
+    def test_names_and_aliases_resolve(self):
+        self.assertEqual(self.directory.resolve("Mom"), "mom")
+        self.assertEqual(self.directory.resolve("mother"), "mom")
+        self.assertEqual(self.directory.email("my mum"), "mom@example.com")
+        self.assertIsNone(self.directory.resolve("landlord"))
+
+    def test_unique_prefixes_and_misspellings_resolve(self):
+        self.assertEqual(self.directory.resolve("sis"), "sister")
+        self.assertEqual(self.directory.resolve("sistr"), "sister")
+        self.assertIsNone(self.directory.resolve("b"))
+        # Short guesses and groups are not resolved, since mail is sent on the result
+        self.assertIsNone(self.directory.resolve("s"))
+        self.assertIsNone(self.directory.resolve("si"))
+        self.assertIsNone(self.directory.resolve("fam"))
+        self.assertIsNone(self.directory.resolve("relativs"))
+        self.assertEqual(self.directory.resolve("relatives"), "family")
+        self.assertEqual(self.directory.complete("s"), ["sister"])
+        self.assertEqual(self.directory.complete("b"), ["boss", "brother"])
+        self.assertEqual(self.directory.complete("mu"), ["mom"])
+
+    def test_file_is_reloaded_only_when_it_changes(self):
+        index = self.directory._index
+        self.directory.resolve("mom")
+        self.assertIs(self.directory._index, index)
+        self.write({"dad": "dad@example.com"}, mtime=os.path.getmtime(self.path) + 10)
+        self.assertEqual(self.directory.names(), ["dad"])
+        self.assertNotIn("mom", self.directory)
+
+    def test_unreadable_file_keeps_the_last_contacts(self):
+        with open(self.path, "w") as f:
+            f.write("{not json")
+        os.utime(self.path, (os.path.getmtime(self.path) + 10,) * 2)
+        self.assertEqual(self.directory.email("sister"), "sister@example.com")
+        self.assertEqual(ContactDirectory(self.path + ".missing").as_dict(), DEFAULT_CONTACTS)
+
+    def test_copy_applies_overrides_and_keeps_aliases(self):
+        session = self.directory.copy({"mom": "other@example.com", "Friend": "friend@example.com"})
+        self.assertEqual(session.get("mother"), "other@example.com")
+        self.assertEqual(session.get("friend"), "friend@example.com")
+        self.assertEqual(self.directory.get("mom"), "mom@example.com")
+
+    def test_lists_and_groups_expand_to_contacts(self):
+        self.assertEqual(self.directory.expand("mum, boss and my sister"), (["mom", "boss", "sister"], []))
+        self.assertEqual(self.directory.expand("relatives & mom"), (["mom", "sister", "brother"], []))
+        self.assertEqual(self.directory.expand("boss and landlord"), (["boss"], ["landlord"]))
+        self.assertEqual(self.directory.email("family"), None)
+        self.assertEqual(
+            self.directory.addresses("boss, x@example.com"), (["boss@example.com", "x@example.com"], [])
+        )
+
+class TestMultiRecipientMail(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        import app
+        cls.app = app
+
+    def test_recipient_list_is_split_from_the_message(self):
+        split = self.app.split_recipients
+        self.assertEqual(split("friend hello there"), ("friend", "hello there"))
+        self.assertEqual(split("mom, dad and my sister I'm fine"), ("mom, dad and my sister", "I'm fine"))
+        self.assertEqual(split("family & boss see you"), ("family & boss", "see you"))
+        self.assertEqual(split("mom"), ("mom", ""))
+
+    def test_message_starting_after_a_separator_is_not_a_recipient(self):
+        contacts = ContactDirectory.from_dict(dict(
+            CONTACTS, dad="dad@example.com", doctor="doctor@example.com", work={"members": ["boss"]},
+        ))
+        with mock.patch.object(self.app, "current_contacts", lambda: contacts):
+            split = self.app.split_recipients
+            self.assertEqual(split("mom and I are fine"), ("mom", "and I are fine"))
+            self.assertEqual(split("dad, call me"), ("dad", "call me"))
+            self.assertEqual(split("mom and my landlord hi"), ("mom and my landlord", "hi"))
+            self.assertEqual(split("dad, do you need anything"), ("dad", "do you need anything"))
+            self.assertEqual(split("mom, work is done"), ("mom", "work is done"))
+            self.assertEqual(split("mom, sis is sick"), ("mom", "sis is sick"))
+            self.assertEqual(split("mom, boss and sister hi"), ("mom, boss and sister", "hi"))
+            self.assertEqual(self.app.parse_mail_command("mail mom and I are fine"), (False, "mom", "and I are fine", None))
+            self.assertEqual(self.app.parse_mail_command("mail dad, call me"), (False, "dad", "call me", None))
+
+    def test_all_recipients_share_one_compose(self):
+        composed = []
+        browser = SimpleNamespace(switch_to_tab=lambda name: True, compose_email=lambda *args: composed.append(args) or True)
+        contacts = ContactDirectory.from_dict(CONTACTS)
+        queue = Outbox(":memory:", autostart=False)
+        queue.register("email", self.app.deliver_email)
+        with mock.patch.object(self.app, "browser_for", lambda session: browser), \
+                mock.patch.object(self.app, "current_contacts", lambda: contacts), \
+                mock.patch.object(self.app, "outbox", queue):
+            result = self.app.send_friend_email.func("family and boss", "I'm fine")
+            self.assertEqual(result, "Email to mom, sister, brother and boss queued, it will be sent shortly (outbox message 1)")
+            self.assertEqual(queue.deliver_due(), 1)
+        self.assertEqual(composed, [(
+            ["mom@example.com", "sister@example.com", "brother@example.com", "boss@example.com"],
+            "Message to Mom, Sister, Brother and Boss", "I'm fine",
+        )])
+        self.assertEqual(queue.get(1).status, "sent")
+
+    def test_queued_email_can_be_cancelled(self):
+        contacts = ContactDirectory.from_dict(CONTACTS)
+        queue = Outbox(":memory:", autostart=False)
+        with mock.patch.object(self.app, "current_contacts", lambda: contacts), \
+                mock.patch.object(self.app, "outbox", queue):
+            self.app.send_friend_email.func("mother", "I'm fine")
+            self.assertEqual(self.app.cancel_sent_message.func("mom"), "Cancelled the email to mom.")
+            self.assertEqual(self.app.cancel_sent_message.func("mom"), "No email or draft to mom is waiting to go out.")
+
+    def test_drafts_use_the_session_contacts(self):
+        import computerAgent
+        from sessions import Session
+        queue = Outbox(":memory:", autostart=False)
+
+        async def draft():
+            session = Session(ContactDirectory.from_dict(CONTACTS).copy({"mom": "other@example.com"}))
+            token = session.activate()
+            try:
+                return computerAgent.gmail_create_draft.func("hi", "mom", "Hello")
+            finally:
+                Session.deactivate(token)
+
+        with mock.patch.object(computerAgent, "outbox", queue):
+            self.assertEqual(asyncio.run(draft()), "Draft to other@example.com queued (outbox message 1)")
+
+if __name__ == '__main__':
+    unittest.main()
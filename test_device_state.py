@@ -0,0 +1,144 @@
+import asyncio
+import contextvars
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from device_state import DeviceStore, SimulatedBackend, appliance
+
+class TestDeviceStore(unittest.TestCase):
+    def setUp(self):
+        self.backend = SimulatedBackend()
+        self.store = DeviceStore(self.backend, ttl=60)
+
+    def test_commands_that_change_nothing_are_not_sent(self):
+        self.assertTrue(self.store.command("ac", "on"))
+        self.assertFalse(self.store.command("ac", "On"))
+        self.assertTrue(self.store.command("ac", "off"))
+        self.assertEqual(self.backend.commands, [("ac", "on"), ("ac", "off")])
+        self.store.ttl = 0
+        self.assertTrue(self.store.command("ac", "off"))
+
+    def test_batch_sends_only_the_last_command_per_device(self):
+        self.store.command("ac", "off")
+        with self.store.batch():
+            self.store.command("ac", "on")
+            self.store.command("locks", "locked")
+            self.store.command("ac", "off")
+            self.assertEqual(self.backend.commands, [("ac", "off")])
+        self.assertEqual(self.backend.commands, [("ac", "off"), ("locks", "locked")])
+        self.assertEqual(self.store.stats, {"issued": 4, "sent": 2, "skipped": 1, "failed": 0})
+
+    def test_failed_command_does_not_stop_the_batch(self):
+        send = self.backend.send
+
+        def flaky_send(device, value):
+            if device == "ac":
+                raise ConnectionError("hub offline")
+            send(device, value)
+        self.backend.send = flaky_send
+
+        @self.store.coalesce
+        def query():
+            self.store.command("ac", "on")
+            self.store.command("locks", "locked")
+            return "AC turned on. Doors lock."
+        self.assertEqual(query(), "AC turned on. Doors lock.\nSome device commands failed: ac on (hub offline)")
+        self.assertEqual(self.backend.commands, [("locks", "locked")])
+        self.assertIsNone(self.store.get("ac"))
+        self.assertEqual(self.store.stats["failed"], 1)
+
+    def test_actions_are_always_sent_in_order(self):
+        tv = "entertainment:tv"
+        self.store.action(tv, "volume up")
+        self.store.action(tv, "Volume up")
+        self.assertIsNone(self.store.get(tv))
+        with self.store.batch():
+            self.assertTrue(self.store.command(tv, "on"))
+            self.store.action(tv, "next")
+            self.store.action(tv, "next")
+            self.assertTrue(self.store.command(tv, "off"))
+            self.assertTrue(self.store.command(tv, "on"))
+        self.assertEqual(self.backend.commands, [
+            (tv, "volume up"), (tv, "volume up"), (tv, "on"), (tv, "next"), (tv, "next"),
+        ])
+        self.assertEqual(self.store.get(tv).value, "on")
+
+    def test_batch_is_shared_with_worker_threads_and_async_calls(self):
+        @self.store.coalesce
+        def plan():
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                for value in ("on", "off"):
+                    pool.submit(contextvars.copy_context().run, self.store.command, "lights", value).result()
+            return list(self.backend.commands)
+
+        self.assertEqual(plan(), [])
+        self.assertEqual(self.backend.commands, [("lights", "off")])
+
+        @self.store.coalesce
+        async def aplan():
+            self.store.command("thermostat", "70")
+            self.store.command("thermostat", "72")
+        asyncio.run(aplan())
+        self.assertEqual(self.backend.commands[-1:], [("thermostat", "72")])
+
+    def test_status_questions_are_answered_from_fresh_state(self):
+        self.assertIsNone(self.store.answer("Are the doors locked?"))
+        self.store.command("locks", "locked")
+        self.store.command(appliance("dishwasher"), "running")
+        self.assertRegex(self.store.answer("Are the doors locked?"), r"^The doors are locked \(as of .*\)\.$")
+        self.assertIn("The dishwasher is running", self.store.answer("is the dishwasher running"))
+        self.assertIsNone(self.store.answer("Lock the doors"))
+        self.assertIsNone(self.store.answer("Are the doors locked and the AC on?"))
+
+    def test_reconcile_takes_the_backend_state(self):
+        self.store.command("ac", "on")
+        self.backend.states["ac"] = "off"
+        self.store.states["ac"].updated = time.time() - 120
+        self.assertEqual(self.store.answer("Is the AC on?")[:17], "The AC is off (as")
+        self.assertEqual(self.store.get("ac").source, "backend")
+        self.assertTrue(self.store.command("ac", "on"))
+
+class TestStatusFastPath(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        import app
+        import smartHomeAgent
+        cls.app = app
+        cls.tools = smartHomeAgent
+
+    def setUp(self):
+        self.backend = SimulatedBackend()
+        self.store = DeviceStore(self.backend, ttl=60)
+        for module in (self.app, self.tools):
+            patcher = mock.patch.object(module, "devices", self.store)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.store.command("ac", "off")
+        self.store.command("thermostat", "70")
+
+    def test_status_question_is_answered_from_the_store(self):
+        self.assertRegex(self.app.run_fast_path("Is the AC on?"), r"^The AC is off \(as of")
+        self.assertRegex(asyncio.run(self.app.arun_fast_path("Is the AC on?")), r"^The AC is off \(as of")
+
+    def test_question_with_a_command_is_left_to_the_agents(self):
+        # Neither answered from the store nor run as a single command on the fast path
+        for query in ["Is it hot in here? Turn on the AC", "Is the AC on? If not, turn it on"]:
+            with self.subTest(query=query):
+                self.assertIsNone(self.app.run_fast_path(query))
+                self.assertIsNone(asyncio.run(self.app.arun_fast_path(query)))
+        self.assertEqual(self.app.run_fast_path("Turn on the AC"), "AC turned on.")
+
+    def test_async_fast_path_runs_the_same_command(self):
+        self.assertEqual(asyncio.run(self.app.arun_fast_path("Turn on the AC")), "AC turned on.")
+        self.assertEqual(self.backend.commands[-1], ("ac", "on"))
+
+    def test_question_resembling_a_command_is_answered_from_the_store(self):
+        self.assertRegex(self.app.run_fast_path("Is the thermostat set to 70?"), r"^The thermostat is set to 70 degrees")
+        self.assertEqual(self.backend.commands, [("ac", "off"), ("thermostat", "70")])
+
+    def test_outside_temperature_is_not_the_thermostat(self):
+        self.assertIsNone(self.app.run_fast_path("What temperature is it outside?"))
+
+if __name__ == '__main__':
+    unittest.main()
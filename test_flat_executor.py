@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import unittest
+from types import SimpleNamespace
+from flat_executor import ESCALATE_TOOL, FlatExecutor
+from lazy_tools import tool
+
+calls = []
+barrier = threading.Barrier(2, timeout=5)
+
+@tool
+def set_thermostat(temperature: str):
+    """Sets the thermostat"""
+    calls.append(("set_thermostat", temperature))
+    return f"Thermostat set to {temperature} degrees."
+
+@tool
+def turn_on_ac():
+    """Turns on the AC"""
+    calls.append(("turn_on_ac",))
+    return "AC turned on."
+
+@tool
+def lock_doors(door: str, code: str = None):
+    """Locks a door, waiting until another call runs at the same time"""
+    barrier.wait()
+    return f"{door} locked"
+
+@tool
+def schedule_meeting(title: str, time: str, attendees: list):
+    """Schedules a meeting"""
+    return f"Scheduled '{title}' at {time} for attendees: {', '.join(attendees)}."
+
+class FakeModel:
+    """Tool-calling model that replies with the given tool calls"""
+    def __init__(self, tool_calls, content=""):
+        self.reply = SimpleNamespace(content=content, tool_calls=[
+            {"name": name, "args": args, "id": f"call_{i}"} for i, (name, args) in enumerate(tool_calls)
+        ])
+        self.tools = None
+
+    def bind_tools(self, tools, **kwargs):
+        self.tools = tools
+        return self
+
+    def invoke(self, messages, **kwargs):
+        return self.reply
+
+    async def ainvoke(self, messages, **kwargs):
+        return self.reply
+
+class TestFlatExecutor(unittest.TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def executor(self, model):
+        return FlatExecutor(lambda: model, [set_thermostat, turn_on_ac, lock_doors, schedule_meeting], fallback=lambda q: f"agents: {q}")
+
+    def test_all_tool_calls_of_one_reply_are_executed(self):
+        model = FakeModel([("turn_on_ac", {}), ("set_thermostat", {"temperature": "72"})])
+        result = self.executor(model).run("Turn on the AC and set the thermostat to 72")
+        self.assertEqual(result, "AC turned on.\nThermostat set to 72 degrees.")
+        self.assertEqual(sorted(calls), [("set_thermostat", "72"), ("turn_on_ac",)])
+        self.assertIn(ESCALATE_TOOL, [schema["function"]["name"] for schema in model.tools])
+
+    def test_parallel_tool_calls_run_concurrently(self):
+        model = FakeModel([("lock_doors", {"door": "front"}), ("lock_doors", {"door": "back"})])
+        self.assertEqual(self.executor(model).run("Lock the doors"), "front locked\nback locked")
+        self.assertEqual(asyncio.run(self.executor(model).arun("Lock the doors")), "front locked\nback locked")
+
+    def test_multi_turn_requests_fall_back_to_the_agents(self):
+        model = FakeModel([(ESCALATE_TOOL, {"reason": "needs confirmation"})])
+        self.assertEqual(self.executor(model).run("Send my draft after I check it"), "agents: Send my draft after I check it")
+        self.assertEqual(self.executor(FakeModel([("order_pizza", {})])).run("Order pizza"), "agents: Order pizza")
+        self.assertEqual(calls, [])
+
+    def test_reply_without_tool_calls_is_returned(self):
+        self.assertEqual(self.executor(FakeModel([], content="Nothing to do.")).run("Thanks!"), "Nothing to do.")
+
+    def test_schema_comes_from_the_function_signature(self):
+        function = lock_doors.schema()["function"]
+        self.assertEqual(function["name"], "lock_doors")
+        self.assertEqual(function["parameters"]["required"], ["door"])
+        self.assertEqual(set(function["parameters"]["properties"]), {"door", "code"})
+        self.assertFalse(lock_doors.loaded)
+
+    def test_list_parameters_are_arrays_and_string_lists_are_split(self):
+        properties = schedule_meeting.schema()["function"]["parameters"]["properties"]
+        self.assertEqual(properties["attendees"], {"type": "array", "items": {"type": "string"}})
+        expected = "Scheduled 'Sync' at 3pm for attendees: mom, dad."
+        for attendees in (["mom", "dad"], "mom, dad", '["mom", "dad"]'):
+            with self.subTest(attendees=attendees):
+                model = FakeModel([("schedule_meeting", {"title": "Sync", "time": "3pm", "attendees": attendees})])
+                self.assertEqual(self.executor(model).run("Schedule a sync at 3pm with mom and dad"), expected)
+        model = FakeModel([("schedule_meeting", {"title": "Sync", "time": "3pm", "attendees": ["mom"], "room": "A"})])
+        self.assertTrue(self.executor(model).run("Schedule a sync").startswith("Error: Unexpected argument"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import base64
+import email
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from google.oauth2.credentials import Credentials
+from gmail_session import GmailSession
+
+class GmailStandIn(BaseHTTPRequestHandler):
+    drafts = []
+    refreshes = 0
+    batches = 0
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        content_type = "application/json"
+        if self.path.startswith("/token"):
+            GmailStandIn.refreshes += 1
+            data = json.dumps({"access_token": f"access-{GmailStandIn.refreshes}", "expires_in": 3600, "token_type": "Bearer"}).encode()
+        elif self.path.startswith("/batch"):
+            GmailStandIn.batches += 1
+            content_type, data = self.batch_reply(body)
+        else:
+            data = json.dumps(self.add_draft(self.path, self.headers.get("Authorization"), body)).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    @staticmethod
+    def add_draft(path, auth, body):
+        GmailStandIn.drafts.append((path, auth, json.loads(body)))
+        return {"id": f"d{len(GmailStandIn.drafts)}", "message": {"id": "m1"}}
+
+    def batch_reply(self, body):
+        """Answer each part of a multipart/mixed batch as if it had been posted alone"""
+        batch = email.message_from_bytes(f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body)
+        parts = []
+        for part in batch.get_payload():
+            request_line, rest = part.get_payload().split("\n", 1)
+            headers, inner = rest.split("\n\n", 1)
+            auth = next((line.split(": ", 1)[1] for line in headers.splitlines() if line.lower().startswith("authorization")), None)
+            reply = json.dumps(self.add_draft(request_line.split()[1], auth, inner))
+            content_id = part["Content-ID"].strip("<>")
+            parts.append(
+                f"--END\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n{reply}\r\n"
+            )
+        return "multipart/mixed; boundary=END", ("".join(parts) + "--END--\r\n").encode()
+
+    def log_message(self, *args):
+        pass
+
+class TestGmailSession(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(("127.0.0.1", 0), GmailStandIn)
+        cls.root = f"http://127.0.0.1:{cls.server.server_port}/"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        GmailStandIn.drafts = []
+        GmailStandIn.refreshes = 0
+        GmailStandIn.batches = 0
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def make_session(self, expires_in, refresh_margin=300):
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        creds = Credentials(
+            token="access-0", refresh_token="refresh", token_uri=self.root + "token",
+            client_id="id", client_secret="secret", expiry=now + timedelta(seconds=expires_in),
+        )
+        session = GmailSession(
+            token_path=os.path.join(self.tmp.name, "token.json"),
+            discovery_path=os.path.join(self.tmp.name, "discovery.json"),
+            api_root=self.root, refresh_margin=refresh_margin, credentials=creds,
+        )
+        self.addCleanup(session.close)
+        return session
+
+    def test_service_is_built_once_and_reused(self):
+        session = self.make_session(3600)
+        raw = base64.urlsafe_b64encode(b"To: a@b.com\n\nhi").decode()
+        self.assertEqual(session.create_draft(raw)["id"], "d1")
+        service = session.service()
+        self.assertEqual(session.create_draft(raw)["id"], "d2")
+        self.assertIs(session.service(), service)
+        path, auth, body = GmailStandIn.drafts[0]
+        self.assertEqual(path.split("?")[0], "/gmail/v1/users/me/drafts")
+        self.assertEqual(auth, "Bearer access-0")
+        self.assertEqual(body, {"message": {"raw": raw}})
+        self.assertTrue(os.path.exists(session.discovery_path))
+
+    def test_drafts_are_created_in_one_batch_request(self):
+        session = self.make_session(3600)
+        raws = [base64.urlsafe_b64encode(f"To: {name}@b.com\n\nhi".encode()).decode() for name in ("a", "b", "c")]
+        drafts = session.create_drafts(raws)
+        self.assertEqual(GmailStandIn.batches, 1)
+        self.assertEqual([d["id"] for d in drafts], ["d1", "d2", "d3"])
+        self.assertEqual([body["message"]["raw"] for _, _, body in GmailStandIn.drafts], raws)
+        self.assertEqual(GmailStandIn.drafts[0][0].split("?")[0], "/gmail/v1/users/me/drafts")
+
+    def test_expired_token_is_refreshed_on_demand(self):
+        session = self.make_session(-60)
+        session.create_draft("eA==")
+        self.assertEqual(GmailStandIn.refreshes, 1)
+        self.assertEqual(GmailStandIn.drafts[0][1], "Bearer access-1")
+        with open(session.token_path) as f:
+            self.assertEqual(json.load(f)["token"], "access-1")
+
+    def test_token_is_refreshed_in_background_before_expiry(self):
+        session = self.make_session(300.2, refresh_margin=300)
+        session.credentials()
+        deadline = time.monotonic() + 5
+        while GmailStandIn.refreshes == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(GmailStandIn.refreshes, 1)
+        self.assertEqual(session.credentials().token, "access-1")
+
+if __name__ == "__main__":
+    unittest.main()
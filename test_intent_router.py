@@ -0,0 +1,73 @@
+import unittest
+from intent_router import IntentRouter, is_command, load_test_examples
+
+class TestIntentRouter(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.router = IntentRouter.from_corpus()
+
+    def test_single_intent_commands(self):
+        test_cases = [
+            ("Turn on the lights.", "turn_on_lights", ()),
+            ("Turn off the lights", "turn_off_lights", ()),
+            ("Turn off the AC", "turn_off_ac", ()),
+            ("Close the curtains.", "adjust_curtains", ("close",)),
+            ("Start the washing machine.", "start_appliance", ("washing machine",)),
+            ("Arm the security system.", "manage_security", ("arm",)),
+            ("Unlock the doors.", "manage_locks", ("unlock",)),
+            ("Turn on the TV.", "control_entertainment_device", ("TV", "on")),
+            ("Set the thermostat to 68", "set_thermostat", ("68",)),
+            ("Search for the 'Grades' file", "search_files", ("Grades",)),
+            ("Navigate to the settings menu.", "navigate_links_or_menus", ("settings",)),
+        ]
+        for query, expected_tool, expected_args in test_cases:
+            with self.subTest(query=query):
+                match = self.router.route(query)
+                self.assertIsNotNone(match)
+                self.assertEqual((match.tool, match.args), (expected_tool, expected_args))
+
+    def test_ambiguous_queries_fall_back(self):
+        for query in [
+            "Lock the doors and turn off the AC",
+            "Turn on the AC, then set the thermostat to 72",
+            "Call family member",
+            "Play my favorite song",
+            "stop the music",
+            "send message to dad",
+            "",
+        ]:
+            with self.subTest(query=query):
+                self.assertIsNone(self.router.route(query))
+
+    def test_negations_questions_and_deferred_commands_fall_back(self):
+        for query in [
+            "Don't turn on the lights",
+            "Do not turn off the AC",
+            "Did you turn off the lights?",
+            "Is the thermostat set to 70?",
+            "Turn on the AC when I get home",
+            "Start the dishwasher in an hour",
+            "Turn off the lights at 10",
+            "Stop the car",
+            "turn on the lights?",
+        ]:
+            with self.subTest(query=query):
+                self.assertIsNone(self.router.route(query))
+
+    def test_polite_and_reordered_commands(self):
+        self.assertEqual(self.router.route("Please turn the lights off.").tool, "turn_off_lights")
+        self.assertEqual(self.router.route("Stop the dryer").args, ("dryer",))
+
+    def test_commands_inside_questions(self):
+        self.assertTrue(is_command("Is it hot in here? Turn on the AC"))
+        self.assertTrue(is_command("Is the AC on? If not, please turn it on"))
+        self.assertFalse(is_command("Are the doors locked and the AC on?"))
+        self.assertFalse(is_command("Are the curtains open?"))
+
+    def test_loads_test_py_cases(self):
+        examples = dict(load_test_examples())
+        self.assertEqual(examples["Turn on the lights."], "turn_on_lights")
+        self.assertIsNone(examples["Lock the doors and turn off the AC"])
+
+if __name__ == "__main__":
+    unittest.main()
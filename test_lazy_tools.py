@@ -0,0 +1,57 @@
+import unittest
+from lazy_tools import LazyTool, agent_tools, langchain_tool, tool
+from startup_profile import profile
+
+@tool
+def dim_lights(level: str):
+    """Dims the lights to a level"""
+    return f"Lights at {level}"
+
+@langchain_tool
+def open_app(name: str, fullscreen: str = None):
+    """Opens an app"""
+    return f"Opened {name}"
+
+class TestLazyTools(unittest.TestCase):
+    def test_tool_runs_without_building_the_real_tool(self):
+        with self.assertRaises(ValueError):
+            LazyTool("undocumented", lambda: None)
+        def greet_someone(name):
+            """Greets someone"""
+            return f"hi {name}"
+
+        greet = LazyTool("greet", greet_someone)
+        self.assertEqual(greet.run("Ann"), "hi Ann")
+        self.assertEqual(greet.func(name="Bo"), "hi Bo")
+        self.assertFalse(greet.loaded)
+
+    def test_patched_func_is_shared_with_the_real_tool(self):
+        calls = []
+        original = dim_lights.func
+
+        def patched(level):
+            calls.append(level)
+            return original(level)
+
+        dim_lights.func = patched
+        self.addCleanup(setattr, dim_lights, "func", original)
+        real = agent_tools([dim_lights])[0]
+        self.assertEqual(real.name, "dim_lights")
+        self.assertEqual(real.run(level="10%"), "Lights at 10%")
+        # Patches made on either side after the real tool exists apply to both
+        real.func = original
+        self.assertIs(dim_lights.func, original)
+        self.assertEqual(calls, ["10%"])
+
+    def test_langchain_tool_keeps_optional_arguments(self):
+        real = open_app.tool
+        self.assertEqual(real.invoke({"name": "mail"}), "Opened mail")
+        self.assertIs(agent_tools([real])[0], real)
+
+    def test_fast_path_query_does_not_load_agent_dependencies(self):
+        result = profile("app", "Turn on the lights.")
+        self.assertEqual(result["loaded"], [])
+        self.assertTrue(any(name == "smartHomeAgent" for name, *_ in result["modules"]))
+
+if __name__ == '__main__':
+    unittest.main()
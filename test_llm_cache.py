@@ -0,0 +1,72 @@
+import asyncio
+import threading
+import time
+import unittest
+from llm_cache import LLMCache, make_key
+
+class TestLLMCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = LLMCache(path=":memory:", max_entries=2, ttl=60)
+
+    def test_normalized_prompts_share_a_key(self):
+        a = make_key("help mail  mom\n need water", "gpt-4o-mini", 0.7)
+        b = make_key("help mail mom need water", "gpt-4o-mini", 0.7)
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, make_key("help mail mom need water", "gpt-4o-mini", 0.1))
+        self.assertNotEqual(a, make_key("Help mail Mom need water", "gpt-4o-mini", 0.7))
+
+    def test_hit_after_compute(self):
+        calls = []
+        compute = lambda: calls.append(1) or "hello"
+        self.assertEqual(self.cache.get_or_compute("k", compute), "hello")
+        self.assertEqual(self.cache.get_or_compute("k", compute), "hello")
+        self.assertEqual(len(calls), 1)
+
+    def test_lru_eviction_on_disk(self):
+        for key in ["a", "b", "c"]:
+            self.cache.put(key, key)
+        self.cache._memory.clear()
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.get("c"), "c")
+
+    def test_ttl_expiry(self):
+        self.cache.ttl = 0.01
+        self.cache.put("k", "v")
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get("k"))
+
+    def test_single_flight(self):
+        calls = []
+        def slow_compute():
+            calls.append(1)
+            time.sleep(0.1)
+            return "done"
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.cache.get_or_compute("k", slow_compute)))
+            for _ in range(5)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, ["done"] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_async_single_flight(self):
+        calls = []
+        async def slow_compute():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return "done"
+
+        async def main():
+            return await asyncio.gather(*(self.cache.aget_or_compute("k", slow_compute) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(main()), ["done"] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.cache.get_or_compute("k", lambda: "again"), "done")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+import httpx
+import openai
+from langchain_openai import ChatOpenAI
+from llm_cassette import AsyncCassetteTransport, Cassette, CassetteMissError, CassetteTransport, request_key
+
+def completion(content):
+    return {
+        "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "gpt-4o-mini",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+    }
+
+class FakeAPI:
+    def __init__(self):
+        self.requests = 0
+
+    def __call__(self, request):
+        self.requests += 1
+        prompt = json.loads(request.content)["messages"][-1]["content"]
+        return httpx.Response(200, json=completion(f"answer {self.requests} to {prompt}"))
+
+def offline(request):
+    raise AssertionError("network access during replay")
+
+class TestLLMCassette(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "cassette.json")
+
+    def llm(self, mode, inner):
+        transport = CassetteTransport(Cassette(self.path), mode=mode, inner=httpx.MockTransport(inner))
+        return ChatOpenAI(model="gpt-4o-mini", openai_api_key="sk-test", max_retries=0, http_client=httpx.Client(transport=transport))
+
+    def test_recorded_responses_replay_without_network(self):
+        api = FakeAPI()
+        recorder = self.llm("record", api)
+        first = recorder.invoke("Is it  raining?").content
+        second = recorder.invoke("Is it raining?").content
+        self.assertEqual(api.requests, 2)
+
+        player = self.llm("strict", offline)
+        # Whitespace differences map to the same recording; repeats replay in order
+        self.assertEqual(player.invoke("Is it raining?").content, first)
+        self.assertEqual(player.invoke("Is   it raining?").content, second)
+
+    def test_strict_mode_fails_on_miss_and_replay_mode_records_it(self):
+        self.llm("record", FakeAPI()).invoke("hello")
+        # The OpenAI client wraps transport errors; the miss is the cause
+        with self.assertRaises(openai.APIConnectionError) as raised:
+            self.llm("strict", offline).invoke("something new")
+        self.assertIsInstance(raised.exception.__cause__, CassetteMissError)
+
+        api = FakeAPI()
+        self.llm("replay", api).invoke("something new")
+        self.assertEqual(api.requests, 1)
+        self.assertEqual(self.llm("strict", offline).invoke("something new").content, "answer 1 to something new")
+
+    def test_key_covers_tool_schemas(self):
+        body = {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": "hi"}]}
+        with_tools = dict(body, tools=[{"type": "function", "function": {"name": "turn_on_ac"}}])
+        self.assertNotEqual(
+            request_key("POST", "/v1/chat/completions", json.dumps(body).encode()),
+            request_key("POST", "/v1/chat/completions", json.dumps(with_tools).encode()),
+        )
+
+    def test_async_transport_replays_recording(self):
+        recorder = self.llm("record", FakeAPI())
+        expected = recorder.invoke("ping").content
+
+        async def replay():
+            transport = AsyncCassetteTransport(Cassette(self.path), mode="strict", inner=httpx.MockTransport(offline))
+            llm = ChatOpenAI(model="gpt-4o-mini", openai_api_key="sk-test", http_async_client=httpx.AsyncClient(transport=transport))
+            return (await llm.ainvoke("ping")).content
+
+        self.assertEqual(asyncio.run(replay()), expected)
+
+if __name__ == "__main__":
+    unittest.main()
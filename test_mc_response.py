@@ -0,0 +1,130 @@
+import json
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+import mc_response
+from mc_response import ChoiceStreamParser, QuestionValidationResult, SpeculativeChoices, answer_next_question, same_question, stream_ai_choices
+
+COMPLETION = json.dumps({"choices": [
+    {"text": "Yes, please"},
+    {"text": "No {thanks}, \"really\""},
+    {"text": "Maybe later"},
+    {"text": "Ask me again"},
+]})
+
+class FakeStream:
+    def __init__(self, content, size):
+        self.chunks = [content[i:i + size] for i in range(0, len(content), size)]
+        self.sent = 0
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.sent += 1
+            yield SimpleNamespace(content=chunk)
+
+    def close(self):
+        self.closed = True
+
+class FakeLLM:
+    model_name = "fake"
+    temperature = 0.7
+    max_tokens = 150
+
+    def __init__(self, content, size=3):
+        self.content = content
+        self.size = size
+        self.streams = []
+
+    def stream(self, input, **kwargs):
+        stream = FakeStream(self.content, self.size)
+        self.streams.append(stream)
+        return stream
+
+class TestChoiceStreaming(unittest.TestCase):
+    def test_parser_emits_each_choice_once_complete(self):
+        parser = ChoiceStreamParser()
+        emitted = []
+        for i in range(0, len(COMPLETION), 5):
+            emitted.extend(choice["text"] for choice in parser.feed(COMPLETION[i:i + 5]))
+        self.assertEqual(emitted, ["Yes, please", "No {thanks}, \"really\"", "Maybe later", "Ask me again"])
+
+    def test_first_choice_arrives_before_completion_ends(self):
+        llm = FakeLLM(COMPLETION)
+        first = next(stream_ai_choices(llm, "Do you want water?"))
+        self.assertEqual(first.text, "Yes, please")
+        self.assertLess(llm.streams[0].sent, len(llm.streams[0].chunks))
+
+    def test_cancel_stops_generation(self):
+        llm = FakeLLM(COMPLETION)
+        cancel = threading.Event()
+        choices = []
+        for choice in stream_ai_choices(llm, "Are you cold?", cancel):
+            choices.append(choice)
+            cancel.set()
+        self.assertEqual(len(choices), 1)
+        self.assertTrue(llm.streams[0].closed)
+        self.assertLess(llm.streams[0].sent, len(llm.streams[0].chunks))
+
+    def test_sampled_choices_are_not_cached(self):
+        llm = FakeLLM(COMPLETION)
+        list(stream_ai_choices(llm, "Are you hungry?"))
+        choices = list(stream_ai_choices(llm, "Are you hungry?"))
+        self.assertEqual(len(llm.streams), 2)
+        self.assertEqual([choice.id for choice in choices], [0, 1, 2, 3])
+
+class TestPipelinedResponses(unittest.TestCase):
+    def setUp(self):
+        self.llm = FakeLLM(COMPLETION)
+        for target in ["mc_response.choices_llm", "mc_response.transcribe_question", "mc_response.is_valid_question", "mc_response.respond_to_question"]:
+            patcher = mock.patch(target)
+            self.addCleanup(patcher.stop)
+            setattr(self, target.split(".")[1], patcher.start())
+        self.choices_llm.return_value = self.llm
+        self.transcribe_question.return_value = "do you want water"
+
+    def test_speculative_choices_replay_from_start(self):
+        speculative = SpeculativeChoices(self.llm, "Do you want water?")
+        self.assertEqual(len(list(speculative)), 4)
+        self.assertEqual([choice.text for choice in speculative][0], "Yes, please")
+
+    def test_same_question_ignores_cosmetic_changes(self):
+        self.assertTrue(same_question("do you want water", "Do you want water?"))
+        self.assertFalse(same_question("do you want water", "Do you want some water?"))
+
+    def test_generation_is_reused_when_validation_agrees(self):
+        self.is_valid_question.return_value = QuestionValidationResult(
+            is_valid=True, confidence_score=0.9, question="Do you want water?")
+        answer_next_question()
+        question, speculative = self.respond_to_question.call_args.args
+        self.assertEqual(question, "Do you want water?")
+        self.assertIsInstance(speculative, SpeculativeChoices)
+
+    def test_generation_is_discarded_when_validation_rewrites(self):
+        self.is_valid_question.return_value = QuestionValidationResult(
+            is_valid=True, confidence_score=0.9, question="Would you like some water?")
+        answer_next_question()
+        self.assertEqual(self.respond_to_question.call_args.args, ("Would you like some water?", None))
+
+    def test_invalid_question_cancels_generation(self):
+        self.is_valid_question.return_value = QuestionValidationResult(
+            is_valid=False, confidence_score=0.9, error_message="Background noise")
+        self.assertIsNone(answer_next_question())
+        self.respond_to_question.assert_not_called()
+
+class TestRespondToQuestion(unittest.TestCase):
+    def test_failed_speculative_generation_falls_back(self):
+        class BrokenLLM(FakeLLM):
+            def stream(self, input, **kwargs):
+                raise ConnectionError("connection reset")
+
+        speculative = SpeculativeChoices(BrokenLLM(COMPLETION), "Are you cold?")
+        with mock.patch("mc_response.STREAM_CHOICES", False), \
+                mock.patch("mc_response.choices_llm"), \
+                mock.patch("builtins.input", return_value="1"):
+            output = mc_response.respond_to_question("Are you cold?", speculative)
+        self.assertEqual(output.selected_choice.text, mc_response.fallback_choices()[0].text)
+
+if __name__ == "__main__":
+    unittest.main()
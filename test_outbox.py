@@ -0,0 +1,110 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from outbox import CANCELLED, FAILED, PENDING, SENT, Cancelled, Outbox, PermanentFailure
+
+class TestOutbox(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "outbox.sqlite3")
+        self.outbox = self.make_outbox()
+        self.sent = []
+
+    def make_outbox(self, **kwargs):
+        outbox = Outbox(self.path, backoff=0.01, autostart=False, **kwargs)
+        self.addCleanup(outbox.close)
+        return outbox
+
+    def deliver(self, payload, message):
+        self.sent.append(payload["text"])
+        return "ok"
+
+    def test_enqueue_returns_before_delivery(self):
+        self.outbox.register("email", self.deliver)
+        message = self.outbox.enqueue("email", {"text": "hi"}, recipients="mom")
+        self.assertEqual((message.status, self.sent), (PENDING, []))
+        self.assertEqual(self.outbox.deliver_due(), 1)
+        self.assertEqual(self.sent, ["hi"])
+        delivered = self.outbox.get(message.id)
+        self.assertEqual((delivered.status, delivered.attempts, delivered.result), (SENT, 1, "ok"))
+        self.assertIn("went out", delivered.describe())
+
+    def test_failed_delivery_is_retried_with_backoff(self):
+        failures = [RuntimeError("browser hiccup")]
+        def flaky(payload, message):
+            if failures:
+                raise failures.pop()
+            return self.deliver(payload, message)
+        self.outbox.register("email", flaky)
+        message = self.outbox.enqueue("email", {"text": "hi"}, recipients="mom")
+        self.outbox.deliver_due()
+        retrying = self.outbox.get(message.id)
+        self.assertEqual((retrying.status, retrying.attempts, retrying.last_error), (PENDING, 1, "browser hiccup"))
+        self.assertIn("retrying", retrying.describe())
+        time.sleep(0.05)
+        self.outbox.deliver_due()
+        self.assertEqual(self.outbox.get(message.id).status, SENT)
+        self.assertEqual(self.sent, ["hi"])
+
+    def test_gives_up_after_max_attempts_or_permanent_failure(self):
+        outbox = self.make_outbox(max_attempts=2)
+        def broken(payload, message):
+            raise RuntimeError("down")
+        outbox.register("email", broken)
+        message = outbox.enqueue("email", {"text": "hi"})
+        for _ in range(2):
+            outbox.deliver_due()
+            time.sleep(0.05)
+        self.assertEqual((outbox.get(message.id).status, outbox.get(message.id).attempts), (FAILED, 2))
+
+        def rejected(payload, message):
+            raise PermanentFailure("bad address") if payload["text"] == "a" else Cancelled("user cancelled")
+        outbox.register("email", rejected)
+        first, second = outbox.enqueue("email", {"text": "a"}), outbox.enqueue("email", {"text": "b"})
+        outbox.deliver_due()
+        self.assertEqual(outbox.get(first.id).status, FAILED)
+        self.assertEqual(outbox.get(second.id).status, CANCELLED)
+
+    def test_duplicates_are_not_queued_twice(self):
+        first = self.outbox.enqueue("email", {"text": "hi"}, session_id="s1")
+        self.assertEqual(self.outbox.enqueue("email", {"text": "hi"}, session_id="s1").id, first.id)
+        self.assertNotEqual(self.outbox.enqueue("email", {"text": "hi"}, session_id="s2").id, first.id)
+        self.assertTrue(self.outbox.cancel(first.id))
+        self.assertNotEqual(self.outbox.enqueue("email", {"text": "hi"}, session_id="s1").id, first.id)
+
+    def test_cancel_stops_a_message_being_sent(self):
+        stop = threading.Event()
+        started = threading.Event()
+        def slow(payload, message):
+            started.set()
+            if stop.wait(timeout=5):
+                raise Cancelled("cancelled in the undo window")
+            return "sent"
+        def canceller(message):
+            stop.set()
+            return True
+        self.outbox.register("email", slow, canceller=canceller)
+        message = self.outbox.enqueue("email", {"text": "hi"})
+        worker = threading.Thread(target=self.outbox.deliver_due)
+        worker.start()
+        started.wait(timeout=5)
+        self.assertTrue(self.outbox.cancel(message.id))
+        worker.join(timeout=5)
+        self.assertEqual(self.outbox.get(message.id).status, CANCELLED)
+        self.assertFalse(self.outbox.cancel(message.id))
+
+    def test_messages_survive_a_restart(self):
+        message = self.outbox.enqueue("email", {"text": "hi"}, recipients="mom")
+        self.outbox.close()
+        restarted = self.make_outbox()
+        restarted.register("email", self.deliver)
+        restarted.start()
+        self.assertTrue(restarted.drain(timeout=5))
+        self.assertEqual(restarted.get(message.id).status, SENT)
+        self.assertEqual([m.id for m in restarted.find(recipient="mom")], [message.id])
+
+if __name__ == '__main__':
+    unittest.main()
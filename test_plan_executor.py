@@ -0,0 +1,136 @@
+import asyncio
+import threading
+import time
+import unittest
+from plan_executor import Plan, PlanStep, aexecute_plan, execute_plan
+
+class TestPlanExecutor(unittest.TestCase):
+    def test_independent_steps_run_concurrently(self):
+        plan = Plan(steps=[
+            PlanStep(id="1", agent="smart_home", query="Lock the doors"),
+            PlanStep(id="2", agent="smart_home", query="Turn off the AC"),
+            PlanStep(id="3", agent="computer", query="Email my sister I'm going to bed"),
+        ])
+
+        def run_step(step, context):
+            time.sleep(0.2)
+            return f"done: {step.query}"
+
+        start = time.perf_counter()
+        results = execute_plan(plan, run_step)
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(list(results), ["1", "2", "3"])
+        self.assertEqual(results["2"], "done: Turn off the AC")
+        self.assertLess(elapsed, 0.5)
+
+    def test_dependencies_are_respected(self):
+        plan = Plan(steps=[
+            PlanStep(id="send", agent="computer", query="Send the draft", depends_on=["draft"]),
+            PlanStep(id="draft", agent="computer", query="Draft an email"),
+        ])
+        order = []
+
+        def run_step(step, context):
+            order.append(step.id)
+            return f"{step.id} with {sorted(context.values())}"
+
+        results = execute_plan(plan, run_step)
+        self.assertEqual(order, ["draft", "send"])
+        self.assertEqual(results["send"], "send with ['draft with []']")
+
+    def test_serial_agents_do_not_overlap(self):
+        plan = Plan(steps=[
+            PlanStep(id=str(i), agent="browser", query=f"Open tab {i}") for i in range(3)
+        ])
+        active = []
+        overlaps = []
+        lock = threading.Lock()
+
+        def run_step(step, context):
+            with lock:
+                active.append(step.id)
+                overlaps.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.remove(step.id)
+            return "ok"
+
+        execute_plan(plan, run_step, serial_agents=["browser"])
+        self.assertEqual(max(overlaps), 1)
+
+    def test_failure_skips_dependents_only(self):
+        plan = Plan(steps=[
+            PlanStep(id="1", agent="computer", query="fail"),
+            PlanStep(id="2", agent="computer", query="after fail", depends_on=["1"]),
+            PlanStep(id="3", agent="smart_home", query="independent"),
+        ])
+
+        def run_step(step, context):
+            if step.query == "fail":
+                raise RuntimeError("boom")
+            return "ok"
+
+        results = execute_plan(plan, run_step)
+        self.assertEqual(results["1"], "Error: boom")
+        self.assertTrue(results["2"].startswith("Skipped"))
+        self.assertEqual(results["3"], "ok")
+
+    def test_invalid_graphs_are_rejected(self):
+        cycle = Plan(steps=[
+            PlanStep(id="1", agent="computer", query="a", depends_on=["2"]),
+            PlanStep(id="2", agent="computer", query="b", depends_on=["1"]),
+        ])
+        with self.assertRaises(ValueError):
+            cycle.validate_graph()
+
+        unknown_agent = Plan(steps=[PlanStep(id="1", agent="robot", query="a")])
+        with self.assertRaises(ValueError):
+            unknown_agent.validate_graph(["computer"])
+
+class TestAsyncPlanExecutor(unittest.TestCase):
+    def test_independent_steps_run_concurrently_on_one_loop(self):
+        plan = Plan(steps=[
+            PlanStep(id="1", agent="smart_home", query="Lock the doors"),
+            PlanStep(id="2", agent="smart_home", query="Turn off the AC"),
+            PlanStep(id="3", agent="computer", query="Send it", depends_on=["1"]),
+        ])
+
+        async def run_step(step, context):
+            await asyncio.sleep(0.2)
+            return f"{step.query} after {sorted(context)}"
+
+        start = time.perf_counter()
+        results = asyncio.run(aexecute_plan(plan, run_step))
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(results["3"], "Send it after ['1']")
+        self.assertLess(elapsed, 0.55)
+
+    def test_serial_agents_and_failures(self):
+        plan = Plan(steps=[
+            PlanStep(id="1", agent="browser", query="fail"),
+            PlanStep(id="2", agent="browser", query="after fail", depends_on=["1"]),
+            PlanStep(id="3", agent="browser", query="independent"),
+            PlanStep(id="4", agent="browser", query="independent too"),
+        ])
+        active = []
+        overlaps = []
+
+        async def run_step(step, context):
+            active.append(step.id)
+            overlaps.append(len(active))
+            await asyncio.sleep(0.02)
+            active.remove(step.id)
+            if step.query == "fail":
+                raise RuntimeError("boom")
+            return "ok"
+
+        results = asyncio.run(aexecute_plan(plan, run_step, serial_agents=["browser"]))
+        self.assertEqual(max(overlaps), 1)
+        self.assertEqual(results["1"], "Error: boom")
+        self.assertTrue(results["2"].startswith("Skipped"))
+        self.assertEqual(results["4"], "ok")
+
+if __name__ == "__main__":
+    unittest.main()
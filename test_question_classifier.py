@@ -0,0 +1,28 @@
+import unittest
+from question_classifier import QuestionClassifier, load_labeled_transcripts
+
+class TestQuestionClassifier(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.classifier = QuestionClassifier.from_corpus()
+
+    def test_confident_on_clear_cases(self):
+        for text, expected in [
+            ("do you want some water", True),
+            ("Are you comfortable?", True),
+            ("the doctor is here to see you", True),
+            ("um uh", False),
+            ("", False),
+        ]:
+            with self.subTest(text=text):
+                is_valid, confidence = self.classifier.classify(text)
+                self.assertEqual(is_valid, expected)
+                self.assertGreaterEqual(confidence, 0.8)
+
+    def test_fits_labeled_transcripts(self):
+        examples = load_labeled_transcripts()
+        correct = sum(self.classifier.classify(text)[0] == label for text, label in examples)
+        self.assertGreaterEqual(correct / len(examples), 0.9)
+
+if __name__ == "__main__":
+    unittest.main()
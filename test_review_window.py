@@ -0,0 +1,36 @@
+import threading
+import time
+import unittest
+from browser_control import BrowserControl
+
+class TestReviewWindow(unittest.TestCase):
+    def setUp(self):
+        self.browser = BrowserControl()
+
+    def test_zero_window_sends_immediately(self):
+        self.assertTrue(self.browser.review_window(0))
+
+    def test_window_elapses_then_sends(self):
+        start = time.monotonic()
+        self.assertTrue(self.browser.review_window(0.2))
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+
+    def test_skip_review_sends_early(self):
+        threading.Timer(0.05, self.browser.skip_review).start()
+        start = time.monotonic()
+        self.assertTrue(self.browser.review_window(5))
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_cancel_send_aborts(self):
+        threading.Timer(0.05, self.browser.cancel_send).start()
+        start = time.monotonic()
+        self.assertFalse(self.browser.review_window(5))
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_cancel_send_reports_whether_an_email_is_being_composed(self):
+        self.assertFalse(self.browser.cancel_send())
+        self.browser._composing.set()
+        self.assertTrue(self.browser.cancel_send())
+
+if __name__ == "__main__":
+    unittest.main()
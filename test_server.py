@@ -0,0 +1,98 @@
+import asyncio
+import unittest
+from unittest import mock
+from aiohttp.test_utils import TestClient, TestServer
+import server
+from async_runtime import run_blocking
+from outbox import CANCELLED, Outbox
+from server import create_app
+from sessions import SessionManager, current_session
+from smartHomeAgent import track_call, tracked_calls
+
+async def fake_execute(query):
+    """Records a tool call per query and asks the user when the query says so"""
+    def tool():
+        session = current_session()
+        track_call("fake_tool", query, session.contacts.get("friend"))
+        if query.startswith("confirm"):
+            return f"answered {session.ask('Are you sure?')}"
+        return f"done {query}"
+    return await run_blocking(tool)
+
+class TestServerSessions(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        manager = SessionManager(lambda: {"friend": "friend@example.com"}, max_sessions=3)
+        self.client = TestClient(TestServer(create_app(fake_execute, manager, max_concurrent=2)))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def new_session(self, contacts=None):
+        response = await self.client.post("/sessions", json={"contacts": contacts} if contacts else None)
+        self.assertEqual(response.status, 201)
+        return (await response.json())["session_id"]
+
+    async def query(self, session_id, query):
+        response = await self.client.post(f"/sessions/{session_id}/query", json={"query": query})
+        self.assertEqual(response.status, 200)
+        return await response.json()
+
+    async def test_sessions_have_isolated_state(self):
+        tracked_calls.clear()
+        a = await self.new_session()
+        b = await self.new_session({"friend": "other@example.com"})
+        result_a, result_b = await asyncio.gather(self.query(a, "one"), self.query(b, "two"))
+        self.assertEqual(result_a["calls"], [["fake_tool", ["one", "friend@example.com"]]])
+        self.assertEqual(result_b["calls"], [["fake_tool", ["two", "other@example.com"]]])
+        self.assertEqual(list(tracked_calls), [])
+
+        calls = await (await self.client.get(f"/sessions/{a}/requests/{result_a['request_id']}/calls")).json()
+        self.assertEqual(calls["calls"], result_a["calls"])
+        # A session cannot read another session's requests
+        response = await self.client.get(f"/sessions/{b}/requests/{result_a['request_id']}/calls")
+        self.assertEqual(response.status, 404)
+
+    async def test_pending_prompt_is_answered_over_http(self):
+        session_id = await self.new_session()
+        query = asyncio.ensure_future(self.query(session_id, "confirm send"))
+        prompts = []
+        while not prompts:
+            await asyncio.sleep(0.01)
+            prompts = await (await self.client.get(f"/sessions/{session_id}/prompts")).json()
+        self.assertEqual(prompts[0]["question"], "Are you sure?")
+        response = await self.client.post(f"/sessions/{session_id}/answers", json={"prompt_id": prompts[0]["prompt_id"], "answer": "yes"})
+        self.assertEqual(response.status, 200)
+        self.assertEqual((await query)["result"], "answered yes")
+
+    async def test_websocket_queries_and_prompts(self):
+        session_id = await self.new_session()
+        ws = await self.client.ws_connect(f"/sessions/{session_id}/ws")
+        await ws.send_json({"type": "query", "query": "confirm it"})
+        prompt = await ws.receive_json(timeout=5)
+        self.assertEqual(prompt["type"], "prompt")
+        await ws.send_json({"type": "answer", "prompt_id": prompt["prompt_id"], "answer": "no"})
+        result = await ws.receive_json(timeout=5)
+        self.assertEqual(result["result"], "answered no")
+        await ws.close()
+
+    async def test_outbox_message_is_cancelled_over_http(self):
+        a, b = await self.new_session(), await self.new_session()
+        queue = Outbox(":memory:", autostart=False)
+        message = queue.enqueue("email", {"text": "hi"}, recipients="friend", session_id=a)
+        with mock.patch.object(server, "outbox", queue):
+            # Only the session that queued a message can cancel it
+            self.assertEqual((await self.client.post(f"/sessions/{b}/outbox/{message.id}/cancel")).status, 404)
+            self.assertEqual((await self.client.post(f"/sessions/{a}/outbox/{message.id}/cancel")).status, 200)
+            self.assertEqual(queue.get(message.id).status, CANCELLED)
+            self.assertEqual((await self.client.post(f"/sessions/{a}/outbox/{message.id}/cancel")).status, 409)
+
+    async def test_session_limit_and_unknown_session(self):
+        for _ in range(3):
+            await self.new_session()
+        self.assertEqual((await self.client.post("/sessions")).status, 503)
+        response = await self.client.post("/sessions/missing/query", json={"query": "hi"})
+        self.assertEqual(response.status, 404)
+
+if __name__ == "__main__":
+    unittest.main()
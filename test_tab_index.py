@@ -0,0 +1,70 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from types import SimpleNamespace
+from browser_control import BrowserControl, TabIndex
+
+TARGETS = [
+    {"id": "A1", "type": "page", "title": "Inbox (3) - emily@gmail.com - Gmail", "url": "https://mail.google.com/mail/u/0/#inbox"},
+    {"id": "B2", "type": "page", "title": "LeBron James - Wikipedia", "url": "https://en.wikipedia.org/wiki/LeBron_James"},
+    {"id": "C3", "type": "service_worker", "title": "Service Worker", "url": "https://youtube.com/sw.js"},
+    {"id": "D4", "type": "page", "title": "Home - YouTube", "url": "https://www.youtube.com/"},
+]
+
+class DevToolsHandler(BaseHTTPRequestHandler):
+    requests = 0
+
+    def do_GET(self):
+        DevToolsHandler.requests += 1
+        body = json.dumps(TARGETS).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TestTabIndex(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(("127.0.0.1", 0), DevToolsHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.address = f"127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def test_substring_and_fuzzy_lookup(self):
+        index = TabIndex(self.address)
+        self.assertEqual(index.find("gmail").target_id, "A1")
+        self.assertEqual(index.find("lebron").target_id, "B2")
+        self.assertEqual(index.find("youtub").target_id, "D4")
+        self.assertEqual(index.find("wikipdia").target_id, "B2")
+        self.assertIsNone(index.find("calendar"))
+
+    def test_listing_is_cached_for_ttl(self):
+        index = TabIndex(self.address, ttl=60)
+        DevToolsHandler.requests = 0
+        for term in ["gmail", "youtube", "wikipedia"]:
+            index.find(term)
+        self.assertEqual(DevToolsHandler.requests, 1)
+        index.find("gmail", refresh=True)
+        self.assertEqual(DevToolsHandler.requests, 2)
+
+    def test_unreachable_endpoint(self):
+        index = TabIndex("127.0.0.1:1")
+        self.assertIsNone(index.find("gmail"))
+        self.assertFalse(index.available)
+
+    def test_tab_without_a_handle_falls_back_to_scanning(self):
+        browser = BrowserControl()
+        browser.tab_index = TabIndex(self.address)
+        browser.driver = SimpleNamespace(window_handles=["unrelated"])
+        self.assertIsNone(browser._switch_via_index("gmail"))
+        self.assertFalse(browser._switch_via_index("calendar"))
+
+if __name__ == "__main__":
+    unittest.main()
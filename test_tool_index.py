@@ -0,0 +1,54 @@
+import unittest
+from types import SimpleNamespace
+from crew_registry import CrewRegistry
+from tool_index import ToolIndex, count_tokens, prompt_text
+import smartHomeAgent as home
+import computerAgent as computer
+
+def named(name):
+    return SimpleNamespace(name=name)
+
+class TestToolIndex(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tools = [
+            home.turn_on_ac, home.turn_off_ac, home.set_thermostat, home.adjust_curtains, home.manage_locks,
+            home.start_appliance, home.manage_security, computer.gmail_create_draft, computer.book_ride,
+            computer.order_groceries, named("ask_for_user_input"), named("verify_with_user"),
+        ]
+        cls.index = ToolIndex([t for t in cls.tools if hasattr(t, "description")])
+
+    def test_shortlist_keeps_relevant_and_interactive_tools_in_order(self):
+        shortlist = [t.name for t in self.index.shortlist("Set the thermostat to 72 degrees", self.tools, k=2)]
+        self.assertIn("set_thermostat", shortlist)
+        self.assertEqual(shortlist[-2:], ["ask_for_user_input", "verify_with_user"])
+        self.assertEqual(len(shortlist), 4)
+        self.assertEqual(shortlist, [t.name for t in self.tools if t.name in shortlist])
+
+    def test_compound_query_keeps_every_tool_it_needs(self):
+        shortlist = [t.name for t in self.index.shortlist("Book a ride to the airport and order groceries", self.tools, k=3)]
+        self.assertIn("book_ride", shortlist)
+        self.assertIn("order_groceries", shortlist)
+
+    def test_shortlisting_off_or_small_agents_keep_all_tools(self):
+        self.assertEqual(self.index.shortlist("Lock the doors", self.tools, k=0), self.tools)
+        self.assertEqual(self.index.shortlist("Lock the doors", self.tools[:3], k=5), self.tools[:3])
+
+    def test_shortlist_shrinks_the_tool_prompt(self):
+        tools = [t for t in self.tools if hasattr(t, "schema")]
+        shortlist = self.index.shortlist("Turn on the AC", tools, k=2)
+        self.assertLess(count_tokens(prompt_text(shortlist)), count_tokens(prompt_text(tools)) / 2)
+
+    def test_registry_gives_the_crew_the_selected_tools(self):
+        registry = CrewRegistry(tool_selector=lambda name, query, tools: [t for t in tools if t.name in query])
+        agent = SimpleNamespace(tools=[named("turn_on_ac"), named("book_ride")])
+        registry._tools["smart_home"] = list(agent.tools)
+        crew = SimpleNamespace(tasks=[SimpleNamespace(agent=agent)])
+        registry._select_tools("smart_home", crew, "please turn_on_ac")
+        self.assertEqual([t.name for t in agent.tools], ["turn_on_ac"])
+        registry.tool_selector = None
+        registry._select_tools("smart_home", crew, "please turn_on_ac")
+        self.assertEqual(len(agent.tools), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import json
+import os
+import tempfile
+import unittest
+import httpx
+from types import SimpleNamespace
+import tracing
+from llm_clients import TracingTransport
+from plan_executor import Plan, PlanStep, execute_plan
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        tracing.enable(self.dir)
+        self.addCleanup(tracing.disable)
+        tracing.tracer.traces.clear()
+
+    def last_trace(self):
+        return {s["name"]: s for s in tracing.tracer.traces[-1]}
+
+    def test_spans_nest_across_plan_step_threads(self):
+        def run_step(step, context):
+            with tracing.span(f"agent for {step.id}", "agent"):
+                return step.query
+
+        plan = Plan(steps=[
+            PlanStep(id="1", agent="smart_home", query="lights on"),
+            PlanStep(id="2", agent="computer", query="open mail"),
+        ])
+        with tracing.span("query", "query"):
+            execute_plan(plan, run_step)
+
+        spans = self.last_trace()
+        root = spans["query"]
+        self.assertIsNone(root["parent_id"])
+        for step_id in ("1", "2"):
+            self.assertEqual(spans[f"step {step_id}"]["parent_id"], root["span_id"])
+            self.assertEqual(spans[f"agent for {step_id}"]["parent_id"], spans[f"step {step_id}"]["span_id"])
+        self.assertEqual({s["trace_id"] for s in spans.values()}, {root["trace_id"]})
+
+    def test_trace_is_exported_as_jsonl_and_chrome_trace(self):
+        with tracing.span("query", "query"):
+            with tracing.span("inner"):
+                pass
+        trace_id = tracing.tracer.traces[-1][0]["trace_id"]
+
+        with open(os.path.join(self.dir, "spans.jsonl")) as f:
+            self.assertEqual([json.loads(line)["name"] for line in f], ["query", "inner"])
+        with open(os.path.join(self.dir, f"{trace_id}.trace.json")) as f:
+            events = json.load(f)["traceEvents"]
+        self.assertEqual([e["ph"] for e in events], ["X", "X"])
+        self.assertGreaterEqual(events[0]["dur"], events[1]["dur"])
+
+    def test_instrumented_tool_records_arguments_outcome_and_errors(self):
+        def turn_on(room):
+            if room == "attic":
+                raise ValueError("no lights in the attic")
+            return f"{room} lights on"
+
+        tool = SimpleNamespace(name="turn_on_lights", func=turn_on)
+        tracing.instrument_tools([tool])
+        tracing.instrument_tools([tool])  # idempotent
+        with tracing.span("query", "query"):
+            self.assertEqual(tool.func("kitchen"), "kitchen lights on")
+            with self.assertRaises(ValueError):
+                tool.func(room="attic")
+
+        ok, failed = [s for s in tracing.tracer.traces[-1] if s["kind"] == "tool"]
+        self.assertEqual(ok["attributes"]["outcome"], "kitchen lights on")
+        self.assertEqual(ok["attributes"]["args"], "('kitchen',)")
+        self.assertEqual(failed["status"], "error")
+        self.assertEqual(failed["error"], "no lights in the attic")
+
+    def test_llm_span_records_token_usage(self):
+        def api(request):
+            return httpx.Response(200, json={"usage": {"prompt_tokens": 12, "completion_tokens": 3, "total_tokens": 15}})
+
+        client = httpx.Client(transport=TracingTransport(httpx.MockTransport(api)))
+        with tracing.span("query", "query"):
+            client.post("https://api.openai.com/v1/chat/completions", json={"model": "gpt-4o-mini", "messages": []})
+
+        llm = self.last_trace()["llm gpt-4o-mini"]
+        self.assertEqual(llm["attributes"]["total_tokens"], 15)
+        self.assertEqual(llm["attributes"]["status"], 200)
+
+    def test_disabled_tracing_is_a_noop(self):
+        tracing.disable()
+        with tracing.span("query", "query") as s:
+            s.set(ignored=True)
+        self.assertIsNone(tracing.current_span())
+        self.assertEqual(len(tracing.tracer.traces), 0)
+        self.assertFalse(os.path.exists(os.path.join(self.dir, "spans.jsonl")))
+
+if __name__ == '__main__':
+    unittest.main()
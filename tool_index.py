@@ -0,0 +1,128 @@
+"""
+Per-query tool shortlisting for the inner agents.
+
+Every inner-agent LLM call carries the name, description and schema of each
+of the agent's tools. ToolIndex is an offline lexical index (character n-gram
+TF-IDF, as in intent_router) over each tool's name, its docstring and the
+corpus queries labelled with it. For each query it keeps only the top-k
+tools, plus the ones every agent needs (asking and confirming with the user).
+TOOL_SHORTLIST_K=0 turns shortlisting off.
+
+Report the prompt size saved and whether the shortlists still hold the tools
+each test.py case expects with:
+
+    python tool_index.py --k 6
+"""
+import argparse
+import json
+import math
+import os
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from intent_router import char_ngrams, load_corpus_examples, normalize_text
+
+TOP_K = int(os.getenv("TOOL_SHORTLIST_K", "6"))
+# Tools an agent keeps whatever the query: it must always be able to ask and confirm
+ALWAYS_KEEP = ("ask_for_user_input", "verify_with_user")
+
+
+class ToolIndex:
+    def __init__(self, tools: Iterable, examples: Iterable[Tuple[str, Optional[str]]] = ()):
+        docs = []
+        for tool in tools:
+            docs.append((f"{tool.name.replace('_', ' ')} {tool.description}", tool.name))
+        names = {name for _, name in docs}
+        docs += [(query, name) for query, name in examples if name in names]
+
+        grams = [char_ngrams(normalize_text(text)) for text, _ in docs]
+        doc_freq = Counter()
+        for g in grams:
+            doc_freq.update(g.keys())
+        self.idf = {gram: math.log((1 + len(docs)) / (1 + df)) + 1.0 for gram, df in doc_freq.items()}
+        self.docs = [(self._vectorize(g), name) for g, (_, name) in zip(grams, docs)]
+
+    @classmethod
+    def from_tools(cls, tools: Iterable):
+        """Index the tools' docstrings together with the corpus queries labelled with them"""
+        return cls(tools, load_corpus_examples())
+
+    def _vectorize(self, grams: Counter) -> Dict[str, float]:
+        vector = {gram: count * self.idf.get(gram, 0.0) for gram, count in grams.items()}
+        norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+        return {gram: v / norm for gram, v in vector.items()}
+
+    def scores(self, query: str) -> Dict[str, float]:
+        """Best cosine similarity between the query and any document of each tool"""
+        vector = self._vectorize(char_ngrams(normalize_text(query)))
+        best = {}
+        for doc, name in self.docs:
+            score = sum(v * doc.get(gram, 0.0) for gram, v in vector.items())
+            best[name] = max(score, best.get(name, 0.0))
+        return best
+
+    def shortlist(self, query: str, tools: Sequence, k: int = TOP_K, always_keep: Iterable[str] = ALWAYS_KEEP) -> List:
+        """The k tools most relevant to the query plus the always-kept ones, in their original order"""
+        keep = set(always_keep)
+        candidates = [t for t in tools if t.name not in keep]
+        if k <= 0 or len(candidates) <= k:
+            return list(tools)
+        scores = self.scores(query)
+        ranked = sorted(candidates, key=lambda t: scores.get(t.name, 0.0), reverse=True)
+        chosen = {t.name for t in ranked[:k]} | keep
+        return [t for t in tools if t.name in chosen]
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in text with the gpt-4o-mini encoding, or an estimate of 4 characters per token offline"""
+    try:
+        import tiktoken
+        return len(tiktoken.encoding_for_model("gpt-4o-mini").encode(text))
+    except Exception:
+        return math.ceil(len(text) / 4)
+
+
+def prompt_text(tools: Iterable) -> str:
+    """Roughly what an agent prompt spends on its tools: name, arguments and description"""
+    return "\n".join(
+        f"Tool Name: {t.name}\nTool Arguments: {json.dumps(t.schema()['function']['parameters']['properties'])}\nTool Description: {t.description}"
+        for t in tools
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Token savings and recall of per-query tool shortlists on the test.py cases")
+    parser.add_argument("--k", type=int, default=TOP_K, help="tools kept per query besides the always-kept ones")
+    args = parser.parse_args()
+
+    import app
+    from bench_pipeline import load_test_cases
+
+    agents = {"smart_home": app.SMART_HOME_TOOLS, "computer": app.COMPUTER_TOOLS}
+    index = ToolIndex.from_tools([t for tools in agents.values() for t in tools])
+    full_tokens = {name: count_tokens(prompt_text(tools)) for name, tools in agents.items()}
+
+    hits = total = before = after = 0
+    misses = []
+    for query, expected in load_test_cases():
+        for name, tools in agents.items():
+            owned = {t.name for t in tools}
+            needed = {tool for tool, _ in expected if tool in owned}
+            if not needed:
+                continue
+            shortlist = index.shortlist(query, tools, k=args.k)
+            kept = {t.name for t in shortlist}
+            hits += len(needed & kept)
+            total += len(needed)
+            misses += [(query, tool) for tool in needed - kept]
+            before += full_tokens[name]
+            after += count_tokens(prompt_text(shortlist))
+
+    print(f"k={args.k}: tool prompt {before} -> {after} tokens ({100 * (1 - after / before):.0f}% fewer) over {total} agent calls")
+    print(f"expected tools kept: {hits}/{total} ({100 * hits / total:.1f}%)")
+    for query, tool in misses:
+        print(f"  missed {tool}: {query}")
+
+
+if __name__ == "__main__":
+    main()
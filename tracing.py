@@ -0,0 +1,282 @@
+"""
+Lightweight hierarchical tracing of queries, agents, plan steps, tools and LLM calls.
+
+Spans nest through a context variable, so they follow a query into nested
+crews, executor threads (async_runtime.run_blocking and plan steps copy the
+context) and the LLM HTTP transport. When the root span of a trace ends, its
+spans are appended to a JSONL file and written as a Chrome trace-event file
+that chrome://tracing or https://ui.perfetto.dev show as a flame graph.
+
+Tracing is off unless TRACE=1 (or enable() is called); span() then returns a
+shared no-op object. Convert a JSONL file to a single Chrome trace with:
+
+    python tracing.py .cache/traces/spans.jsonl -o trace.json
+"""
+import argparse
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_TRACE_DIR = os.getenv("TRACE_DIR", os.path.join(BASE_DIR, ".cache", "traces"))
+# Longest repr kept for arguments and outcomes
+MAX_VALUE_LENGTH = 200
+
+_enabled = os.getenv("TRACE", "0") == "1"
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+def _short(value) -> str:
+    text = value if isinstance(value, str) else repr(value)
+    return text if len(text) <= MAX_VALUE_LENGTH else text[:MAX_VALUE_LENGTH] + "..."
+
+
+class Span:
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "thread", "attributes", "status", "error")
+
+    def __init__(self, name: str, kind: str, parent: Optional["Span"], attributes: dict):
+        self.name = name
+        self.kind = kind
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.thread = threading.get_native_id()
+        self.attributes = attributes
+        self.status = "ok"
+        self.error = None
+
+    def set(self, **attributes):
+        """Add attributes, e.g. token counts or the outcome, while the span is open"""
+        self.attributes.update(attributes)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "thread": self.thread,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Returned by span() while tracing is off"""
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _ActiveSpan:
+    __slots__ = ("span", "_token")
+
+    def __init__(self, name: str, kind: str, attributes: dict):
+        self.span = Span(name, kind, _current.get(), attributes)
+        self._token = None
+
+    def __enter__(self) -> Span:
+        if self.span.parent_id is None:
+            tracer.open_trace(self.span.trace_id)
+        self._token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        self.span.end_ns = time.time_ns()
+        if exc is not None:
+            self.span.status = "error"
+            self.span.error = _short(str(exc))
+        _current.reset(self._token)
+        tracer.finish(self.span)
+        return False
+
+
+def span(name: str, kind: str = "internal", **attributes):
+    """Context manager for a span nested under the current one"""
+    if not _enabled:
+        return _NOOP
+    return _ActiveSpan(name, kind, attributes)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get() if _enabled else None
+
+
+def traced(name: Optional[str] = None, kind: str = "internal"):
+    """Decorator running the function (sync or async) inside a span that records its arguments"""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not _enabled:
+                    return await func(*args, **kwargs)
+                with span(span_name, kind, args=_short(args), kwargs=_short(kwargs)):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with span(span_name, kind, args=_short(args), kwargs=_short(kwargs)):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_tools(tools: Iterable):
+    """Wrap each tool's func so that every call is a "tool" span with its name, arguments and outcome"""
+    for tool in tools:
+        func = tool.func
+        if getattr(func, "_traced", False):
+            continue
+
+        def wrapper(*args, _func=func, _name=tool.name, **kwargs):
+            if not _enabled:
+                return _func(*args, **kwargs)
+            with span(f"tool {_name}", "tool", tool=_name, args=_short(args), kwargs=_short(kwargs)) as s:
+                result = _func(*args, **kwargs)
+                s.set(outcome=_short(result))
+                return result
+
+        functools.update_wrapper(wrapper, func)
+        wrapper._traced = True
+        tool.func = wrapper
+
+
+def chrome_trace(spans: Iterable[dict]) -> dict:
+    """Chrome trace-event document with one complete ("X") event per span"""
+    pid = os.getpid()
+    events = []
+    for s in spans:
+        events.append({
+            "name": s["name"],
+            "cat": s["kind"],
+            "ph": "X",
+            "ts": s["start_ns"] / 1000,
+            "dur": ((s["end_ns"] or s["start_ns"]) - s["start_ns"]) / 1000,
+            "pid": pid,
+            "tid": s["thread"],
+            "args": {**s["attributes"], "status": s["status"], "error": s["error"], "trace_id": s["trace_id"]},
+        })
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+class Tracer:
+    """Collects finished spans per trace and exports each trace when its root span ends"""
+
+    def __init__(self, trace_dir: str = DEFAULT_TRACE_DIR, keep: int = 20):
+        self.trace_dir = trace_dir
+        self.traces: deque = deque(maxlen=keep)
+        self._open: Dict[str, List[Span]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def jsonl_path(self) -> str:
+        return os.path.join(self.trace_dir, "spans.jsonl")
+
+    def open_trace(self, trace_id: str):
+        with self._lock:
+            self._open[trace_id] = []
+
+    def finish(self, span: Span):
+        with self._lock:
+            spans = self._open.get(span.trace_id)
+            if spans is None:
+                # Finished after its trace was exported (e.g. a background thread)
+                self._export([span.to_dict()], chrome=False)
+                return
+            spans.append(span)
+            if span.parent_id is not None:
+                return
+            del self._open[span.trace_id]
+        records = [s.to_dict() for s in sorted(spans, key=lambda s: s.start_ns)]
+        self.traces.append(records)
+        self._export(records)
+
+    def _export(self, records: List[dict], chrome: bool = True):
+        if not self.trace_dir:
+            return
+        try:
+            os.makedirs(self.trace_dir, exist_ok=True)
+            with open(self.jsonl_path, 'a') as f:
+                for record in records:
+                    f.write(json.dumps(record, default=str) + "\n")
+            if chrome:
+                path = os.path.join(self.trace_dir, f"{records[0]['trace_id']}.trace.json")
+                with open(path, 'w') as f:
+                    json.dump(chrome_trace(records), f, default=str)
+        except OSError as e:
+            logger.error(f"Error exporting trace: {str(e)}")
+
+
+tracer = Tracer()
+
+
+def enable(trace_dir: Optional[str] = None):
+    """Turn tracing on; trace_dir=None keeps the current directory, "" keeps traces in memory only"""
+    global _enabled
+    if trace_dir is not None:
+        tracer.trace_dir = trace_dir
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a spans JSONL file to a Chrome trace-event file")
+    parser.add_argument("jsonl", help="spans file written by the tracer")
+    parser.add_argument("-o", "--output", default="trace.json")
+    parser.add_argument("--trace-id", help="only export this trace")
+    args = parser.parse_args()
+
+    with open(args.jsonl, 'r') as f:
+        spans = [json.loads(line) for line in f if line.strip()]
+    if args.trace_id:
+        spans = [s for s in spans if s["trace_id"] == args.trace_id]
+    with open(args.output, 'w') as f:
+        json.dump(chrome_trace(spans), f)
+    print(f"Wrote {len(spans)} spans to {args.output}")
+
+
+if __name__ == "__main__":
+    main()